@@ -0,0 +1,282 @@
+"""
+artifacts.py
+
+This module names the files generated documents are saved to, and records each
+one in the artifacts table with the job and profile it was made for, a hash of
+what its prompt was made from, and when it was made. A new file's number is the
+id of its artifacts row, so finding a free name is one INSERT rather than a
+probe of every resume.md, resume1.md, ... before it, and two threads or
+processes saving at once can never pick the same name. Files are spread over
+shard folders of SHARD_SIZE numbers each (markdown_files/0000/resume-17.md),
+so no folder grows without bound.
+
+What a document says is kept in the database, not in its file: each artifacts
+row points at a blob in artifact_blobs, keyed on the sha256 of its content and
+compressed, so identical documents (the same answer saved again) are stored
+once. A PDF points at its Markdown's blob and is rendered from it. The files
+themselves are only written when asked for: as soon as a document is saved if
+EXPORT_ON_SAVE is set (the GUI sets it), or later with export. Blobs no record
+points at any more are deleted by collect_garbage. Blobs live in the same
+database file as the artifacts table (database.DB_NAME).
+
+Generated documents can be listed, written out and cleaned up without scanning
+the folders:
+    python artifacts.py --job 12
+    python artifacts.py --profile 1 --kind resume --export
+    python artifacts.py --job 12 --delete --gc
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+import zlib
+import connections
+import database
+
+# file numbers per shard folder
+SHARD_SIZE = 1000
+# columns find returns, in order
+COLUMNS = ("id", "kind", "path", "job_id", "profile_id", "prompt_hash", "created_at")
+# write a document's files as soon as it is saved, not only when exported
+EXPORT_ON_SAVE = False
+ZLIB_LEVEL = 6
+# blobs shorter than this many bytes, or that compress by less than
+# MIN_COMPRESS_RATIO, are stored as they are
+MIN_COMPRESS_SIZE = 200
+MIN_COMPRESS_RATIO = 0.9
+
+def prompt_hash(kind, job_description, personal_description):
+    """Return a hex digest of what a document of kind is prompted with."""
+    text = json.dumps([kind, job_description, personal_description])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def allocate(folder, kind, extension, source=None, now=None):
+    """
+    Record a new file of kind and return its path, folder/<shard>/<kind>-<id><extension>;
+    the shard folder is created, the file is not. source is a dict with any of
+    job_id, profile_id and prompt_hash.
+    """
+    source = source or {}
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO artifacts (kind, job_id, profile_id, prompt_hash, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (kind, source.get("job_id"), source.get("profile_id"), source.get("prompt_hash"),
+             time.time() if now is None else now),
+        )
+        artifact_id = cursor.lastrowid
+        path = os.path.join(folder, f"{artifact_id // SHARD_SIZE:04d}",
+                            f"{kind}-{artifact_id}{extension}")
+        conn.execute("UPDATE artifacts SET path = ? WHERE id = ?", (path, artifact_id))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def record(path, kind, source=None, now=None, content=None):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    """
+    Record a file at a path of the caller's choosing (a PDF named after its Markdown
+    file, say), replacing any earlier record of the same path; its folder is created.
+    content is the hash of a stored blob (see store) the file is made from.
+    """
+    source = source or {}
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO artifacts
+                (kind, path, job_id, profile_id, prompt_hash, created_at, content)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (kind, path, source.get("job_id"), source.get("profile_id"),
+             source.get("prompt_hash"), time.time() if now is None else now, content),
+        )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+def lookup(path):
+    """Return (kind, source) of the file recorded at path, or None if it was not recorded."""
+    row = connections.writer(database.DB_NAME).execute(
+        "SELECT kind, job_id, profile_id, prompt_hash FROM artifacts WHERE path = ?", (path,)
+    ).fetchone()
+    if row is None:
+        return None
+    return row[0], dict(zip(("job_id", "profile_id", "prompt_hash"), row[1:]))
+
+# helper function: insert data into artifact_blobs unless it is there already, and
+# return its hash (the caller commits)
+def _insert_blob(conn, data):
+    digest = hashlib.sha256(data).hexdigest()
+    codec, body = "none", data
+    if len(data) >= MIN_COMPRESS_SIZE:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+        if len(compressed) < MIN_COMPRESS_RATIO * len(data):
+            codec, body = "zlib", compressed
+    conn.execute("INSERT OR IGNORE INTO artifact_blobs (hash, codec, size, body) "
+                 "VALUES (?, ?, ?, ?)", (digest, codec, len(data), body))
+    return digest
+
+def store(data):
+    """
+    Store data (bytes) in artifact_blobs, unless it is there already, and return
+    its hash.
+    """
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        return _insert_blob(conn, data)
+
+def attach(path, data):
+    """
+    Store data as the content of the file recorded at path, and return its hash.
+    The blob and the record pointing at it are committed together, so a
+    collect_garbage running at the same time never sees the blob unused.
+    """
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        digest = _insert_blob(conn, data)
+        conn.execute("UPDATE artifacts SET content = ? WHERE path = ?", (digest, path))
+    return digest
+
+def content_hash(path):
+    """Return the hash of the content of the file recorded at path, or None."""
+    row = connections.writer(database.DB_NAME).execute(
+        "SELECT content FROM artifacts WHERE path = ?", (path,)).fetchone()
+    return row[0] if row else None
+
+def read(path):
+    """Return the stored content (bytes) of the file recorded at path, or None."""
+    row = connections.writer(database.DB_NAME).execute(
+        """
+        SELECT codec, body FROM artifacts JOIN artifact_blobs ON hash = content
+        WHERE path = ?
+        """, (path,)).fetchone()
+    if row is None:
+        return None
+    return zlib.decompress(row[1]) if row[0] == "zlib" else bytes(row[1])
+
+def export(path):
+    """
+    Write the file recorded at path from its stored content, unless it exists,
+    and return path; a PDF is rendered from its Markdown. Raises KeyError if
+    nothing is stored for path.
+    """
+    if os.path.exists(path):
+        return path
+    data = read(path)
+    if data is None:
+        raise KeyError(f"Nothing is stored for {path}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith(".pdf"):
+        from main import render_pdf  # pylint: disable=import-outside-toplevel  # main imports artifacts
+        render_pdf(data.decode("utf-8"), path)
+    else:
+        with open(path, "wb") as file:
+            file.write(data)
+    return path
+
+def forget(path):
+    """Delete the record of the file at path (one that was never finished, say)."""
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        conn.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+
+# helper function: the WHERE clause and parameters of find and delete
+def _where(job_id, profile_id, kind, prompt):
+    clauses, params = [], []
+    for column, value in (("job_id", job_id), ("profile_id", profile_id), ("kind", kind),
+                          ("prompt_hash", prompt)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+def find(job_id=None, profile_id=None, kind=None, prompt=None, limit=None):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    """
+    Return the recorded files, newest first, as tuples of COLUMNS; each argument
+    given narrows them down (prompt is a prompt_hash). limit returns only the
+    newest ones.
+    """
+    where, params = _where(job_id, profile_id, kind, prompt)
+    if limit is not None:
+        where, params = f"{where} ORDER BY id DESC LIMIT ?", params + [limit]
+    else:
+        where = f"{where} ORDER BY id DESC"
+    return connections.writer(database.DB_NAME).execute(
+        f"SELECT {', '.join(COLUMNS)} FROM artifacts {where}", params
+    ).fetchall()
+
+def delete(job_id=None, profile_id=None, kind=None, prompt=None):
+    """
+    Delete the records find would return for the same arguments, and return how
+    many there were. Written files are left alone; the blobs are deleted by
+    collect_garbage.
+    """
+    where, params = _where(job_id, profile_id, kind, prompt)
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        return conn.execute(f"DELETE FROM artifacts {where}", params).rowcount
+
+def collect_garbage():
+    """
+    Delete the blobs no artifacts record points at, and return (blobs deleted,
+    bytes freed before compression). Run VACUUM afterwards to give the space
+    back to the disk.
+    """
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        unused = """
+            FROM artifact_blobs
+            WHERE NOT EXISTS (SELECT 1 FROM artifacts WHERE content = artifact_blobs.hash)
+            """
+        count, size = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) {unused}").fetchone()
+        conn.execute(f"DELETE {unused}")
+    return count, size
+
+def stats():
+    """Return (records, blobs, bytes before compression, bytes stored) of the store."""
+    conn = connections.writer(database.DB_NAME)
+    records = conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+    return (records,) + conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(body)), 0) "
+        "FROM artifact_blobs").fetchone()
+
+def main():
+    """
+    Print the generated files matching the command line arguments, then write them
+    out (--export) or delete their records (--delete); --gc deletes unused blobs.
+    """
+    parser = argparse.ArgumentParser(description="List generated resumes and cover letters.")
+    parser.add_argument("--job", type=int, help="job id")
+    parser.add_argument("--profile", type=int, help="profile id")
+    parser.add_argument("--kind", choices=("resume", "cover_letter"))
+    parser.add_argument("--limit", type=int, help="list only the newest ones")
+    parser.add_argument("--export", action="store_true",
+                        help="write the files that do not exist yet")
+    parser.add_argument("--delete", action="store_true", help="forget them")
+    parser.add_argument("--gc", action="store_true",
+                        help="delete stored documents nothing points at any more")
+    args = parser.parse_args()
+    if args.delete and args.limit is not None:
+        parser.error("--delete deletes every match, so it cannot be used with --limit")
+    database.create_table()
+    for _, kind, path, job_id, profile_id, _, created_at in find(args.job, args.profile,
+                                                                  args.kind, limit=args.limit):
+        made = datetime.datetime.fromtimestamp(created_at).strftime("%Y-%m-%d %H:%M")
+        if args.export:
+            try:
+                export(path)
+            except KeyError:
+                path = f"{path} (not stored)"
+        print(f"{made}  {kind:<12} job {job_id}  profile {profile_id}  {path}")
+    if args.delete:
+        print(f"{delete(args.job, args.profile, args.kind)} records deleted")
+    if args.gc:
+        count, size = collect_garbage()
+        print(f"{count} unused documents ({size} bytes) deleted")
+    records, blobs, size, stored = stats()
+    print(f"{records} records, {blobs} stored documents, {size} bytes in {stored}")
+
+if __name__ == "__main__":
+    main()
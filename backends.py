@@ -0,0 +1,278 @@
+"""
+backends.py
+
+This module holds the backends the model comes from. A backend has a
+model_name (part of every response cache key) and build_model(), which returns
+a model whose start_chat(history=[]) gives a chat with
+send_message(prompt, stream=False). Without stream, send_message returns a
+response with .text. With stream, it returns an iterable of chunks with .parts
+and .text. This is the google.generativeai interface, which main.py and
+sessions.py are written against. A backend may also have prefix_model(prefix),
+returning a model that holds prefix in a context cache (or None if it cannot),
+so requests sent to it leave the prefix out, and release_prefix_model(model),
+which deletes that context cache once it is no longer used.
+
+GeminiBackend talks to Google's API. StandInBackend answers offline, after a
+simulated delay, so the whole pipeline (sessions, cache, streaming, saving,
+PDF) can be load tested without an API key or a quota:
+    python -m benchmarks.bench_load --requests 200 --concurrency 8
+"""
+import collections
+import datetime
+import math
+import random
+import re
+import threading
+import time
+from google.api_core import exceptions as api_exceptions
+import google.generativeai as genai
+from google.generativeai import caching  # pylint: disable=no-name-in-module
+
+# a piece of a streamed answer, as google.generativeai's chunks look to send_prompt
+Chunk = collections.namedtuple("Chunk", "text parts")
+# a whole answer
+Response = collections.namedtuple("Response", "text")
+
+# seconds a Gemini context cache is kept (it is billed per hour while it is)
+CONTEXT_CACHE_TTL = 3600
+# the API refuses to cache prompts shorter than this many tokens
+CONTEXT_CACHE_MIN_TOKENS = 1024
+
+# stand-in defaults: median seconds before the first token, the spread of that
+# delay (sigma of a lognormal; 0 for a fixed delay), tokens written per second,
+# tokens per answer and per streamed chunk, and the fraction of requests that fail
+STAND_IN_LATENCY = 1.0
+STAND_IN_JITTER = 0.5
+STAND_IN_TOKENS_PER_SECOND = 200.0
+STAND_IN_ANSWER_TOKENS = 600
+STAND_IN_CHUNK_TOKENS = 20
+STAND_IN_ERROR_RATE = 0.0
+# characters per token in stand-in answers
+CHARS_PER_TOKEN = 4
+# a line of the prompt like this is a separator the answer must repeat between
+# documents (see main.DOCUMENT_SEPARATOR)
+SEPARATOR_PATTERN = re.compile(r"^===[^=\n]+===$", re.MULTILINE)
+# words stand-in answers are made of
+WORDS = ("experienced", "engineer", "python", "data", "delivered", "team", "projects",
+         "built", "scalable", "systems", "customers", "improved", "results", "skills")
+
+class StandInError(Exception):
+    """Raised by a stand-in chat for a simulated failed request (a 429 or 500, say)."""
+
+# errors a request may succeed after if it is tried again: rate limits (429), server
+# errors (5xx) and the stand-in's simulated ones. Anything else, a missing secrets.txt
+# or a rejected API key say, fails the same way every time.
+TRANSIENT_ERRORS = (StandInError, api_exceptions.TooManyRequests, api_exceptions.ServerError)
+
+class GeminiBackend:  # pylint: disable=too-few-public-methods
+    """Google's Gemini API; the API key is read from secrets.txt."""
+
+    def __init__(self, model_name, generation_config, system_instruction):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.system_instruction = system_instruction
+        # whether the model can cache context, once the API has said
+        self._caching = None
+        # the context caches prefix_model made, by name
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    # setup code from the aistudio.google.com website
+    def build_model(self):
+        """Configure the client with the API key from secrets.txt and return the model."""
+        self._configure()
+        return genai.GenerativeModel(  # pylint: disable=no-member
+            model_name=self.model_name,
+            generation_config=self.generation_config,
+            system_instruction=self.system_instruction,
+        )
+
+    def prefix_model(self, prefix):
+        """
+        Return a model whose requests start with prefix (and the system instruction)
+        held in a context cache on Google's side, so only what follows is sent; None
+        if prefix is too short to cache or the model cannot cache context.
+        """
+        if len(prefix) / CHARS_PER_TOKEN < CONTEXT_CACHE_MIN_TOKENS:
+            return None
+        self._configure()
+        if not self._supports_caching():
+            return None
+        try:
+            cached = caching.CachedContent.create(
+                model=f"models/{self.model_name}",
+                system_instruction=self.system_instruction,
+                contents=[prefix],
+                ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL),
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None
+        with self._lock:
+            self._caches[cached.name] = cached
+        return genai.GenerativeModel.from_cached_content(  # pylint: disable=no-member
+            cached, generation_config=self.generation_config)
+
+    def release_prefix_model(self, model):
+        """
+        Delete the context cache a model from prefix_model holds, rather than leave
+        it billed until it expires. Does nothing for any other model.
+        """
+        with self._lock:
+            cached = self._caches.pop(getattr(model, "cached_content", None), None)
+        if cached is None:
+            return
+        try:
+            cached.delete()
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass  # already expired, or the API is unreachable: it expires on its own
+
+    # helper function: whether the model can cache context, asked of the API once
+    # (a failed request is not remembered, so it is asked again next time)
+    def _supports_caching(self):
+        if self._caching is None:
+            try:
+                info = genai.get_model(f"models/{self.model_name}")  # pylint: disable=no-member
+            except Exception:  # pylint: disable=broad-exception-caught
+                return False
+            self._caching = "createCachedContent" in info.supported_generation_methods
+        return self._caching
+
+    # helper function: configure the client with the API key from secrets.txt
+    @staticmethod
+    def _configure():
+        with open("secrets.txt", "r", encoding="utf-8") as file:
+            api_key = file.read().strip()
+            genai.configure(api_key=api_key)
+
+class StandInBackend:  # pylint: disable=too-many-instance-attributes,too-few-public-methods
+    """
+    An offline model for load tests. Each request waits a delay drawn from a
+    lognormal distribution (median latency seconds, sigma jitter) before its
+    first token, then fails with StandInError with probability error_rate, or
+    writes answer_tokens tokens at tokens_per_second (None for no delay), in
+    chunks of chunk_tokens when streamed. With prefill_tokens_per_second, the
+    first token also waits for the prompt (and the chat history) to be read at
+    that rate. context_cache lets prefix_model cache a prompt prefix, which is
+    then not read again. seed makes the delays and failures repeatable; sleep is
+    called for every wait.
+    """
+
+    model_name = "stand-in"
+
+    def __init__(self, latency=STAND_IN_LATENCY, jitter=STAND_IN_JITTER,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                 tokens_per_second=STAND_IN_TOKENS_PER_SECOND,
+                 answer_tokens=STAND_IN_ANSWER_TOKENS, chunk_tokens=STAND_IN_CHUNK_TOKENS,
+                 error_rate=STAND_IN_ERROR_RATE, prefill_tokens_per_second=None,
+                 context_cache=False, seed=None, sleep=time.sleep):
+        if latency < 0 or jitter < 0 or not 0 <= error_rate <= 1:
+            raise ValueError("latency and jitter must not be negative and error_rate must "
+                             "be between 0 and 1")
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.chunk_tokens = chunk_tokens
+        self.error_rate = error_rate
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.context_cache = context_cache
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def build_model(self):
+        """Return a stand-in model; its chats answer through this backend."""
+        return StandInModel(self)
+
+    def prefix_model(self, prefix):
+        """Return a model with prefix cached if context_cache is set, else None."""
+        return StandInModel(self, prefix) if self.context_cache else None
+
+    def draw(self):
+        """Return (seconds before the first token, whether the request fails) for a request."""
+        with self._lock:
+            delay = self.latency * self._random.lognormvariate(0, self.jitter)
+            return delay, self._random.random() < self.error_rate
+
+    def answer(self, prompt):
+        """
+        Return the answer text for prompt: a Markdown document of answer_tokens tokens,
+        and another after each separator line (see SEPARATOR_PATTERN) in prompt.
+        """
+        rng = random.Random(prompt)
+        text = ""
+        for separator in [None] + SEPARATOR_PATTERN.findall(prompt):
+            words, size = [], 0
+            while size < self.answer_tokens * CHARS_PER_TOKEN:
+                words.append(rng.choice(WORDS))
+                size += len(words[-1]) + 1
+            text += (f"\n\n{separator}\n\n" if separator else "") + "# Document\n\n"
+            text += " ".join(words)
+        return text
+
+    def read_time(self, tokens):
+        """Return the seconds reading tokens of prompt takes."""
+        if not self.prefill_tokens_per_second:
+            return 0.0
+        return tokens / self.prefill_tokens_per_second
+
+    def write_time(self, text):
+        """Return the seconds writing text takes."""
+        if not self.tokens_per_second:
+            return 0.0
+        return len(text) / CHARS_PER_TOKEN / self.tokens_per_second
+
+class StandInModel:  # pylint: disable=too-few-public-methods
+    """A model of a StandInBackend, with cached_prefix held in its context cache."""
+
+    def __init__(self, backend, cached_prefix=""):
+        self.backend = backend
+        self.cached_prefix = cached_prefix
+
+    def start_chat(self, history=None):
+        """Return a new chat with the given history."""
+        return StandInChat(self.backend, history, self.cached_prefix)
+
+class StandInChat:  # pylint: disable=too-few-public-methods
+    """
+    A chat on a StandInBackend; send_message works like google.generativeai's.
+    History entries are texts or {"role": ..., "parts": [text, ...]} dicts; the
+    whole history is read with every prompt, as the real API sends it again.
+    usage is (prompt tokens read, prompt tokens from the context cache) of the
+    last request.
+    """
+
+    def __init__(self, backend, history=None, cached_prefix=""):
+        self.backend = backend
+        self.history = list(history or [])
+        self.cached_prefix = cached_prefix
+        self.usage = (0, 0)
+
+    def send_message(self, prompt, stream=False):
+        """
+        Answer prompt after the simulated delay, or raise StandInError. With stream,
+        return an iterator of chunks, the last one with no parts (like the finish
+        chunk of the real API).
+        """
+        delay, fails = self.backend.draw()
+        read = sum(len(text) for entry in self.history + [prompt]
+                   for text in ([entry] if isinstance(entry, str) else entry["parts"]))
+        self.usage = (math.ceil(read / CHARS_PER_TOKEN),
+                      math.ceil(len(self.cached_prefix) / CHARS_PER_TOKEN))
+        self.backend.sleep(delay + self.backend.read_time(self.usage[0]))
+        if fails:
+            raise StandInError("simulated model error (stand-in backend)")
+        text = self.backend.answer(prompt)
+        self.history += [prompt, text]
+        if stream:
+            return self._stream(text)
+        self.backend.sleep(self.backend.write_time(text))
+        return Response(text)
+
+    # helper function: yield text in chunks, each after the time it takes to write
+    def _stream(self, text):
+        size = self.backend.chunk_tokens * CHARS_PER_TOKEN
+        for start in range(0, len(text), size):
+            piece = text[start:start + size]
+            self.backend.sleep(self.backend.write_time(piece))
+            yield Chunk(piece, [piece])
+        yield Chunk("", [])
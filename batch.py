@@ -0,0 +1,259 @@
+"""
+batch.py
+
+This module generates resumes and cover letters without the GUI, for many jobs
+and saved profiles at once (an overnight run, say). Every (job, profile,
+document) combination is a task on a thread pool. A shared rate limiter keeps
+model requests within a requests-per-minute budget, and model calls that fail
+with a transient error (a rate limit or server error) are retried with
+exponential backoff. Documents are saved through the same
+save_resume / save_cover_letter / convert_text_to_pdf flow as the GUI, and
+throughput and per-stage latency are printed at the end. Documents are kept in
+the artifacts store; their files are only written with --export (or later,
+with python artifacts.py --export).
+
+Run from the project root, for example:
+    python batch.py --profiles 1 2 --jobs 10 11 12
+    python batch.py --profiles 1 --remote --min-salary 90000 --limit 200 --kind resume
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import artifacts
+import backends
+import compaction
+import database
+import generation
+import gui
+import response_cache
+import search
+
+# tasks generating at the same time
+CONCURRENCY = 4
+# model requests started per minute, across every task (retries count too; answers
+# from the response cache do not)
+REQUESTS_PER_MINUTE = 10
+# times a model call that failed with one of backends.TRANSIENT_ERRORS is tried again
+RETRIES = 3
+# seconds before the first retry; doubled for each one after, up to MAX_BACKOFF
+BACKOFF = 2.0
+MAX_BACKOFF = 60.0
+# jobs read per filter_jobs page when selecting jobs by filter
+SELECT_PAGE_SIZE = 500
+# where each task spends its time: waiting on the rate limiter (and backing off),
+# in model calls, and saving the Markdown and PDF files
+STAGES = ("wait", "model", "save")
+
+class RateLimiter:  # pylint: disable=too-few-public-methods
+    """
+    Spaces out requests evenly so no more than per_minute start in any minute.
+    Safe to share between threads.
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        if per_minute <= 0:
+            raise ValueError(f"Requests per minute must be positive, not {per_minute}")
+        self.interval = 60.0 / per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._next = None
+
+    def acquire(self):
+        """Wait for the next free slot and return the seconds waited."""
+        with self._lock:
+            now = self.clock()
+            slot = now if self._next is None else max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            self.sleep(slot - now)
+        return slot - now
+
+def select_jobs(job_ids=None, filters=None, limit=None):
+    """
+    Return the jobs to generate for, as get_job_details rows: the jobs in job_ids,
+    or else the jobs matching filters (see search.FILTERS), at most limit of them.
+    Raises ValueError for an id with no job.
+    """
+    if not job_ids:
+        job_ids, after_id = [], 0
+        while limit is None or len(job_ids) < limit:
+            page = search.filter_jobs(filters, after_id=after_id, limit=SELECT_PAGE_SIZE)
+            if not page:
+                break
+            job_ids += [row[0] for row in page]
+            after_id = page[-1][0]
+        job_ids = job_ids[:limit]
+    jobs = []
+    for job_id in job_ids:
+        job = gui.get_job_details(job_id)
+        if not job:
+            raise ValueError(f"No job with id {job_id}")
+        jobs.append(job)
+    return jobs
+
+def select_profiles(profile_ids):
+    """Return the saved profiles with the given ids; raises ValueError for a missing one."""
+    profiles = {profile[0]: profile for profile in gui.get_user_profiles()}
+    missing = [profile_id for profile_id in profile_ids if profile_id not in profiles]
+    if missing:
+        raise ValueError(f"No profile with id {', '.join(map(str, missing))}")
+    return [profiles[profile_id] for profile_id in profile_ids]
+
+def run(jobs, profiles, kinds, concurrency=CONCURRENCY, per_minute=REQUESTS_PER_MINUTE,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        retries=RETRIES, backoff=BACKOFF, refresh=False):
+    """
+    Generate a document of every kind in kinds for every job and profile. Cached
+    model answers are used unless refresh.
+    Returns a dict with "results", a list of ((job id, profile id, kind), paths or
+    error message, succeeded), "timings" ({stage: [seconds, ...]}), "retries"
+    and "seconds" (wall time).
+    """
+    limiter = RateLimiter(per_minute)
+    stats = {"results": [], "timings": {stage: [] for stage in STAGES}, "retries": 0}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        for outcome in executor.map(
+            lambda task: _generate(task, limiter, retries, backoff, refresh),
+            itertools.product(jobs, profiles, kinds),
+        ):
+            _add_outcome(stats, *outcome)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+# helper function: add one task's outcome to the stats run returns; a failed task
+# has no save time
+def _add_outcome(stats, result, timings, retried):
+    stats["results"].append(result)
+    stats["retries"] += retried
+    for stage in STAGES:
+        if result[2] or stage != "save":
+            stats["timings"][stage].append(timings[stage])
+
+# helper function: generate and save one (job, profile, kind) task; returns
+# (((job id, profile id, kind), paths or error, succeeded), {stage: seconds}, retries)
+def _generate(task, limiter, retries, backoff, refresh):  # pylint: disable=too-many-locals
+    job, profile, kind = task
+    timings = dict.fromkeys(STAGES, 0.0)
+    retried = []
+    try:
+        descriptions = _descriptions(job, profile)
+        document = _create_with_retries(
+            lambda acquire: generation.create_document(kind, *descriptions, refresh,
+                                                       before_request=acquire),
+            limiter, retries, backoff, timings, retried)
+        started = time.perf_counter()
+        source = generation.document_source(kind, *descriptions, job[0], profile[0])
+        outcome, succeeded = generation.save_document(kind, document, source), True
+        timings["save"] = time.perf_counter() - started
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        outcome, succeeded = str(e), False
+    return ((job[0], profile[0], kind), outcome, succeeded), timings, len(retried)
+
+# helper function: the (job description, personal description) a task's prompt is made
+# from, with the job description compacted to fit the prompt token budget
+def _descriptions(job, profile):
+    personal = gui.personal_description(gui.profile_values(profile))
+    return compaction.fit_description(job[0], job[3], personal), personal
+
+# helper function: call create(acquire), which calls acquire() before each request it
+# sends to the model, so only those wait on the rate limiter (not cached answers).
+# Transient errors are retried with exponential backoff and jitter (any other error is
+# raised at once); adds to the wait and model timings and appends each retry's delay
+# to retried.
+def _create_with_retries(create, limiter, retries, backoff, timings, retried):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    waits, attempt = [], 0
+    while True:
+        started, waited = time.perf_counter(), len(waits)
+        try:
+            return create(lambda: waits.append(limiter.acquire()))
+        except backends.TRANSIENT_ERRORS:
+            if attempt == retries:
+                raise
+        finally:
+            timings["wait"] += sum(waits[waited:])
+            timings["model"] += time.perf_counter() - started - sum(waits[waited:])
+        delay = min(backoff * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+        retried.append(delay)
+        time.sleep(delay)
+        timings["wait"] += delay
+        attempt += 1
+
+def percentile(values, fraction):
+    """Return the value at fraction (0-1) of the sorted values (nearest rank)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def print_report(stats):
+    """Print the outcome of run: failures, throughput and per-stage latency."""
+    done = [result for result in stats["results"] if result[2]]
+    for (job_id, profile_id, kind), error, succeeded in stats["results"]:
+        if not succeeded:
+            print(f"job {job_id}, profile {profile_id}, {kind}: failed: {error}")
+    minutes = stats["seconds"] / 60
+    print(f"{len(done)} documents in {stats['seconds']:.1f}s "
+          f"({len(done) / minutes if minutes else 0:.1f} per minute), "
+          f"{len(stats['results']) - len(done)} failed, {stats['retries']} retries")
+    print(f"{'stage':<6} {'p50':>8} {'p95':>8} {'max':>8}  (seconds per document)")
+    for stage in STAGES:
+        values = stats["timings"][stage]
+        if values:
+            print(f"{stage:<6} {percentile(values, 0.5):8.2f} {percentile(values, 0.95):8.2f} "
+                  f"{max(values):8.2f}")
+
+def main():
+    """Parse command line arguments, generate the documents and print the report."""
+    parser = argparse.ArgumentParser(
+        description="Generate resumes and cover letters for many jobs and profiles.")
+    parser.add_argument("--profiles", type=int, nargs="+", required=True,
+                        help="ids of saved profiles to generate for")
+    parser.add_argument("--jobs", type=int, nargs="+", help="job ids (default: use the filters)")
+    parser.add_argument("--min-salary", type=float)
+    parser.add_argument("--max-salary", type=float)
+    parser.add_argument("--remote", action="store_true", help="remote jobs only")
+    parser.add_argument("--job-type")
+    parser.add_argument("--location", help="location prefix, e.g. 'New York'")
+    parser.add_argument("--posted-since", help="YYYY-MM-DD")
+    parser.add_argument("--limit", type=int, help="most jobs selected by the filters")
+    parser.add_argument("--kind", choices=("resume", "cover-letter", "both", "combined"),
+                        default="both",
+                        help="combined makes both documents from one model request")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE,
+                        help="model requests per minute")
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--token-budget", type=int, default=compaction.PROMPT_TOKEN_BUDGET,
+                        help="tokens a whole prompt may take; longer job descriptions "
+                             "are compacted to fit")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ask the model again instead of using cached answers")
+    parser.add_argument("--export", action="store_true",
+                        help="write the Markdown and PDF files as documents are saved")
+    args = parser.parse_args()
+
+    database.create_table()
+    artifacts.EXPORT_ON_SAVE = args.export
+    compaction.PROMPT_TOKEN_BUDGET = args.token_budget
+    gui.create_user_profiles_table()
+    filters = {"min_salary": args.min_salary, "max_salary": args.max_salary,
+               "is_remote": "yes" if args.remote else None, "job_type": args.job_type,
+               "location": args.location, "posted_since": args.posted_since}
+    kinds = {"resume": ["resume"], "cover-letter": ["cover letter"],
+             "both": ["resume", "cover letter"], "combined": ["resume and cover letter"]}[args.kind]
+    try:
+        jobs = select_jobs(args.jobs, filters, args.limit)
+        profiles = select_profiles(args.profiles)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"generating {len(jobs) * len(profiles) * len(kinds)} documents for {len(jobs)} jobs "
+          f"and {len(profiles)} profiles")
+    print_report(run(jobs, profiles, kinds, args.concurrency, args.rpm, args.retries,
+                     refresh=args.refresh))
+    response_cache.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+benchmarks/bench_artifacts.py
+
+Compares how long saving a generated document takes as the number of saved
+documents grows, with file names found by probing resume.md, resume1.md, ...
+until one is free (as save_resume did) and with numbers handed out by the
+artifacts table (main.save_resume now). The average time per save is printed
+for each block of --step saves.
+
+Run from the project root:
+    python -m benchmarks.bench_artifacts
+    python -m benchmarks.bench_artifacts --saves 5000 --step 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+import connections
+import database
+import main
+
+# about 5 KB, the size of a generated resume
+DOCUMENT = "## Experience\n- Built data pipelines in Python and SQL.\n" * 80
+
+
+def probe_save(document):
+    """Save document under the first free resume<n>.md name, probing from resume.md."""
+    os.makedirs(main.MARKDOWN_FOLDER, exist_ok=True)
+    filename = os.path.join(main.MARKDOWN_FOLDER, "resume.md")
+    counter = 1
+    while os.path.exists(filename):
+        filename = os.path.join(main.MARKDOWN_FOLDER, f"resume{counter}.md")
+        counter += 1
+    with open(filename, "w", encoding="utf-8", newline="\n") as file:
+        file.write(document)
+    return filename
+
+
+def timed_blocks(save, saves, step):
+    """Return the average milliseconds per save of each block of step saves."""
+    blocks = []
+    for _ in range(0, saves, step):
+        start = time.perf_counter()
+        for _ in range(step):
+            save(DOCUMENT)
+        blocks.append((time.perf_counter() - start) * 1000 / step)
+    return blocks
+
+
+def run():
+    """Save documents both ways in temporary directories and print the time per save."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--saves", type=int, default=3000)
+    parser.add_argument("--step", type=int, default=500)
+    args = parser.parse_args()
+
+    results = {}
+    for name, save in (("probing", probe_save),
+                       ("artifacts table", lambda document: main.save_resume(document, {}))):
+        with tempfile.TemporaryDirectory() as tmp:
+            main.MARKDOWN_FOLDER = os.path.join(tmp, "markdown_files")
+            database.DB_NAME = os.path.join(tmp, "jobs.db")
+            database.create_table()
+            results[name] = timed_blocks(save, args.saves, args.step)
+            connections.close_all()
+    print(f"{'saves':>12} " + " ".join(f"{name:>16}" for name in results) + "  (ms per save)")
+    for i in range(len(results["probing"])):
+        print(f"{i * args.step + 1:>5}-{(i + 1) * args.step:<6} "
+              + " ".join(f"{blocks[i]:16.3f}" for blocks in results.values()))
+
+
+if __name__ == "__main__":
+    run()
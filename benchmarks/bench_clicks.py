@@ -0,0 +1,75 @@
+"""
+benchmarks/bench_clicks.py
+
+Measures what one click in the job list costs: loading the selected job and
+formatting its details. The old way opened a new SQLite connection for every
+query; now gui.py reuses the shared connections from connections.py. Both are
+timed over random jobs and p50/p95 latencies are printed.
+
+Run from the project root:
+    python -m benchmarks.bench_clicks
+    python -m benchmarks.bench_clicks --jobs 100000 --clicks 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import connections
+import database
+import gui
+from benchmarks.bench_search import normalized_rows
+
+
+def click_with_new_connection(job_id):
+    """Load and format one job the way gui.py did before, with its own connection."""
+    conn = sqlite3.connect(database.DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    job = cursor.fetchone()
+    conn.close()
+    return gui.format_job_details(job)
+
+
+def click_with_shared_connection(job_id):
+    """Load and format one job through the shared reader."""
+    return gui.format_job_details(gui.get_job_details(job_id))
+
+
+def time_clicks(click, job_ids):
+    """Return the latency of click for each id in job_ids, in milliseconds."""
+    latencies = []
+    for job_id in job_ids:
+        start = time.perf_counter()
+        click(job_id)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    """Build the database, then time clicks both ways."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--clicks", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "jobs.db")
+        database.create_table()
+        database.bulk_insert(normalized_rows(args.jobs))
+        job_ids = [random.randint(1, args.jobs) for _ in range(args.clicks)]
+
+        for name, click in (("new connection per click", click_with_new_connection),
+                            ("shared connection", click_with_shared_connection)):
+            click(job_ids[0])  # warm up the page cache
+            latencies = time_clicks(click, job_ids)
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            print(f"{name:<26} p50 {statistics.median(latencies):6.3f} ms, "
+                  f"p95 {p95:6.3f} ms")
+        connections.close_all()
+
+
+if __name__ == "__main__":
+    main()
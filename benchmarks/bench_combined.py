@@ -0,0 +1,103 @@
+"""
+benchmarks/bench_combined.py
+
+Compares making a resume and a cover letter for the same job with two model
+requests (create_resume, then create_cover_letter) against one combined request
+(create_resume_and_cover_letter). Both run on the stand-in backend, over the
+job descriptions in job-data.json compacted as the GUI compacts them. Prompt
+and answer tokens are estimated at four characters a token. Latency is the
+stand-in's simulated model time plus the time really spent; two requests are
+timed one after the other and, as the GUI's worker pool would run them, at
+once.
+
+Run from the project root:
+    python -m benchmarks.bench_combined
+    python -m benchmarks.bench_combined --jobs 100 --latency 1.5 --tokens-per-second 150
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+import backends
+import compaction
+import main
+
+FEED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "job-data.json")
+# a personal description of about 150 tokens
+PERSONAL = ("Full Name: Alex Doe\nEmail: alex@example.com\nPhone Number: 555 0100\n"
+            "GitHub: alexdoe\nLinkedIn: alexdoe\n"
+            "Projects: ETL pipelines in Python and Airflow; a Flask API for a job board; "
+            "dashboards in Tableau over a Postgres warehouse.\n"
+            "Courses: Databases, Distributed Systems, Machine Learning, Statistics.\n"
+            "Other: three years as a data engineer, AWS certified, fluent in English and Spanish.")
+
+
+def request(backend, create, job_description):
+    """
+    Make one request with create on a fresh chat; return (prompt tokens, answer
+    tokens, seconds), counting the stand-in's waits as time spent.
+    """
+    waits = []
+    backend.sleep = waits.append
+    chat = backend.build_model().start_chat(history=[])
+    start = time.perf_counter()
+    create(chat, job_description, PERSONAL)
+    seconds = time.perf_counter() - start + sum(waits)
+    prompt, answer = chat.history[-2:]
+    return compaction.estimate_tokens(prompt), compaction.estimate_tokens(answer), seconds
+
+
+def measure(backend, jobs):
+    """
+    Make each job's documents both ways. Returns ({way: [prompt tokens, answer tokens]},
+    {way: [seconds per job]}).
+    """
+    budget = compaction.description_budget(PERSONAL)
+    totals = {"two requests": [0, 0], "combined": [0, 0]}
+    latencies = {"two, one after the other": [], "two at once": [], "combined": []}
+    for job in jobs:
+        description = compaction.compact(job["description"], budget)
+        resume = request(backend, main.create_resume, description)
+        letter = request(backend, main.create_cover_letter, description)
+        both = request(backend, main.create_resume_and_cover_letter, description)
+        for name, results in (("two requests", (resume, letter)), ("combined", (both,))):
+            totals[name][0] += sum(result[0] for result in results)
+            totals[name][1] += sum(result[1] for result in results)
+        latencies["two, one after the other"].append(resume[2] + letter[2])
+        latencies["two at once"].append(max(resume[2], letter[2]))
+        latencies["combined"].append(both[2])
+    return totals, latencies
+
+
+def run():
+    """Time both ways over the first jobs of job-data.json and print the savings."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=backends.STAND_IN_LATENCY,
+                        help="median seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=backends.STAND_IN_JITTER)
+    parser.add_argument("--tokens-per-second", type=float,
+                        default=backends.STAND_IN_TOKENS_PER_SECOND)
+    args = parser.parse_args()
+
+    backend = backends.StandInBackend(args.latency, args.jitter, args.tokens_per_second,
+                                      seed=1)
+    with open(FEED, "r", encoding="utf-8") as f:
+        jobs = json.load(f)[:args.jobs]
+    totals, latencies = measure(backend, jobs)
+    print(f"{len(jobs)} jobs, {args.latency} s median first token, "
+          f"{args.tokens_per_second:g} tokens/s")
+    for name, (prompt, answer) in totals.items():
+        print(f"{name:<13} prompt tokens {prompt:9,}   answer tokens {answer:9,}")
+    saved = totals["two requests"][0] - totals["combined"][0]
+    print(f"prompt tokens saved: {saved:,} ({100 * saved / totals['two requests'][0]:.1f}%), "
+          f"requests saved: {len(jobs)}")
+    for name, values in latencies.items():
+        p95 = statistics.quantiles(values, n=20)[-1]
+        print(f"{name:<25} p50 {statistics.median(values):6.2f} s   p95 {p95:6.2f} s")
+
+
+if __name__ == "__main__":
+    run()
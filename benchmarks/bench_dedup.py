@@ -0,0 +1,127 @@
+"""
+benchmarks/bench_dedup.py
+
+Measures dedup.update_clusters on synthetic jobs where a share of the postings are
+reworded copies of an earlier one (a few words changed, as when several providers
+carry the same ad). Prints clustering throughput and how well the clusters match
+the known copies: recall (copies whose exact shingle similarity to their original
+reaches the threshold that were put in its cluster) and false merges (distinct
+postings put in another posting's cluster).
+
+Run from the project root:
+    python -m benchmarks.bench_dedup
+    python -m benchmarks.bench_dedup --jobs 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from itertools import islice
+import connections
+import database
+import dedup
+
+VOCABULARY = [f"word{i}" for i in range(20000)]
+
+
+def posting(index):
+    """Return the description of original posting index (the same every time)."""
+    rng = random.Random(index)
+    return " ".join(rng.choices(VOCABULARY, k=rng.randint(150, 300)))
+
+
+def copy_of(index, original):
+    """Return the description of job index, a copy of original with up to 3 words changed."""
+    rng = random.Random(-index)
+    words = posting(original).split()
+    for position in rng.sample(range(len(words)), rng.randint(0, 3)):
+        words[position] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+
+def synthetic_jobs(count, copy_rate, seed=3):
+    """
+    Yield (job, original index) for count jobs in job-data2.json format. A copy_rate
+    share of them are copies of an earlier posting (see copy_of); for the rest the
+    original index is their own.
+    """
+    rng = random.Random(seed)
+    originals = []
+    for i in range(count):
+        if originals and rng.random() < copy_rate:
+            original = rng.choice(originals)
+            text = copy_of(i, original)
+        else:
+            original = i
+            text = posting(i)
+            originals.append(i)
+        yield {"id": f"dedup-{i}", "title": f"Job {i}", "company": f"Company {i % 5000}",
+               "description": text}, original
+
+
+def jaccard(index, original):
+    """Return the exact shingle similarity of copy index and its original."""
+    copy_hashes = dedup.shingle_hashes(copy_of(index, original))
+    original_hashes = dedup.shingle_hashes(posting(original))
+    return len(copy_hashes & original_hashes) / len(copy_hashes | original_hashes)
+
+
+def main():
+    """Build the database, cluster it and score the clusters."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--jobs", type=int, default=100000)
+    parser.add_argument("--copy-rate", type=float, default=0.3)
+    parser.add_argument("--threshold", type=float, default=dedup.DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "jobs.db")
+        database.create_table()
+        truth = []
+        jobs = synthetic_jobs(args.jobs, args.copy_rate)
+        start = time.perf_counter()
+        while True:
+            batch = list(islice(jobs, database.BATCH_SIZE))
+            if not batch:
+                break
+            truth += [original for _, original in batch]
+            database.bulk_insert(database.normalize_batch([job for job, _ in batch],
+                                                          "job-data2"))
+        print(f"built {args.jobs} jobs in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        dedup.update_clusters(args.threshold)
+        seconds = time.perf_counter() - start
+        print(f"clustered in {seconds:.1f}s ({args.jobs / seconds:,.0f} jobs/s)")
+
+        # ids are assigned in feed order, so job i has id i + 1
+        clusters = [cluster_id for _, cluster_id in connections.reader(database.DB_NAME)
+                    .execute("SELECT id, cluster_id FROM jobs ORDER BY id")]
+        copies = [i for i, original in enumerate(truth) if original != i]
+        duplicates = [i for i in copies if jaccard(i, truth[i]) >= args.threshold]
+        found = sum(1 for i in duplicates if clusters[i] == clusters[truth[i]])
+        merged = sum(1 for i, original in enumerate(truth)
+                     if original == i and clusters[i] != i + 1)
+        print(f"{len(set(clusters)):,} clusters for {args.jobs - len(copies):,} postings "
+              f"and {len(copies):,} copies ({len(duplicates):,} at or above the threshold)")
+        print(f"recall {found / max(len(duplicates), 1):.4f}, false merges {merged}")
+        size = connections.reader(database.DB_NAME).execute(
+            "SELECT sum(pgsize) FROM dbstat WHERE name IN ('job_lsh', 'job_minhash')"
+        ).fetchone()[0] if _has_dbstat() else None
+        if size:
+            print(f"signatures and buckets take {size / 1e6:.1f} MB")
+        connections.close_all()
+
+
+def _has_dbstat():
+    """Return True if this SQLite build has the dbstat virtual table."""
+    try:
+        connections.reader(database.DB_NAME).execute("SELECT 1 FROM dbstat LIMIT 1")
+        return True
+    except Exception:  # pylint: disable=broad-exception-caught
+        return False
+
+
+if __name__ == "__main__":
+    main()
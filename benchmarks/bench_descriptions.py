@@ -0,0 +1,127 @@
+"""
+benchmarks/bench_descriptions.py
+
+Compares storing descriptions inline in the jobs table (as before) with the
+compressed job_descriptions side table and its dictionary of shared paragraphs,
+on job-data.json repeated --scale times. Every copy repeats the same paragraphs,
+so the dictionary saves far more here than on a real feed.
+Prints the size of each layout and the latency of listing jobs (what the GUI
+list does), of a scan that has to read every jobs row, and of opening one job.
+The search index is the same in both layouts, so it is left out of both.
+
+Run from the project root:
+    python -m benchmarks.bench_descriptions
+    python -m benchmarks.bench_descriptions --scale 100
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from itertools import islice
+import connections
+import database
+
+FEED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "job-data.json")
+QUERIES = {
+    "list jobs": "SELECT id, title FROM jobs",
+    "scan titles": "SELECT count(*) FROM jobs WHERE title LIKE '%engineer%'",
+}
+OPEN_JOB_SQL = {
+    "inline": "SELECT description FROM jobs WHERE id = ?",
+    "side table": "SELECT description_text(codec, body) FROM job_descriptions WHERE job_id = ?",
+}
+
+
+def scaled_rows(scale):
+    """Yield normalized rows for job-data.json repeated scale times, each copy a new job."""
+    with open(FEED, "r", encoding="utf-8") as f:
+        jobs = json.load(f)
+    for copy in range(scale):
+        batch = [dict(job, id=f"{copy}-{i}") for i, job in enumerate(jobs)]
+        yield from database.normalize_batch(batch, "job-data")
+
+
+def build(path, scale, inline):
+    """Build a database at path; with inline, descriptions stay in jobs.description."""
+    database.DB_NAME = path
+    database.create_table()
+    conn = connections.writer(path)
+    with conn:
+        # leave the search index out: it is identical in both layouts
+        for name in ("jobs_fts_description_insert", "jobs_fts_description_update",
+                     "jobs_fts_text_update", "jobs_fts_delete"):
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute("DROP TABLE jobs_fts")
+    if not inline:
+        return database.bulk_insert(scaled_rows(scale))
+    rows = scaled_rows(scale)
+    with conn:
+        while True:
+            batch = list(islice(rows, database.BATCH_SIZE))
+            if not batch:
+                break
+            conn.executemany(
+                "INSERT INTO jobs (title, company, description, location, job_type, date_posted,"
+                " min_amount, max_amount, is_remote, job_url, source_id, content_hash)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+    return conn.execute("SELECT count(*) FROM jobs").fetchone()[0]
+
+
+def timed(conn, sql, params=(), repeat=5):
+    """Return the median milliseconds of running sql and fetching every row."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def report(label, path, count):
+    """Print the size of the database at path and its listing and open-job latencies."""
+    connections.close_all()
+    conn = connections.writer(path)
+    conn.execute("VACUUM")
+    pages = dict(conn.execute(
+        "SELECT name, sum(pgsize) FROM dbstat WHERE name IN "
+        "('jobs', 'job_descriptions', 'description_paragraphs') GROUP BY name"
+    ))
+    print(f"{label}: {os.path.getsize(path) / 1e6:,.0f} MB file, jobs table "
+          f"{pages.get('jobs', 0) / 1e6:,.0f} MB, descriptions table "
+          f"{pages.get('job_descriptions', 0) / 1e6:,.0f} MB, shared paragraphs "
+          f"{pages.get('description_paragraphs', 0) / 1e6:,.1f} MB")
+    connections.close_all()
+    conn = connections.reader(path)
+    for name, sql in QUERIES.items():
+        print(f"    {name:<12} {timed(conn, sql):9.1f} ms")
+    sql = OPEN_JOB_SQL[label]
+    ids = random.Random(1).sample(range(1, count + 1), 200)
+    opened = statistics.median(timed(conn, sql, (job_id,), repeat=1) for job_id in ids)
+    print(f"    {'open job':<12} {opened:9.3f} ms")
+
+
+def main():
+    """Build both layouts and compare them."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--scale", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, inline in (("inline", True), ("side table", False)):
+            path = os.path.join(tmp, f"{label.replace(' ', '_')}.db")
+            start = time.perf_counter()
+            count = build(path, args.scale, inline)
+            print(f"built {count:,} jobs ({label}) in {time.perf_counter() - start:.1f}s")
+            report(label, path, count)
+            connections.close_all()
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
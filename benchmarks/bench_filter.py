@@ -0,0 +1,109 @@
+"""
+benchmarks/bench_filter.py
+
+Measures search.filter_jobs on a database of synthetic jobs with varied salaries,
+job types, locations and posting dates. For each filter combination the query plan
+is printed (so a full table scan stands out) along with the time to fetch the first
+page and to walk the following pages with keyset pagination.
+
+Run from the project root:
+    python -m benchmarks.bench_filter
+    python -m benchmarks.bench_filter --jobs 2000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from itertools import islice
+import database
+import search
+
+CITIES = ["Austin, TX", "Boston, MA", "Chicago, IL", "Denver, CO", "New York, NY",
+          "Portland, OR", "San Francisco, CA", "Seattle, WA", "Remote", "Toronto, ON"]
+JOB_TYPES = ["fulltime", "fulltime", "fulltime", "parttime", "contract", "internship"]
+CASES = [
+    ("remote", {"is_remote": "yes"}),
+    ("min salary", {"min_salary": 200000}),
+    ("remote + min salary", {"is_remote": "yes", "min_salary": 150000}),
+    ("job type", {"job_type": "internship"}),
+    ("location prefix", {"location": "new york"}),
+    ("posted since", {"posted_since": "2025-06-01"}),
+    ("salary band + type", {"min_salary": 90000, "max_salary": 120000,
+                            "job_type": "contract"}),
+]
+
+
+def synthetic_jobs(count, seed=7):
+    """Yield count job-data2.json style jobs with varied structured fields."""
+    rng = random.Random(seed)
+    for i in range(count):
+        low = rng.randrange(30, 250) * 1000 if rng.random() < 0.8 else None
+        day = rng.randrange(1, 29)
+        yield {
+            "id": f"filter-{i}",
+            "title": f"Engineer {i % 997}",
+            "company": f"Company {i % 5000}",
+            "description": "",
+            "location": rng.choice(CITIES),
+            "job_type": rng.choice(JOB_TYPES),
+            "date_posted": f"2025-{rng.randrange(1, 13):02d}-{day:02d}",
+            "min_amount": low,
+            "max_amount": low + rng.randrange(0, 60) * 1000 if low else None,
+            "is_remote": rng.random() < 0.2,
+        }
+
+
+def normalized_rows(count):
+    """Yield normalized rows for count synthetic jobs, normalizing a batch at a time."""
+    jobs = synthetic_jobs(count)
+    while True:
+        batch = list(islice(jobs, database.BATCH_SIZE))
+        if not batch:
+            return
+        yield from database.normalize_batch(batch, "job-data2")
+
+
+def query_plan(filters):
+    """Return the EXPLAIN QUERY PLAN details for filter_jobs(filters)."""
+    conn = sqlite3.connect(database.DB_NAME)
+    sql, params = search.build_filter_query(conn.cursor(), filters)
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    conn.close()
+    return plan
+
+
+def main():
+    """Build the database, then time each filter combination."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--jobs", type=int, default=1000000)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "jobs.db")
+        database.create_table()
+        start = time.perf_counter()
+        database.bulk_insert(normalized_rows(args.jobs))
+        print(f"built {args.jobs} jobs in {time.perf_counter() - start:.1f}s\n")
+
+        for name, filters in CASES:
+            start = time.perf_counter()
+            page = search.filter_jobs(filters, limit=args.limit)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            pages = 1
+            while page and pages < args.pages:
+                page = search.filter_jobs(filters, after_id=page[-1][0], limit=args.limit)
+                pages += 1
+            rest = (time.perf_counter() - start) / max(pages - 1, 1)
+            print(f"{name:<22} first page {first * 1000:7.2f} ms, "
+                  f"next pages {rest * 1000:7.2f} ms avg")
+            for line in query_plan(filters):
+                print(f"    {line}")
+
+
+if __name__ == "__main__":
+    main()
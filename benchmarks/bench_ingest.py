@@ -0,0 +1,81 @@
+"""
+benchmarks/bench_ingest.py
+
+Measures how fast normalized jobs are written to the jobs table.
+For each size it times the original one-execute-per-job loop with default
+connection settings against database.bulk_insert (executemany, one transaction,
+LOAD_PRAGMAS), and prints rows/second for both.
+
+Run from the project root:
+    python -m benchmarks.bench_ingest
+    python -m benchmarks.bench_ingest --sizes 1000 100000 --batch-size 2000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import database
+
+
+def synthetic_jobs(count):
+    """Yield count fake jobs in the job-data2.json format."""
+    for i in range(count):
+        yield {
+            "id": f"bench-{i}",
+            "title": f"Software Engineer {i}",
+            "company": f"Company {i % 5000}",
+            "description": "Build and maintain backend services in Python. " * 8,
+            "location": "Boston, MA",
+            "job_type": "fulltime",
+            "date_posted": "2025-01-01",
+            "min_amount": str(50000 + i % 50000),
+            "max_amount": str(90000 + i % 50000),
+            "is_remote": i % 2 == 0,
+            "job_url": f"https://example.com/jobs/{i}",
+        }
+
+
+def insert_per_row(rows):
+    """The original ingest loop: one job written at a time, default pragmas."""
+    conn = sqlite3.connect(database.DB_NAME)
+    for row in rows:
+        database.write_rows(conn, [row])
+    conn.commit()
+    conn.close()
+
+
+def run(size, loader):
+    """Load size synthetic jobs into a fresh database with loader, return rows/second."""
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.create_table()
+        # normalize up front so only the database writes are timed
+        rows = database.normalize_batch(list(synthetic_jobs(size)), "job-data2")
+        start = time.perf_counter()
+        loader(rows)
+        elapsed = time.perf_counter() - start
+    return size / elapsed
+
+
+def main():
+    """Parse arguments and print a rows/second table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--batch-size", type=int, default=database.BATCH_SIZE)
+    parser.add_argument("--skip-legacy", action="store_true",
+                        help="only time the bulk loader")
+    args = parser.parse_args()
+
+    print(f"{'jobs':>10} {'per-row rows/s':>16} {'bulk rows/s':>14} {'speedup':>8}")
+    for size in args.sizes:
+        bulk = run(size, lambda rows: database.bulk_insert(rows, batch_size=args.batch_size))
+        if args.skip_legacy:
+            print(f"{size:>10} {'-':>16} {bulk:>14,.0f} {'-':>8}")
+            continue
+        legacy = run(size, insert_per_row)
+        print(f"{size:>10} {legacy:>16,.0f} {bulk:>14,.0f} {bulk / legacy:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+benchmarks/bench_listing.py
+
+Measures what the GUI reads before its window opens, for growing job tables:
+loading every job into the list (as before) against reading the first page of
+the paged job list. Prints the time and the memory the list data takes.
+
+Run from the project root:
+    python -m benchmarks.bench_listing
+    python -m benchmarks.bench_listing --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import connections
+import database
+import gui
+from benchmarks.bench_filter import normalized_rows
+
+
+def measure(load):
+    """Return (milliseconds, peak KB allocated) of load(); memory is traced on a second run."""
+    start = time.perf_counter()
+    load()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    load()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds * 1000, peak / 1024
+
+
+def load_all():
+    """Build the job list the old way: every job, formatted up front."""
+    return [f"{job[0]}: {job[1]}" for job in gui.get_jobs(canonical_only=True)], gui.get_job_types()
+
+
+def load_first_page():
+    """Build the job list the paged way: the first page only."""
+    pager = gui.JobPager(gui.get_jobs_page)
+    return [f"{job[0]}: {job[1]}" for job in pager.current()], gui.get_job_types()
+
+
+def main():
+    """Build a database of each size and time both ways of opening the job list."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_NAME = os.path.join(tmp, "jobs.db")
+            database.create_table()
+            database.bulk_insert(normalized_rows(size))
+            load_first_page()  # open the connections, as the GUI has by then
+            for name, load in (("all jobs", load_all), ("first page", load_first_page)):
+                milliseconds, peak = measure(load)
+                print(f"{size:>9,} jobs, {name:<10} {milliseconds:9.1f} ms {peak:11,.0f} KB")
+            connections.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+benchmarks/bench_load.py
+
+Load tests the generation pipeline offline. main.py is switched to the
+stand-in backend (backends.StandInBackend), and the requests are started the
+way the GUI starts them, through generation.Generations: session pool,
+response cache, model call (streamed or not), Markdown file and PDF. Every
+request is for a different job, so none is answered from the cache. Throughput
+and the p50/p95/p99 latency to the saved PDF are printed, counted from the
+start (total, with the wait for a free worker) and from when a worker took the
+request (service); when streaming, the time to the first text is printed too.
+
+Run from the project root:
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --requests 500 --concurrency 16 --stream
+    python -m benchmarks.bench_load --latency 2 --jitter 0.8 --error-rate 0.05
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import backends
+import database
+import generation
+import main
+
+
+def percentiles(values):
+    """Return p50, p95 and p99 of values."""
+    if len(values) < 2:
+        return (values[0],) * 3 if values else (0.0,) * 3
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return statistics.median(values), cuts[94], cuts[98]
+
+
+def load(requests, concurrency, stream):
+    """
+    Start requests generations on a pool of concurrency workers and wait for them.
+    Returns (seconds, {task id: (queued, generating, finished, status)},
+    {task id: seconds to the first text}).
+    """
+    times = {}
+    lock = threading.Lock()
+    finished = threading.Semaphore(0)
+
+    def post(_event, value):
+        task_id, status, _detail = value
+        with lock:
+            if status == generation.QUEUED:
+                times[task_id] = (time.perf_counter(), None, None, status)
+            elif status == generation.GENERATING:
+                times[task_id] = (times[task_id][0], time.perf_counter(), None, status)
+            elif status in (generation.DONE, generation.FAILED, generation.CANCELLED):
+                times[task_id] = times[task_id][:2] + (time.perf_counter(), status)
+                finished.release()
+
+    generations = generation.Generations(post, max_workers=concurrency)
+    start = time.perf_counter()
+    for i in range(requests):
+        generations.start("resume" if i % 2 else "cover letter", f"Job {i}: data engineer",
+                          "Python and SQL developer", stream=stream)
+    for _ in range(requests):
+        finished.acquire()  # pylint: disable=consider-using-with
+    seconds = time.perf_counter() - start
+    generations.shutdown()
+    return seconds, times, generations.first_token
+
+
+def run():
+    """Run the load test against a stand-in backend in a temporary directory."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=generation.MAX_WORKERS)
+    parser.add_argument("--stream", action="store_true", help="stream answers like the GUI")
+    parser.add_argument("--latency", type=float, default=backends.STAND_IN_LATENCY,
+                        help="median seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=backends.STAND_IN_JITTER,
+                        help="lognormal sigma of that delay (0 for a fixed delay)")
+    parser.add_argument("--tokens-per-second", type=float,
+                        default=backends.STAND_IN_TOKENS_PER_SECOND)
+    parser.add_argument("--answer-tokens", type=int, default=backends.STAND_IN_ANSWER_TOKENS)
+    parser.add_argument("--error-rate", type=float, default=backends.STAND_IN_ERROR_RATE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    main.use_backend(backends.StandInBackend(
+        args.latency, args.jitter, args.tokens_per_second, args.answer_tokens,
+        error_rate=args.error_rate, seed=args.seed))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            database.DB_NAME = os.path.join(tmp, "jobs.db")
+            database.create_table()
+            seconds, times, first_token = load(args.requests, args.concurrency, args.stream)
+        finally:
+            os.chdir(cwd)
+
+    done = [row for row in times.values() if row[3] == generation.DONE]
+    failed = sum(row[3] == generation.FAILED for row in times.values())
+    print(f"{args.requests} requests, {args.concurrency} at a time, "
+          f"{'streamed' if args.stream else 'not streamed'}: {len(done)} done, "
+          f"{failed} failed in {seconds:.1f}s ({len(done) / seconds:.2f} documents/s)")
+    # total includes the wait in the queue; service starts when a worker takes the task
+    for name, values in (("total", [end - queued for queued, _, end, _ in done]),
+                         ("service", [end - started for _, started, end, _ in done]),
+                         ("first text", list(first_token.values()))):
+        if values:
+            p50, p95, p99 = percentiles(values)
+            print(f"{name:<10} p50 {p50:7.3f} s   p95 {p95:7.3f} s   p99 {p99:7.3f} s")
+
+
+if __name__ == "__main__":
+    run()
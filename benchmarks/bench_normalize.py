@@ -0,0 +1,103 @@
+"""
+benchmarks/bench_normalize.py
+
+Compares normalizing jobs one at a time (one helper call per field and a joined
+string hashed per job, as the per-row save functions did) with the batched
+database.normalize_batch stage, on the bundled job-data.json repeated to the
+requested size and on synthetic job-data2.json jobs. Also reports how much of
+the batched time is the sha1 content hash the upsert compares, which no amount
+of batching removes.
+
+Run from the project root:
+    python -m benchmarks.bench_normalize
+    python -m benchmarks.bench_normalize --jobs 500000 --batch-size 2000
+"""
+import argparse
+import hashlib
+import json
+import time
+import database
+from benchmarks.bench_ingest import synthetic_jobs
+
+TEXT_COLUMNS = ("title", "company", "description", "location", "job_type", "date_posted")
+
+
+def best_of(func, *args, repeat=3):
+    """Return the fastest of repeat timings of func(*args)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def normalize_one(job, adapter):
+    """Normalize one record field by field, the way the per-row save functions did."""
+    if not job.get("company"):
+        return None
+    row = [job.get(adapter["fields"][column]) for column in TEXT_COLUMNS]
+    salary = adapter["salary"]
+    if salary[0] == "range":
+        row.extend(database.extract_salary(job.get(salary[1], "")))
+    else:
+        row += [database.convert_float(job.get(salary[1], "0")),
+                database.convert_float(job.get(salary[2], "0"))]
+    remote = adapter["is_remote"]
+    row.append(database.convert_is_remote(job.get(remote)) if remote else "no")
+    url = adapter["url"]
+    if url[0] == "providers":
+        row.append(database.extract_job_url(job.get(url[1], [])))
+    else:
+        row.append(next((job.get(key) for key in url[1:] if job.get(key)), None))
+    content_hash = hashlib.sha1("\x1f".join(map(str, row)).encode("utf-8")).hexdigest()
+    source_id = job.get("id")
+    return tuple(row) + (str(source_id) if source_id else database.hash_source_id(row),
+                         content_hash)
+
+
+def per_row(jobs, adapter):
+    """Normalize jobs one at a time with normalize_one."""
+    adapter = database.ADAPTERS[adapter]
+    return [normalize_one(job, adapter) for job in jobs]
+
+
+def batched(jobs, adapter, batch_size):
+    """Normalize jobs batch_size at a time with normalize_batch."""
+    return [database.normalize_batch(jobs[i:i + batch_size], adapter)
+            for i in range(0, len(jobs), batch_size)]
+
+
+def hashes_only(rows):
+    """Take the content hashes of already normalized rows, as key_rows does."""
+    return [hashlib.sha1(text).hexdigest()
+            for text in map(str.encode, map(database.ROW_FORMAT.__mod__, rows))]
+
+
+def main():
+    """Parse arguments and print jobs/second for both paths and the hash's share."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--jobs", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=database.BATCH_SIZE)
+    args = parser.parse_args()
+
+    with open("job-data.json", "r", encoding="utf-8") as f:
+        sample = json.load(f)
+    feeds = {
+        "job-data": (sample * (args.jobs // len(sample) + 1))[:args.jobs],
+        "job-data2": list(synthetic_jobs(args.jobs)),
+    }
+
+    print(f"{'format':>10} {'per-row jobs/s':>15} {'batched jobs/s':>15} {'speedup':>8} "
+          f"{'sha1 share':>11}")
+    for name, jobs in feeds.items():
+        row_time = best_of(per_row, jobs, name)
+        batch_time = best_of(batched, jobs, name, args.batch_size)
+        rows = [row[:10] for row in database.normalize_batch(jobs, name)]
+        hash_time = best_of(hashes_only, rows)
+        print(f"{name:>10} {len(jobs) / row_time:>15,.0f} {len(jobs) / batch_time:>15,.0f} "
+              f"{row_time / batch_time:>7.2f}x {hash_time / batch_time:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+benchmarks/bench_parallel_ingest.py
+
+Shows how ingest.ingest_paths throughput scales with the number of worker processes.
+It writes a set of synthetic feed shards once, then ingests them into a fresh
+database for each worker count and prints rows/second.
+
+Run from the project root:
+    python -m benchmarks.bench_parallel_ingest
+    python -m benchmarks.bench_parallel_ingest --shards 32 --jobs-per-shard 20000 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import database
+import ingest
+from benchmarks.bench_ingest import synthetic_jobs
+
+
+def write_shards(directory, shards, jobs_per_shard):
+    """Write shards JSON files of jobs_per_shard synthetic jobs each."""
+    for shard in range(shards):
+        path = os.path.join(directory, f"shard{shard:03}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for i, job in enumerate(synthetic_jobs(jobs_per_shard)):
+                job["id"] = f"{shard}-{i}"
+                f.write(("," if i else "") + json.dumps(job))
+            f.write("]")
+
+
+def main():
+    """Parse arguments and print a rows/second table per worker count."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--jobs-per-shard", type=int, default=10000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        feeds = os.path.join(tmp, "feeds")
+        os.makedirs(feeds)
+        write_shards(feeds, args.shards, args.jobs_per_shard)
+        paths = ingest.expand_sources(feeds)
+        total = args.shards * args.jobs_per_shard
+
+        print(f"{args.shards} shards, {total} jobs, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>9} {'rows/s':>12} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            database.DB_NAME = os.path.join(tmp, f"bench{workers}.db")
+            stats = ingest.ingest_paths(paths, workers=workers)
+            rate = total / stats["seconds"]
+            baseline = baseline or rate
+            print(f"{workers:>8} {stats['seconds']:>9.2f} {rate:>12,.0f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
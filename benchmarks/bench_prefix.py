@@ -0,0 +1,96 @@
+"""
+benchmarks/bench_prefix.py
+
+Measures what reusing the profile's part of the prompt (main.profile_prefix)
+saves when one profile is used for many jobs. Resumes for the first jobs of
+job-data.json, compacted as the GUI compacts them, are made on the stand-in
+backend in three ways:
+- with the whole prompt in every request
+- in a session seeded once with the profile
+- in a session on a context cache holding the profile
+
+Prompt tokens the model reads and those it takes from the context cache are
+counted per request. Latency is the stand-in's simulated model time plus the
+time really spent; the stand-in reads prompts (and chat history) at
+--prefill-tokens-per-second before its first token. As with the real API, a
+seeded session sends its history again with every request, so it reads as much
+as the whole prompt.
+
+Run from the project root:
+    python -m benchmarks.bench_prefix
+    python -m benchmarks.bench_prefix --jobs 100 --profile-tokens 800
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+import backends
+import compaction
+import main
+from benchmarks.bench_combined import PERSONAL
+
+FEED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "job-data.json")
+# how each way checks its sessions out: with the profile prefix or without
+WAYS = {"whole prompt": False, "seeded session": True, "context cache": True}
+
+
+def measure(backend, descriptions, personal, use_prefix):
+    """
+    Make a resume for each job description in sessions from main.SESSIONS, and
+    return a list of (prompt tokens read, cached tokens, seconds) per request.
+    """
+    results = []
+    prefix = main.profile_prefix(personal) if use_prefix else ""
+    for description in descriptions:
+        waits = []
+        backend.sleep = waits.append
+        start = time.perf_counter()
+        with main.SESSIONS.session(prefix) as chat:
+            main.create_resume(chat, description, personal)
+            results.append(chat.usage + (time.perf_counter() - start + sum(waits),))
+    return results
+
+
+def run():
+    """Make resumes for the first jobs of job-data.json each way and print the savings."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--profile-tokens", type=int, default=400,
+                        help="about how long the personal description is")
+    parser.add_argument("--latency", type=float, default=backends.STAND_IN_LATENCY,
+                        help="median seconds before the first token, prompt aside")
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=2000)
+    parser.add_argument("--tokens-per-second", type=float,
+                        default=backends.STAND_IN_TOKENS_PER_SECOND)
+    args = parser.parse_args()
+
+    with open(FEED, "r", encoding="utf-8") as f:
+        jobs = json.load(f)[:args.jobs]
+    personal = (PERSONAL + "\n") * max(1, round(args.profile_tokens
+                                                / compaction.estimate_tokens(PERSONAL)))
+    budget = compaction.description_budget(personal)
+    descriptions = [compaction.compact(job["description"], budget) for job in jobs]
+    print(f"{len(jobs)} jobs, one profile of {compaction.estimate_tokens(personal)} tokens")
+    baseline = None
+    for way, use_prefix in WAYS.items():
+        backend = backends.StandInBackend(
+            args.latency, 0, args.tokens_per_second,
+            prefill_tokens_per_second=args.prefill_tokens_per_second,
+            context_cache=way == "context cache", seed=1)
+        main.use_backend(backend)
+        results = measure(backend, descriptions, personal, use_prefix)
+        read = sum(result[0] for result in results)
+        cached = sum(result[1] for result in results)
+        latencies = [result[2] for result in results]
+        baseline = baseline or (read, statistics.median(latencies))
+        print(f"{way:<15} prompt tokens read {read / len(results):7.1f}/request "
+              f"({100 * (1 - read / baseline[0]):5.1f}% fewer), cached {cached / len(results):6.1f}"
+              f"   p50 {statistics.median(latencies):6.3f} s "
+              f"({1000 * (baseline[1] - statistics.median(latencies)):+.0f} ms saved)   "
+              f"p95 {statistics.quantiles(latencies, n=20)[-1]:6.3f} s")
+
+
+if __name__ == "__main__":
+    run()
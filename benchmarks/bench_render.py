@@ -0,0 +1,115 @@
+"""
+benchmarks/bench_render.py
+
+Compares PDF renders per second of the old path (save the Markdown file, read it
+back, replace two characters and print the raw Markdown with one FPDF
+multi_cell) with rendering.render, which lays the parsed Markdown out in
+memory. --documents resumes are made from the job descriptions of
+job-data.json: a heading, a contact line, a summary and bullet points with bold
+lead-ins, about the size of a generated one. The old path fails on any
+character outside Latin-1 but those two, so the documents it cannot render are
+counted, and it is timed on copies with such characters replaced by "?".
+
+Run from the project root:
+    python -m benchmarks.bench_render
+    python -m benchmarks.bench_render --documents 500
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from fpdf import FPDF
+import rendering
+
+FEED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "job-data.json")
+
+
+def resume(description):
+    """Return a Markdown resume made from the sentences of a job description."""
+    sentences = [sentence.strip() for sentence in re.split(r"(?<=[.!?])\s+", description)
+                 if len(sentence.strip()) > 20]
+    bullets = "\n".join(f"- **{' '.join(sentence.split()[:2])}** "
+                        f"{' '.join(sentence.split()[2:])}" for sentence in sentences[1:30])
+    return (f"# Alex Doe\nalex@example.com | (555) 010-2030 | New York, NY\n\n"
+            f"## Summary\n{sentences[0] if sentences else ''}\n\n"
+            f"## Experience\n### Data Engineer, Acme Corp (2019-2024)\n{bullets}\n\n"
+            f"## Education\n- B.S. Computer Science, State University\n")
+
+
+def old_path(text, folder, number):
+    """Save text as a Markdown file and convert it the way main.py used to."""
+    md_filename = os.path.join(folder, f"resume-{number}.md")
+    with open(md_filename, "w", encoding="utf-8", newline="\n") as file:
+        file.write(text)
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    with open(md_filename, "r", encoding="utf-8") as f:
+        content = f.read()
+    content = content.replace("\u2013", "-")
+    content = content.replace("\u2019", "'")
+    pdf.multi_cell(0, 10, content)
+    pdf.output(os.path.join(folder, f"resume-{number}.pdf"))
+
+
+def new_path(text, folder, number):
+    """Render text in memory and write the PDF file, as main.render_pdf does."""
+    with open(os.path.join(folder, f"resume-{number}.pdf"), "wb") as file:
+        file.write(rendering.render(text))
+
+
+def count_failures(texts, folder):
+    """Return how many of texts the old path cannot render."""
+    failed = 0
+    for number, text in enumerate(texts):
+        try:
+            old_path(text, folder, number)
+        except UnicodeEncodeError:
+            failed += 1
+    return failed
+
+
+def fastest(paths, folder, rounds):
+    """Return the seconds of the fastest of rounds renders of each path's documents."""
+    best = dict.fromkeys(paths, float("inf"))
+    for _ in range(rounds):
+        for name, (render, documents) in paths.items():
+            start = time.perf_counter()
+            for number, text in enumerate(documents):
+                render(text, folder, number)
+            best[name] = min(best[name], time.perf_counter() - start)
+    return best
+
+
+def run():
+    """Render the resumes both ways, in turns, and print renders per second."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--documents", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5,
+                        help="times both paths render every document; the fastest round counts")
+    args = parser.parse_args()
+
+    with open(FEED, "r", encoding="utf-8") as f:
+        jobs = [job for job in json.load(f) if job["description"]]
+    texts = [resume(jobs[number % len(jobs)]["description"]) for number in range(args.documents)]
+    print(f"{len(texts)} resumes, {sum(map(len, texts)) / len(texts):.0f} characters each "
+          f"on average")
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        new_path(texts[0], folder, "first")
+        print(f"rendering.render, first render of the process  "
+              f"{(time.perf_counter() - start) * 1000:8.1f} ms")
+        print(f"old path fails on {count_failures(texts, folder)} of {len(texts)}")
+        latin1 = [text.encode("latin-1", "replace").decode("latin-1") for text in texts]
+        paths = {"old path": (old_path, latin1), "rendering.render": (new_path, texts)}
+        for name, seconds in fastest(paths, folder, args.rounds).items():
+            print(f"{name:<17} {len(texts) / seconds:8.1f} renders/s "
+                  f"{seconds * 1000 / len(texts):8.2f} ms each")
+
+
+if __name__ == "__main__":
+    run()
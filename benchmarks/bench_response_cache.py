@@ -0,0 +1,91 @@
+"""
+benchmarks/bench_response_cache.py
+
+Measures how long a regeneration answered from the response cache takes. The
+cache is filled with resume-sized answers, then cached requests are sent
+through main.create_resume again with a chat that must not be asked. p50/p95
+latencies of storing an answer, of a hit and of a miss (the lookup only) are
+printed.
+
+Run from the project root:
+    python -m benchmarks.bench_response_cache
+    python -m benchmarks.bench_response_cache --entries 20000 --lookups 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import connections
+import database
+import main
+import response_cache
+
+# about 5 KB, the size of a generated resume
+ANSWER = "## Experience\n- Built data pipelines in Python and SQL.\n" * 80
+
+
+class Response:  # pylint: disable=too-few-public-methods
+    """A model answer."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Chat:  # pylint: disable=too-few-public-methods
+    """A chat that answers with ANSWER, or fails if it must not be asked."""
+
+    def __init__(self, allowed=True):
+        self.allowed = allowed
+
+    def send_message(self, prompt):
+        """Return ANSWER."""
+        if not self.allowed:
+            raise AssertionError(f"cache miss for {prompt[:40]!r}")
+        return Response(ANSWER)
+
+
+def timed(call, count):
+    """Return the latencies, in milliseconds, of call(i) for i in range(count)."""
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        call(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies):
+    """Print p50 and p95 of latencies."""
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    print(f"{name:<6} p50 {statistics.median(latencies):7.3f} ms   p95 {p95:7.3f} ms")
+
+
+def run():
+    """Fill a cache in a temporary database and time stores, hits and misses."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "jobs.db")
+        database.create_table()
+        # other answers, so lookups run against a cache of realistic size
+        report("store", timed(lambda i: response_cache.put(f"filler {i}", ANSWER),
+                              args.entries))
+        for i in range(args.lookups):
+            main.create_resume(Chat(), f"job {i}", "me", cache=True)
+        report("hit", timed(lambda _: main.create_resume(
+            Chat(allowed=False), f"job {random.randrange(args.lookups)}", "me", cache=True),
+                            args.lookups))
+        report("miss", timed(lambda i: response_cache.get(f"missing {i}"), args.lookups))
+        stats = response_cache.stats()
+        print(f"{stats['entries']:,} answers, {stats['bytes'] / 1024 / 1024:.1f} MB, "
+              f"{stats['evictions']:,} evicted")
+        connections.close_all()
+
+
+if __name__ == "__main__":
+    run()
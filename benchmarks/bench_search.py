@@ -0,0 +1,83 @@
+"""
+benchmarks/bench_search.py
+
+Measures search.search_jobs latency as the user types, on a database of synthetic
+jobs with a varied vocabulary. Every prefix of each query is timed (like the GUI's
+search box firing on every key) and p50/p95/max latencies are printed.
+
+Run from the project root:
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --jobs 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from itertools import islice
+import database
+import search
+
+TECH_WORDS = ["python", "java", "golang", "rust", "sql", "aws", "kubernetes", "docker",
+              "backend", "frontend", "remote", "hybrid", "senior", "staff", "data",
+              "machine", "learning", "react", "django", "security", "cloud", "platform"]
+QUERIES = ["python remote backend", "senior data engineer", "kubernetes aws", "react"]
+
+
+def synthetic_jobs(count, seed=42):
+    """Yield count job-data2.json style jobs with random titles and descriptions."""
+    rng = random.Random(seed)
+    filler = [f"word{i}" for i in range(5000)]
+    for i in range(count):
+        title = " ".join(rng.sample(TECH_WORDS, 2)) + " engineer"
+        words = rng.choices(filler, k=80) + rng.choices(TECH_WORDS, k=8)
+        rng.shuffle(words)
+        yield {
+            "id": f"bench-{i}",
+            "title": title,
+            "company": f"Company {i % 5000}",
+            "description": " ".join(words),
+            "location": rng.choice(["Boston, MA", "Austin, TX", "Remote", "New York, NY"]),
+            "job_type": "fulltime",
+        }
+
+
+def normalized_rows(count):
+    """Yield normalized rows for count synthetic jobs, normalizing a batch at a time."""
+    jobs = synthetic_jobs(count)
+    while True:
+        batch = list(islice(jobs, database.BATCH_SIZE))
+        if not batch:
+            return
+        yield from database.normalize_batch(batch, "job-data2")
+
+
+def main():
+    """Build the database, then time every prefix of each query."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--jobs", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.create_table()
+        start = time.perf_counter()
+        database.bulk_insert(normalized_rows(args.jobs))
+        print(f"indexed {args.jobs} jobs in {time.perf_counter() - start:.1f}s")
+
+        timings = []
+        for query in QUERIES:
+            for end in range(1, len(query) + 1):
+                start = time.perf_counter()
+                search.search_jobs(query[:end], limit=args.limit)
+                timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{len(timings)} keystrokes: p50 {statistics.median(timings):.1f} ms, "
+              f"p95 {p95:.1f} ms, max {timings[-1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+benchmarks/bench_sessions.py
+
+Measures the per-request cost of getting a chat session: setting the model up
+for every request (reading secrets.txt, configuring the client, building the
+GenerativeModel and starting a chat), as every generate click did, against
+checking a session out of the shared pool. genai.configure drops the client
+it made before, so setting up per request also builds a new API client (and
+opens a new connection on the first send); that client is timed too. No
+request is sent, so this runs offline with a dummy API key and the connection
+setup is not included.
+
+Run from the project root:
+    python -m benchmarks.bench_sessions
+    python -m benchmarks.bench_sessions --requests 5000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from google.generativeai import client  # pylint: disable=no-name-in-module
+import main
+import sessions
+
+
+def timed(call, count):
+    """Return the latencies, in microseconds, of count calls of call()."""
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def setup_with_client():
+    """Set the model up and build the API client its first request would."""
+    main.setup_model()
+    client.get_default_generative_client()
+
+
+def pooled(pool):
+    """Check a session out of pool and back in."""
+    with pool.session():
+        pass
+
+
+def run():
+    """Time each way of getting a session in a directory with a dummy secrets.txt."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            with open("secrets.txt", "w", encoding="utf-8") as f:
+                f.write("dummy-key")
+            pool = sessions.SessionPool(main.build_model)
+            for name, call in (("setup_model per request", main.setup_model),
+                               ("setup_model + new client", setup_with_client),
+                               ("session pool", lambda: pooled(pool))):
+                call()  # warm up imports and the pool
+                latencies = timed(call, args.requests)
+                p95 = statistics.quantiles(latencies, n=20)[-1]
+                print(f"{name:<25} p50 {statistics.median(latencies):8.1f} us   "
+                      f"p95 {p95:8.1f} us")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    run()
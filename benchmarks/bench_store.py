@@ -0,0 +1,118 @@
+"""
+benchmarks/bench_store.py
+
+Measures the artifacts store with many saved documents. --documents resumes
+are saved for jobs spread over --profiles profiles, --duplicates of them
+answered with the same text as an earlier one (a regeneration from the response
+cache), without writing files. Printed are the save rate, what the documents
+take in the database against what they would take as loose files, and how long
+listing by job and by profile, exporting one document, deleting a profile's
+records and collecting the unused blobs take.
+
+Run from the project root:
+    python -m benchmarks.bench_store
+    python -m benchmarks.bench_store --documents 300000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import artifacts
+import connections
+import database
+import main
+
+FEED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "job-data.json")
+
+
+def timed(function, *args, repeat=200):
+    """Call function(*args) repeat times and return the median milliseconds per call."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def fill(documents, profiles, duplicates, rng):
+    """
+    Save the documents, real job descriptions of job-data.json (about 5 KB, the
+    size of a generated resume) standing in for their text, and return (seconds
+    taken, disk space they would take as loose files in 4 KB blocks, job ids used).
+    """
+    with open(FEED, "r", encoding="utf-8") as f:
+        bodies = [job["description"] for job in json.load(f) if job["description"]]
+    jobs = max(1, documents // (2 * profiles))
+    texts, loose = [], 0
+    start = time.perf_counter()
+    for number in range(documents):
+        if texts and rng.random() < duplicates:
+            text = rng.choice(texts)
+        else:
+            text = f"# Resume {number}\n{rng.choice(bodies)}"
+            texts.append(text)
+        loose += -(-len(text.encode("utf-8")) // 4096) * 4096
+        main.save_resume(text, {"job_id": rng.randrange(jobs),
+                                "profile_id": rng.randrange(profiles)})
+    return time.perf_counter() - start, loose, jobs
+
+
+def print_lookups(jobs, rng):
+    """Print how long listing and exporting documents takes."""
+    print(f"find(job_id)                  "
+          f"{timed(lambda: artifacts.find(job_id=rng.randrange(jobs))):8.3f} ms")
+    print(f"find(profile_id, limit=100)   "
+          f"{timed(lambda: artifacts.find(profile_id=0, limit=100)):8.3f} ms")
+    print(f"find(job_id, profile_id)      "
+          f"{timed(lambda: artifacts.find(rng.randrange(jobs), 0)):8.3f} ms")
+    paths = [row[2] for row in artifacts.find(profile_id=1, limit=200)]
+    print(f"export one Markdown file      "
+          f"{timed(lambda: artifacts.export(paths.pop()), repeat=100):8.3f} ms")
+    md_filename = main.save_resume("## Experience\n- Data engineer at Acme\n" * 20)
+    pdf_filename = main.convert_text_to_pdf(md_filename)
+    print(f"export one PDF (rendered)     "
+          f"{timed(artifacts.export, pdf_filename, repeat=1):8.3f} ms")
+
+
+def run():
+    """Fill a temporary store and print how it performs."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--profiles", type=int, default=5)
+    parser.add_argument("--duplicates", type=float, default=0.3,
+                        help="share of documents identical to an earlier one")
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        main.MARKDOWN_FOLDER = os.path.join(tmp, "markdown_files")
+        main.PDF_FOLDER = os.path.join(tmp, "pdf_files")
+        database.DB_NAME = os.path.join(tmp, "jobs.db")
+        database.create_table()
+        artifacts.EXPORT_ON_SAVE = False
+        seconds, loose, jobs = fill(args.documents, args.profiles, args.duplicates, rng)
+        records, blobs, size, stored = artifacts.stats()
+        print(f"{records} documents saved in {seconds:.1f}s ({records / seconds:.0f}/s), "
+              f"{blobs} distinct")
+        print(f"as loose files {loose / 1e6:.1f} MB on disk, stored {size / 1e6:.1f} MB in "
+              f"{stored / 1e6:.1f} MB compressed, database file "
+              f"{os.path.getsize(database.DB_NAME) / 1e6:.1f} MB")
+        print_lookups(jobs, rng)
+        start = time.perf_counter()
+        deleted = artifacts.delete(profile_id=0)
+        print(f"delete profile 0's records    {(time.perf_counter() - start) * 1000:8.1f} ms "
+              f"({deleted} records)")
+        start = time.perf_counter()
+        count, size = artifacts.collect_garbage()
+        print(f"collect_garbage               {(time.perf_counter() - start) * 1000:8.1f} ms "
+              f"({count} blobs, {size / 1e6:.1f} MB)")
+        connections.close_all()
+
+
+if __name__ == "__main__":
+    run()
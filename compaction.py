@@ -0,0 +1,214 @@
+"""
+compaction.py
+
+This module shortens job descriptions before they go into a prompt, so long
+postings full of boilerplate do not inflate input tokens, latency and cost. A
+description is split into sections (a short heading line and the paragraphs
+under it), and each section is scored: requirements, responsibilities and
+skills score high, while benefits, EEO statements, "About us" text and
+paragraphs shared with other postings (see description_paragraphs) score low.
+The lowest scoring sections are dropped until the prompt fits the token budget
+(PROMPT_TOKEN_BUDGET, or batch.py --token-budget and the GUI's token budget
+box). The sections that are kept stay in their original order.
+
+Compacted descriptions are cached per job id and budget in
+compact_descriptions.
+
+Run from the project root to see the saving over the whole jobs table:
+    python compaction.py --budget 1500
+"""
+import argparse
+import hashlib
+import math
+import re
+import connections
+import database
+import descriptions
+
+# tokens a whole prompt (instructions, job description and profile) may take
+PROMPT_TOKEN_BUDGET = 1500
+# tokens of the fixed instructions around the descriptions in main.create_resume
+PROMPT_OVERHEAD_TOKENS = 150
+# a description is never cut below this many tokens, however long the profile
+MIN_DESCRIPTION_TOKENS = 300
+# description budgets are rounded down to a multiple of this, so profiles of
+# similar length share cached compactions
+BUDGET_STEP = 50
+# rough characters per token of English text for Gemini-style tokenizers
+CHARS_PER_TOKEN = 4
+# a paragraph whose first line is this short, without a closing period, starts
+# with a heading ("Requirements:")
+MAX_HEADING_SIZE = 60
+# list items are never headings
+BULLETS = ("-", "*", "\u2022")
+# words that mark a section the model needs, matched at the start of a word (so
+# "responsibilit" matches "responsibilities") ...
+RELEVANT_WORDS = ("requirement", "responsibilit", "qualification", "skill", "experience",
+                  "what you", "you will", "you'll", "must have", "degree", "proficien",
+                  "knowledge", "duties", "role", "preferred")
+# ... and ones it can do without, matched as whole words or their plurals (so "pto"
+# is not found in "laptop", nor "benefit" in "beneficial")
+LOW_VALUE_WORDS = ("equal opportunity", "benefit", "perks", "about us", "about the company",
+                   "401(k)", "insurance", "paid time off", "pto", "diversity",
+                   "accommodation", "pay range", "salary", "compensation", "how to apply",
+                   "application deadline", "privacy notice", "privacy policy", "e-verify",
+                   "background check")
+# the patterns the words are found with
+RELEVANT_PATTERNS = [re.compile(r"(?<!\w)" + re.escape(word)) for word in RELEVANT_WORDS]
+LOW_VALUE_PATTERNS = [re.compile(r"(?<!\w)" + re.escape(word) + r"s?(?!\w)")
+                      for word in LOW_VALUE_WORDS]
+
+def estimate_tokens(text):
+    """Return a rough count of the tokens text takes in a prompt."""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+def split_sections(text):
+    """
+    Split a description into sections: lists of paragraphs, each section starting at
+    a paragraph that opens with a heading line. Joining every paragraph with
+    PARAGRAPH_SEPARATOR gives text back.
+    """
+    sections = []
+    for paragraph in descriptions.split_paragraphs(text):
+        first_line = paragraph.split("\n", 1)[0].rstrip()
+        heading = (len(first_line) <= MAX_HEADING_SIZE and not first_line.endswith(".")
+                   and not first_line.startswith(BULLETS))
+        if heading or not sections:
+            sections.append([paragraph])
+        else:
+            sections[-1].append(paragraph)
+    return sections
+
+def score_section(section, shared=frozenset(), first=False):
+    """
+    Return how much a section (a list of paragraphs) is worth keeping. Words from
+    RELEVANT_WORDS and LOW_VALUE_WORDS count double in the heading; every
+    paragraph whose digest is in shared (boilerplate) costs three points. The
+    first section (usually the title and summary) gets two extra points.
+    """
+    heading, body = section[0].lower(), " ".join(section[1:]).lower()
+    score = 2 if first else 0
+    for patterns, sign in ((RELEVANT_PATTERNS, 1), (LOW_VALUE_PATTERNS, -1)):
+        score += sign * sum(2 * bool(pattern.search(heading)) + bool(pattern.search(body))
+                            for pattern in patterns)
+    score -= 3 * sum(descriptions.paragraph_digest(p) in shared for p in section)
+    return score
+
+def compact(text, budget, shared=frozenset()):
+    """
+    Return text with its lowest scoring sections dropped until it takes at most
+    budget tokens; shared holds the digests of boilerplate paragraphs. If the best
+    section alone is still too long, it is cut at the last line break that fits.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    sections = split_sections(text)
+    scores = [score_section(section, shared, first=i == 0) for i, section in enumerate(sections)]
+    kept = set(range(len(sections)))
+    separator_tokens = estimate_tokens(descriptions.PARAGRAPH_SEPARATOR)
+    tokens = {i: estimate_tokens(descriptions.PARAGRAPH_SEPARATOR.join(section))
+                 + separator_tokens for i, section in enumerate(sections)}
+    total = sum(tokens.values())
+    # lowest score first; among equals, the later (and then the longer) section goes
+    for i in sorted(kept, key=lambda i: (scores[i], -i, -tokens[i])):
+        if total <= budget or len(kept) == 1:
+            break
+        kept.remove(i)
+        total -= tokens[i]
+    result = descriptions.PARAGRAPH_SEPARATOR.join(
+        paragraph for i in sorted(kept) for paragraph in sections[i])
+    limit = budget * CHARS_PER_TOKEN
+    if len(result) > limit:
+        cut = result.rfind("\n", 0, limit)
+        result = result[:cut if cut > 0 else limit]
+    return result
+
+def description_budget(personal_description, budget=None):
+    """Return the tokens left for the job description in a prompt of budget tokens."""
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    left = budget - PROMPT_OVERHEAD_TOKENS - estimate_tokens(personal_description)
+    return max(MIN_DESCRIPTION_TOKENS, left // BUDGET_STEP * BUDGET_STEP)
+
+# helper function: the digests of the paragraphs of text that are shared boilerplate
+def _shared_digests(conn, text):
+    digests = [descriptions.paragraph_digest(p) for p in descriptions.split_paragraphs(text)
+               if len(p) >= descriptions.MIN_PARAGRAPH_SIZE]
+    if not digests:
+        return frozenset()
+    rows = conn.execute(
+        f"""
+        SELECT digest FROM description_paragraphs
+        WHERE uses > 1 AND digest IN ({", ".join("?" * len(digests))})
+        """,
+        digests,
+    ).fetchall()
+    return frozenset(row[0] for row in rows)
+
+def fit_description(job_id, description, personal_description, budget=None):
+    """
+    Return the job's description compacted so a prompt with personal_description
+    fits in budget tokens (PROMPT_TOKEN_BUDGET by default). Results are cached per
+    job id and description budget, and made again if the description changed.
+    """
+    tokens = description_budget(personal_description, budget)
+    if estimate_tokens(description) <= tokens:
+        return description
+    source_digest = hashlib.sha1(description.encode("utf-8")).digest()
+    conn = connections.writer(database.DB_NAME)
+    row = conn.execute(
+        "SELECT source_digest, text FROM compact_descriptions WHERE job_id = ? AND budget = ?",
+        (job_id, tokens),
+    ).fetchone()
+    if row and row[0] == source_digest:
+        return row[1]
+    text = compact(description, tokens, _shared_digests(conn, description))
+    with conn:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO compact_descriptions (job_id, budget, source_digest, text)
+            VALUES (?, ?, ?, ?)
+            """,
+            (job_id, tokens, source_digest, text),
+        )
+    return text
+
+def report(budget=None, personal_description=""):
+    """
+    Compact every job's description for a prompt of budget tokens and return
+    (jobs, jobs compacted, prompt tokens before, prompt tokens after). Nothing is cached.
+    """
+    conn = connections.reader(database.DB_NAME)
+    tokens = description_budget(personal_description, budget)
+    fixed = PROMPT_OVERHEAD_TOKENS + estimate_tokens(personal_description)
+    jobs = compacted = before = after = 0
+    for (description,) in conn.execute(
+            """
+            SELECT description_text(codec, body) FROM jobs
+            JOIN job_descriptions ON job_descriptions.job_id = jobs.id
+            """):
+        jobs += 1
+        original = estimate_tokens(description)
+        if original > tokens:
+            compacted += 1
+            description = compact(description, tokens, _shared_digests(conn, description))
+        before += fixed + original
+        after += fixed + estimate_tokens(description)
+    return jobs, compacted, before, after
+
+def main():
+    """Print how many prompt tokens compaction saves over the whole jobs table."""
+    parser = argparse.ArgumentParser(description="Report prompt tokens saved by compaction.")
+    parser.add_argument("--budget", type=int, default=PROMPT_TOKEN_BUDGET,
+                        help="tokens a whole prompt may take")
+    parser.add_argument("--profile-tokens", type=int, default=150,
+                        help="tokens of the personal description assumed in every prompt")
+    args = parser.parse_args()
+    jobs, compacted, before, after = report(args.budget, "x" * args.profile_tokens
+                                            * CHARS_PER_TOKEN)
+    print(f"{jobs:,} jobs, {compacted:,} compacted to fit {args.budget:,} tokens")
+    print(f"prompt tokens: {before:,} before, {after:,} after "
+          f"({100 * (before - after) / before if before else 0:.1f}% fewer)")
+
+
+if __name__ == "__main__":
+    main()
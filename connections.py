@@ -0,0 +1,79 @@
+"""
+connections.py
+
+This module hands out the SQLite connections that database.py, search.py and
+gui.py share. Each thread gets one long-lived read connection and one writer per
+database file, so a click in the GUI reuses an open connection (and its cache of
+prepared statements) instead of opening the file again. Databases are switched
+to WAL mode so readers keep working while an ingest is writing. Every connection
+has the description_text() SQL function search snippets read descriptions through.
+
+Call close_all() before deleting or replacing a database file.
+"""
+import os
+import sqlite3
+import threading
+import descriptions
+
+# prepared statements kept per connection (sqlite3's default is 128)
+STATEMENT_CACHE_SIZE = 256
+# seconds a connection waits on another connection's write lock before giving up
+BUSY_TIMEOUT = 30
+# applied to every writer; WAL is stored in the database file, so readers get it too
+WRITER_PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL"}
+
+# this thread's open connections, keyed on (absolute path, "reader" or "writer")
+_LOCAL = threading.local()
+
+# helper function: this thread's connections, forgetting any inherited through a fork
+def _thread_connections():
+    if getattr(_LOCAL, "pid", None) != os.getpid():
+        _LOCAL.pid = os.getpid()
+        _LOCAL.connections = {}
+    return _LOCAL.connections
+
+# helper function: open a connection with the shared settings. description_text(codec,
+# body) lets SQL (the jobs_text view search snippets read) decompress stored descriptions.
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.create_function("description_text", 2, descriptions.text_function(conn),
+                         deterministic=True)
+    return conn
+
+def writer(path):
+    """
+    Return this thread's writer connection to the database file at path.
+    Commit what you write (use it as a context manager: "with conn:").
+    """
+    connections = _thread_connections()
+    key = (os.path.abspath(path), "writer")
+    conn = connections.get(key)
+    if conn is None:
+        conn = _connect(path)
+        for name, value in WRITER_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        connections[key] = conn
+    return conn
+
+def reader(path):
+    """
+    Return this thread's read-only connection to the database file at path.
+    It runs in autocommit mode, so every query sees the latest committed data.
+    """
+    connections = _thread_connections()
+    key = (os.path.abspath(path), "reader")
+    conn = connections.get(key)
+    if conn is None:
+        writer(path)  # makes sure the file exists and is in WAL mode
+        conn = _connect(path)
+        conn.isolation_level = None
+        conn.execute("PRAGMA query_only = ON")
+        connections[key] = conn
+    return conn
+
+def close_all():
+    """Close every connection this thread has opened."""
+    connections = _thread_connections()
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
@@ -1,39 +1,446 @@
 """
 This module creates and populates the jobs database.
-It defines functions to create the jobs table and insert data from two JSON files.
+It defines functions to create the jobs table and insert data from two JSON files,
+and an ingest manifest so files that have not changed are not processed again.
 """
 
-import sqlite3
+import os
 import json
+import hashlib
+import re
+import time
+from itertools import islice
+import connections
+import descriptions
 
 DB_NAME = "jobs.db"
 
+# number of normalized rows written per executemany call
+BATCH_SIZE = 500
+# number of characters read from a feed at a time when streaming
+CHUNK_SIZE = 64 * 1024
+
+# date_posted is whatever the feed says ("2025-01-01", "3 days ago", ""), so an ISO
+# posted_date is derived from it (relative to the time of ingest) for date filtering.
+# {value} is the SQL expression holding date_posted.
+POSTED_DATE_SQL = """
+    CASE
+        WHEN {value} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'
+            THEN substr({value}, 1, 10)
+        WHEN {value} LIKE '%day ago' OR {value} LIKE '%days ago'
+            THEN date('now', '-' || CAST({value} AS INTEGER) || ' days')
+        WHEN {value} LIKE '%hour ago' OR {value} LIKE '%hours ago'
+            OR {value} LIKE '%minutes ago' OR {value} = 'today' OR {value} = 'just posted'
+            THEN date('now')
+    END
+"""
+
+# rows are keyed on source_id: new jobs are inserted, changed jobs are updated in place
+# (keeping their id, and clearing cluster_id so dedup looks at them again), and jobs
+# whose content_hash is unchanged are left alone. the description (?3) is not part of
+# the jobs row; write_rows stores it in job_descriptions.
+INSERT_JOB_SQL = f"""
+    INSERT INTO jobs (title, company, location, job_type, date_posted,
+                      min_amount, max_amount, is_remote, job_url, source_id, content_hash,
+                      posted_date)
+    VALUES (?1, ?2, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, {POSTED_DATE_SQL.format(value='?6')})
+    ON CONFLICT(source_id) DO UPDATE SET
+        title = excluded.title,
+        company = excluded.company,
+        location = excluded.location,
+        job_type = excluded.job_type,
+        date_posted = excluded.date_posted,
+        min_amount = excluded.min_amount,
+        max_amount = excluded.max_amount,
+        is_remote = excluded.is_remote,
+        job_url = excluded.job_url,
+        content_hash = excluded.content_hash,
+        posted_date = excluded.posted_date,
+        cluster_id = NULL
+    WHERE jobs.content_hash IS NOT excluded.content_hash
+"""
+
+# every job has one row here; updating it re-indexes the job for search
+UPSERT_DESCRIPTION_SQL = """
+    INSERT INTO job_descriptions (job_id, codec, body) VALUES (?, ?, ?)
+    ON CONFLICT(job_id) DO UPDATE SET codec = excluded.codec, body = excluded.body
+"""
+
+# pragmas applied to the connection for the load phase. the source feeds can always be
+# re-ingested, so durability is traded for speed while loading.
+LOAD_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "OFF",
+    "cache_size": -64000,  # negative means KiB, so about 64 MB
+    "temp_store": "MEMORY",
+}
+
+# index name -> indexed columns. the implicit rowid at the end of every index keeps
+# equality filters in id order, so keyset pages come straight off the index.
+FILTER_INDEXES = {
+    "idx_jobs_min_amount": "min_amount",
+    "idx_jobs_max_amount": "max_amount",
+    "idx_jobs_remote": "is_remote",
+    "idx_jobs_remote_min_amount": "is_remote, min_amount",
+    "idx_jobs_job_type": "job_type",
+    "idx_jobs_location": "location COLLATE NOCASE",
+    "idx_jobs_posted_date": "posted_date",
+}
+
+# tables the near-duplicate detection in dedup.py keeps, with their columns.
+# only the canonical row of each cluster has a signature and bucket entries.
+DEDUP_TABLES = {
+    "job_minhash": "(job_id INTEGER PRIMARY KEY, signature BLOB)",
+    "job_lsh": "(band_key INTEGER, job_id INTEGER, PRIMARY KEY (band_key, job_id)) WITHOUT ROWID",
+    "lsh_params": "(bands INTEGER, rows INTEGER)",
+}
+
+# tables the other modules keep in the same database, with their columns: artifacts.py's
+# files and documents, response_cache.py's answers and counters, compaction.py's descriptions
+STORE_TABLES = {
+    "artifacts": """(
+        -- AUTOINCREMENT, so a number (and file name) is never handed out twice
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,           -- resume, cover_letter
+        path TEXT UNIQUE,
+        job_id INTEGER,
+        profile_id INTEGER,
+        prompt_hash TEXT,
+        created_at REAL,
+        content TEXT         -- hash of its blob in artifact_blobs
+    )""",
+    # keyed on the sha256 of the content; codec is zlib or none, size is before compression
+    "artifact_blobs": "(hash TEXT PRIMARY KEY, codec TEXT, size INTEGER, body BLOB)",
+    "llm_responses": """(
+        key TEXT PRIMARY KEY,
+        model_name TEXT,
+        response TEXT,
+        size INTEGER,
+        created_at REAL,
+        last_used REAL,
+        hits INTEGER DEFAULT 0
+    )""",
+    "llm_cache_stats": "(name TEXT PRIMARY KEY, value INTEGER)",
+    "compact_descriptions": """(
+        job_id INTEGER,
+        budget INTEGER,
+        source_digest BLOB,  -- sha1 of the description it was made from
+        text TEXT,
+        PRIMARY KEY (job_id, budget)
+    ) WITHOUT ROWID""",
+}
+# index name -> table and indexed columns, for the STORE_TABLES
+STORE_INDEXES = {
+    "idx_artifacts_job": "artifacts (job_id, profile_id)",
+    "idx_artifacts_profile": "artifacts (profile_id)",
+    "idx_artifacts_prompt_hash": "artifacts (prompt_hash)",
+    "idx_artifacts_content": "artifacts (content)",
+    "idx_llm_responses_last_used": "llm_responses (last_used, size)",
+    "idx_llm_responses_created_at": "llm_responses (created_at)",
+}
+
 # connect to the database and create table
 def create_table():
-    """Connect to the database and create the jobs table."""
-    conn = sqlite3.connect(DB_NAME)
+    """
+    Connect to the database and create the jobs table if it does not exist yet,
+    along with every other table the app keeps in it (see STORE_TABLES).
+    Existing rows are kept (ingest upserts them), so job ids stay the same.
+    """
+    conn = connections.writer(DB_NAME)
     cursor = conn.cursor()
-    # drop the jobs table if it already exists, (this avoids overwiting or duplicating data.)
-    cursor.execute("DROP TABLE IF EXISTS jobs")
     cursor.execute(
         """ 
         CREATE TABLE IF NOT EXISTS jobs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,  
             title TEXT,                            
             company TEXT,                          
-            description TEXT,                  
+            description TEXT,  -- unused: see job_descriptions
             location TEXT,                        
             job_type TEXT,                         
             date_posted TEXT,                      
             min_amount REAL,                       
             max_amount REAL,                       
             is_remote TEXT,                        
-            job_url TEXT                           
+            job_url TEXT,
+            source_id TEXT,
+            content_hash TEXT,
+            posted_date TEXT,
+            cluster_id INTEGER
+        )
+        """
+    )
+    # databases from older versions are missing the columns added since
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(jobs)")]
+    for column, column_type in (("source_id", "TEXT"), ("content_hash", "TEXT"),
+                                ("posted_date", "TEXT"), ("cluster_id", "INTEGER")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_source_id ON jobs (source_id)")
+    # secondary indexes for the structured filters in search.filter_jobs
+    for name, columns in FILTER_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON jobs ({columns})")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_cluster_id ON jobs (cluster_id)")
+    for table, definition in DEDUP_TABLES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} {definition}")
+    for table, definition in STORE_TABLES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} {definition}")
+    # artifacts tables made before documents were stored have no content column
+    if "content" not in [row[1] for row in cursor.execute("PRAGMA table_info(artifacts)")]:
+        cursor.execute("ALTER TABLE artifacts ADD COLUMN content TEXT")
+    for name, columns in STORE_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+    # the running size of the cached answers, counted once for a database from before it was kept
+    cursor.execute("INSERT INTO llm_cache_stats (name, value) "
+                   "SELECT 'bytes', (SELECT coalesce(sum(size), 0) FROM llm_responses) "
+                   "WHERE NOT EXISTS (SELECT 1 FROM llm_cache_stats WHERE name = 'bytes')")
+    # descriptions live in a side table, compressed, so jobs rows stay narrow
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_descriptions (
+            job_id INTEGER PRIMARY KEY,
+            codec TEXT,
+            body BLOB
+        )
+        """
+    )
+    # paragraphs several descriptions share, stored once (see store_paragraphs)
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS description_paragraphs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            digest BLOB UNIQUE,
+            size INTEGER,
+            uses INTEGER,
+            codec TEXT,
+            body BLOB
+        )
+        """
+    )
+    # bring a database written by an older version up to date, once
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for migration in MIGRATIONS[version:]:
+        migration(cursor)
+    cursor.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+    create_search_index(cursor)
+    update_search_index(conn)
+    # one row per ingested feed file, used to skip files that have not changed
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_manifest (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            content_hash TEXT,
+            ingested_at TEXT
         )
         """
     )
     conn.commit()
-    conn.close()
+
+# drop the jobs an older version wrote without source ids, so they are loaded again keyed
+def drop_unkeyed_jobs(cursor):
+    """
+    Delete the jobs rows that have no source_id (written before jobs were keyed on
+    one) and forget the ingest manifest, so the next sync loads them again with
+    their keys instead of adding a second copy. Those versions dropped the jobs
+    table on every start, so nothing kept their ids.
+    """
+    cursor.execute("DELETE FROM jobs WHERE source_id IS NULL")
+    if cursor.rowcount:
+        cursor.execute("DROP TABLE IF EXISTS ingest_manifest")
+
+# drop the search index and its triggers, so create_search_index builds them again
+def drop_search_index(cursor):
+    """
+    Drop jobs_fts, its queue and every trigger that writes to them. Used when the
+    index was built differently (stemmed words, descriptions still in the jobs table,
+    or triggers that called description_text()).
+    """
+    cursor.execute("DROP TABLE IF EXISTS jobs_fts")
+    cursor.execute("DROP TABLE IF EXISTS jobs_fts_queue")
+    triggers = cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%jobs_fts%'"
+    ).fetchall()
+    for (trigger,) in triggers:
+        cursor.execute(f"DROP TRIGGER {trigger}")
+
+# derive posted_date for the jobs stored before it was added
+def backfill_posted_dates(cursor):
+    """
+    Set posted_date from date_posted on jobs that do not have one. Those jobs are
+    unchanged in the feeds, so re-ingesting never rewrites them; relative dates
+    ("3 days ago") are counted back from now, as they are at ingest.
+    """
+    cursor.execute(
+        f"""
+        UPDATE jobs SET posted_date = {POSTED_DATE_SQL.format(value="date_posted")}
+        WHERE posted_date IS NULL AND date_posted IS NOT NULL
+        """
+    )
+
+# move descriptions stored in the jobs table by older versions into job_descriptions
+def move_descriptions(cursor):
+    """
+    Compress any descriptions still in jobs.description into job_descriptions and
+    clear them from jobs. Runs after drop_search_index, so create_search_index
+    indexes the moved descriptions afterwards.
+    """
+    after_id = 0
+    while True:
+        rows = cursor.execute(
+            """
+            SELECT id, description FROM jobs
+            WHERE id > ? AND id NOT IN (SELECT job_id FROM job_descriptions)
+            ORDER BY id LIMIT ?
+            """,
+            (after_id, BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            break
+        cursor.connection.executemany(
+            UPSERT_DESCRIPTION_SQL,
+            [(job_id,) + descriptions.compress(text) for job_id, text in rows],
+        )
+        after_id = rows[-1][0]
+    cursor.execute("UPDATE jobs SET description = NULL WHERE description IS NOT NULL")
+
+# changes made once to a database written by an older version, in order. PRAGMA
+# user_version records how many of them a database has had.
+MIGRATIONS = [drop_unkeyed_jobs, drop_search_index, backfill_posted_dates,
+              drop_search_index, move_descriptions]
+
+# full-text index over the searchable job columns, kept in sync by triggers
+def create_search_index(cursor):
+    """
+    Create the jobs_fts FTS5 index (title, company, description, location) and the
+    triggers that queue every insert, upsert and delete for update_search_index.
+    Snippets read the text through the jobs_text view, which decompresses
+    descriptions with the description_text() function connections.py registers.
+    An index added to an already populated database queues every existing job.
+    """
+    cursor.execute(
+        """
+        CREATE VIEW IF NOT EXISTS jobs_text AS
+        SELECT jobs.id AS id, jobs.title AS title, jobs.company AS company,
+               description_text(job_descriptions.codec, job_descriptions.body) AS description,
+               jobs.location AS location
+        FROM jobs LEFT JOIN job_descriptions ON job_descriptions.job_id = jobs.id
+        """
+    )
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs_fts'"
+    ).fetchone()
+    if not exists:
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE jobs_fts USING fts5(
+                title, company, description, location,
+                content = 'jobs_text', content_rowid = 'id',
+                tokenize = 'unicode61', prefix = '2 3'
+            )
+            """
+        )
+        # rank by bm25 with title matches weighted highest, then company and location
+        cursor.execute(
+            "INSERT INTO jobs_fts (jobs_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0, 2.0)')"
+        )
+    # the triggers only record which jobs changed, with the text the index holds for
+    # them, in jobs_fts_queue; update_search_index applies that to jobs_fts. a job is
+    # indexed while it has both a jobs row and a description row, and each job is queued
+    # once, with the text it had when it was first changed since the last update.
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs_fts_queue (
+            job_id INTEGER PRIMARY KEY,
+            indexed INTEGER,
+            title TEXT,
+            company TEXT,
+            location TEXT,
+            codec TEXT,
+            body BLOB
+        )
+        """
+    )
+    # (NOT EXISTS rather than OR IGNORE, which an upsert's conflict handling overrides)
+    queue_old_job = """
+        INSERT INTO jobs_fts_queue
+        SELECT old.id, job_descriptions.job_id IS NOT NULL, old.title, old.company,
+               old.location, codec, body
+        FROM (SELECT 1) LEFT JOIN job_descriptions ON job_descriptions.job_id = old.id
+        WHERE NOT EXISTS (SELECT 1 FROM jobs_fts_queue WHERE job_id = old.id);
+    """
+    queue_old_description = """
+        INSERT INTO jobs_fts_queue
+        SELECT old.job_id, 1, title, company, location, old.codec, old.body
+        FROM jobs WHERE id = old.job_id
+        AND NOT EXISTS (SELECT 1 FROM jobs_fts_queue WHERE job_id = old.job_id);
+    """
+    triggers = {
+        "jobs_fts_text_update": ("AFTER UPDATE OF title, company, location ON jobs",
+                                 queue_old_job),
+        "jobs_fts_delete": ("AFTER DELETE ON jobs", queue_old_job +
+                            "DELETE FROM job_descriptions WHERE job_id = old.id;"),
+        "jobs_fts_description_insert": (
+            "AFTER INSERT ON job_descriptions",
+            """
+            INSERT INTO jobs_fts_queue (job_id, indexed) SELECT new.job_id, 0
+            WHERE NOT EXISTS (SELECT 1 FROM jobs_fts_queue WHERE job_id = new.job_id);
+            """),
+        "jobs_fts_description_update": ("AFTER UPDATE ON job_descriptions",
+                                        queue_old_description),
+        "jobs_fts_description_delete": ("AFTER DELETE ON job_descriptions",
+                                        queue_old_description),
+    }
+    for name, (event, body) in triggers.items():
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+    if not exists:
+        cursor.execute("INSERT OR IGNORE INTO jobs_fts_queue (job_id, indexed) "
+                       "SELECT job_id, 0 FROM job_descriptions")
+
+# apply the changes the jobs_fts_queue triggers recorded to the search index
+def update_search_index(conn):
+    """
+    Bring jobs_fts up to date with the jobs queued in jobs_fts_queue: take each
+    one's old text out of the index and put its current text in, without
+    committing. Descriptions are decompressed here rather than in the triggers, so
+    jobs can be changed from any connection (the sqlite3 shell too); the index
+    catches up the next time this runs, on the next write or start.
+    """
+    text = descriptions.text_function(conn)
+    while True:
+        queued = conn.execute(
+            """
+            SELECT job_id, indexed, title, company, location, codec, body
+            FROM jobs_fts_queue ORDER BY job_id LIMIT ?
+            """,
+            (BATCH_SIZE,),
+        ).fetchall()
+        if not queued:
+            return
+        conn.executemany(
+            """
+            INSERT INTO jobs_fts (jobs_fts, rowid, title, company, description, location)
+            VALUES ('delete', ?, ?, ?, ?, ?)
+            """,
+            [(job_id, title, company, text(codec, body), location)
+             for job_id, indexed, title, company, location, codec, body in queued if indexed],
+        )
+        current = _select_in(
+            conn,
+            """
+            SELECT id, title, company, codec, body, location
+            FROM jobs JOIN job_descriptions ON job_descriptions.job_id = jobs.id
+            WHERE id IN ({})
+            """,
+            [row[0] for row in queued],
+        )
+        conn.executemany(
+            "INSERT INTO jobs_fts (rowid, title, company, description, location) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(job_id, title, company, text(codec, body), location)
+             for job_id, title, company, codec, body, location in current],
+        )
+        conn.execute("DELETE FROM jobs_fts_queue WHERE job_id <= ?", (queued[-1][0],))
 
 # helper function to extract min-max salary
 def extract_salary(salary_range):
@@ -75,8 +482,297 @@ def convert_is_remote(value):
         return "yes" if value else "no"
     return "yes" if str(value).strip() in ["1", "True", "true"] else "no"
 
+# helper function to key a row for a job that has no id of its own
+def hash_source_id(row):
+    """Return a source_id from a hash of the row's title, company, location and url."""
+    identity = "\x1f".join(str(value) for value in (row[0], row[1], row[3], row[9]))
+    return "sha1:" + hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+# a normalized row's columns as the text its content hash is taken over ("%s" is str())
+ROW_FORMAT = "\x1f".join(["%s"] * 10)
+
+# helper function to give normalized rows their source keys and content hashes
+def key_rows(jobs, rows):
+    """
+    Append (source_id, content_hash) to each normalized row of the records in jobs.
+    source_id is the feed's own job id; jobs without one are keyed on a hash of
+    their title, company, location and url so the key survives description edits.
+    """
+    hashes = [hashlib.sha1(text).hexdigest()
+              for text in map(str.encode, map(ROW_FORMAT.__mod__, rows))]
+    return [row + (str(source_id) if source_id else hash_source_id(row), content_hash)
+            for row, source_id, content_hash in zip(rows, [job.get("id") for job in jobs], hashes)]
+
+# source adapters: each feed format declares how its fields map onto the jobs columns,
+# and normalize_batch turns whole lists of records into rows column by column.
+ADAPTERS = {}
+
+# "50000", "50000.5" or "50000 - 70000" once commas are removed; anything else falls
+# back to extract_salary so results match it exactly
+SALARY_RE = re.compile(r"(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?")
+
+# add a feed format to the registry
+def register_adapter(name, fields, salary, url, is_remote=None, detect=(),  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                     report_skipped=False):
+    """
+    Register a feed format under name.
+    fields maps the text columns (title, company, description, location, job_type,
+    date_posted) to the feed's keys. salary is ("range", key) for "min-max" strings or
+    ("amounts", min_key, max_key); url is ("providers", key) for a jobProviders list or
+    ("first", key, ...) for the first non-empty key; is_remote is a key or None for "no".
+    detect lists keys that identify the format in its first record.
+    """
+    ADAPTERS[name] = {
+        "name": name,
+        "fields": fields,
+        "salary": salary,
+        "url": url,
+        "is_remote": is_remote,
+        "detect": frozenset(detect),
+        "report_skipped": report_skipped,
+    }
+
+register_adapter(
+    "job-data",
+    fields={"title": "title", "company": "company", "description": "description",
+            "location": "location", "job_type": "employmentType",
+            "date_posted": "datePosted"},
+    salary=("range", "salaryRange"),
+    url=("providers", "jobProviders"),
+    detect=("employmentType", "datePosted", "salaryRange", "jobProviders"),
+    report_skipped=True,
+)
+
+register_adapter(
+    "job-data2",
+    fields={"title": "title", "company": "company", "description": "description",
+            "location": "location", "job_type": "job_type", "date_posted": "date_posted"},
+    salary=("amounts", "min_amount", "max_amount"),
+    url=("first", "job_url", "job_url_direct"),
+    is_remote="is_remote",
+    detect=("job_type", "date_posted", "min_amount", "max_amount", "is_remote", "job_url"),
+)
+
+# pick the adapter whose detect keys best match a record
+def detect_adapter(job):
+    """Return the registered adapter sharing the most detect keys with job."""
+    keys = set(job)
+    return max(ADAPTERS.values(), key=lambda adapter: len(adapter["detect"] & keys))
+
+# helper function to parse a whole column of salaryRange strings
+def _salary_columns(values):
+    mins, maxs = [], []
+    for value in values:
+        match = None
+        if value and isinstance(value, str):
+            match = SALARY_RE.fullmatch(value.strip().replace(",", ""))
+        if match:
+            low = float(match.group(1))
+            high = float(match.group(2)) if match.group(2) else low
+        else:
+            low, high = extract_salary(value)
+        mins.append(low)
+        maxs.append(high)
+    return mins, maxs
+
+# turn a list of records of one feed format into rows for the jobs table
+def normalize_batch(jobs, adapter):
+    """
+    Normalize a list of job records with adapter (a name or an ADAPTERS entry) into
+    jobs rows keyed by key_rows, reading one column at a time over the whole batch.
+    Records without a company are dropped.
+    """
+    if isinstance(adapter, str):
+        adapter = ADAPTERS[adapter]
+    kept = [job for job in jobs if job.get("company")]
+    if adapter["report_skipped"] and len(kept) != len(jobs):
+        for job in jobs:
+            if not job.get("company"):
+                print(f"Skipping job entry due to missing company: "
+                      f"{job.get('title', 'Unknown Title')}")
+    if not kept:
+        return []
+
+    fields = adapter["fields"]
+    columns = [[job.get(fields[column]) for job in kept]
+               for column in ("title", "company", "description", "location",
+                              "job_type", "date_posted")]
+
+    salary = adapter["salary"]
+    if salary[0] == "range":
+        columns.extend(_salary_columns([job.get(salary[1], "") for job in kept]))
+    else:
+        columns.append([convert_float(job.get(salary[1], "0")) for job in kept])
+        columns.append([convert_float(job.get(salary[2], "0")) for job in kept])
+
+    if adapter["is_remote"] is None:
+        columns.append(["no"] * len(kept))
+    else:
+        columns.append([convert_is_remote(job.get(adapter["is_remote"])) for job in kept])
+
+    url = adapter["url"]
+    if url[0] == "providers":
+        columns.append([extract_job_url(job.get(url[1], [])) for job in kept])
+    else:
+        first, *rest = url[1:]
+        urls = [job.get(first) for job in kept]
+        for key in rest:
+            urls = [value or job.get(key) for value, job in zip(urls, kept)]
+        columns.append(urls)
+
+    return key_rows(kept, list(zip(*columns)))
+
+# apply a dict of pragmas, e.g. LOAD_PRAGMAS, to an open connection
+def apply_pragmas(conn, pragmas):
+    """Run PRAGMA name = value for each item in pragmas on conn."""
+    for name, value in pragmas.items():
+        if not name.isidentifier():
+            raise ValueError(f"Invalid pragma name: {name}")
+        conn.execute(f"PRAGMA {name} = {value}")
+
+# helper function: run sql, a SELECT ending in "IN ({})", for keys 500 at a time
+# (below SQLite's limit on parameters) and return every row
+def _select_in(conn, sql, keys):
+    keys = list(keys)
+    rows = []
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        rows += conn.execute(sql.format(", ".join("?" * len(chunk))), chunk).fetchall()
+    return rows
+
+# upsert one batch of normalized rows: the jobs rows, then the descriptions of the jobs
+# that were inserted or changed
+def write_rows(conn, rows):
+    """
+    Write a batch of normalized job rows on conn (without committing) and return
+    the number of jobs inserted or updated. Rows whose content_hash is already
+    stored are skipped, so their descriptions are not compressed again.
+    """
+    stored = dict(_select_in(
+        conn, "SELECT source_id, content_hash FROM jobs WHERE source_id IN ({})",
+        [row[10] for row in rows],
+    ))
+    changed = [row for row in rows if stored.get(row[10]) != row[11]]
+    if not changed:
+        return 0
+    cursor = conn.executemany(INSERT_JOB_SQL, changed)
+    written = cursor.rowcount
+    texts = {row[10]: row[2] for row in changed}
+    ids = dict(_select_in(conn, "SELECT source_id, id FROM jobs WHERE source_id IN ({})",
+                          texts))
+    paragraph_ids = store_paragraphs(conn, texts.values())
+    old_refs = [ref for codec, body in _select_in(
+        conn, "SELECT codec, body FROM job_descriptions WHERE job_id IN ({})",
+        [ids[source_id] for source_id in texts if source_id in stored],
+    ) for ref in descriptions.paragraph_refs(codec, body)]
+    conn.executemany(UPSERT_DESCRIPTION_SQL,
+                     [(ids[source_id],) + descriptions.compress(text, paragraph_ids=paragraph_ids)
+                      for source_id, text in texts.items()])
+    # before the paragraphs the old descriptions used can be dropped
+    update_search_index(conn)
+    _count_paragraph_uses(conn, texts.values(), paragraph_ids, old_refs)
+    return written
+
+# store the paragraphs a batch of descriptions share in the dictionary
+def store_paragraphs(conn, texts):
+    """
+    Add the paragraphs (of at least MIN_PARAGRAPH_SIZE characters) that occur more
+    than once in texts to the description_paragraphs dictionary, and return
+    {digest: id} for every paragraph of texts that is in the dictionary.
+    Paragraphs that only repeat across batches are not detected; boilerplate
+    repeats often enough to show up within one.
+    """
+    counts, paragraphs = {}, {}
+    for text in texts:
+        for paragraph in descriptions.split_paragraphs(text):
+            if len(paragraph) >= descriptions.MIN_PARAGRAPH_SIZE:
+                digest = descriptions.paragraph_digest(paragraph)
+                paragraphs[digest] = paragraph
+                counts[digest] = counts.get(digest, 0) + 1
+    ids = dict(_select_in(
+        conn, "SELECT digest, id FROM description_paragraphs WHERE digest IN ({})", paragraphs
+    ))
+    for digest, count in counts.items():
+        if count > 1 and digest not in ids:
+            paragraph = paragraphs[digest]
+            ids[digest] = conn.execute(
+                """
+                INSERT INTO description_paragraphs (digest, size, uses, codec, body)
+                VALUES (?, ?, 0, ?, ?)
+                """,
+                (digest, len(paragraph.encode("utf-8"))) + descriptions.compress(paragraph),
+            ).lastrowid
+    return ids
+
+# helper function: add the references texts make to dictionary paragraphs to their use
+# counts, take off old_refs (from the descriptions texts replaced), and drop paragraphs
+# nothing refers to any more
+def _count_paragraph_uses(conn, texts, paragraph_ids, old_refs):
+    uses = {}
+    for ref in old_refs:
+        uses[ref] = uses.get(ref, 0) - 1
+    for text in texts:
+        for paragraph in descriptions.split_paragraphs(text):
+            ref = paragraph_ids.get(descriptions.paragraph_digest(paragraph))
+            if ref is not None:
+                uses[ref] = uses.get(ref, 0) + 1
+    conn.executemany("UPDATE description_paragraphs SET uses = uses + ? WHERE id = ?",
+                     [(count, ref) for ref, count in uses.items() if count])
+    conn.executemany("DELETE FROM description_paragraphs WHERE id = ? AND uses <= 0",
+                     [(ref,) for ref, count in uses.items() if count < 0])
+
+# how much the paragraph dictionary saves, and the paragraphs it holds
+def paragraph_report(limit=10):
+    """
+    Return (bytes saved, [(uses, size, paragraph), ...]): the description text not
+    stored again because it is in the dictionary, and the limit most used
+    dictionary paragraphs (shared boilerplate) with their use counts and sizes.
+    """
+    conn = connections.reader(DB_NAME)
+    saved = conn.execute(
+        "SELECT coalesce(sum((uses - 1) * size), 0) FROM description_paragraphs"
+    ).fetchone()[0]
+    top = conn.execute(
+        """
+        SELECT uses, size, description_text(codec, body) FROM description_paragraphs
+        ORDER BY (uses - 1) * size DESC LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    return saved, top
+
+# write normalized rows to the jobs table with executemany, batch_size rows at a time
+def bulk_insert(rows, batch_size=BATCH_SIZE, pragmas=None, commit_batches=False):
+    """
+    Insert an iterable of normalized job rows into the jobs table.
+    All rows go in one transaction unless commit_batches is True, in which case
+    every batch is committed on its own (keeps the journal small for huge feeds).
+    pragmas defaults to LOAD_PRAGMAS. Rows are upserted on source_id, so loading
+    the same feed twice is a no-op. Returns the number of rows inserted or updated.
+    """
+    conn = connections.writer(DB_NAME)
+    apply_pragmas(conn, LOAD_PRAGMAS if pragmas is None else pragmas)
+    inserted = 0
+    rows = iter(rows)
+    try:
+        with conn:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                inserted += write_rows(conn, batch)
+                if commit_batches:
+                    conn.commit()
+        if inserted:
+            # refresh the planner statistics the filter indexes are chosen by
+            conn.execute("PRAGMA optimize")
+    finally:
+        # the writer is shared, so put back the settings loading relaxed
+        apply_pragmas(conn, connections.WRITER_PRAGMAS)
+    return inserted
+
 # function to parse data from first rabid jobs file and insert the data into the database
-def save_job_data(json_file):
+def save_job_data(json_file, batch_size=BATCH_SIZE, pragmas=None):
     """Process job-data.json and insert records into the database."""
     with open(json_file, "r", encoding="utf-8") as f:
         data = f.read().strip()
@@ -87,40 +783,10 @@ def save_job_data(json_file):
     except json.JSONDecodeError as e:
         print(f"Error parsing {json_file}: {e}")
         return
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    for job in jobs:
-        # Only skip job entries with no company data.
-        if not job.get("company"):
-            print(f"Skipping job entry due to missing company: {job.get('title', 'Unknown Title')}")
-            continue
-
-        min_salary, max_salary = extract_salary(job.get("salaryRange", ""))
-        job_url = extract_job_url(job.get("jobProviders", []))
-        cursor.execute(
-            """
-            INSERT INTO jobs (title, company, description, location, job_type, date_posted, 
-                              min_amount, max_amount, is_remote, job_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                job.get("title"),
-                job.get("company"),
-                job.get("description"),
-                job.get("location"),
-                job.get("employmentType"),
-                job.get("datePosted"),
-                min_salary,
-                max_salary,
-                "no",  # insert "no" if is_remote is missing
-                job_url,
-            ),
-        )
-    conn.commit()
-    conn.close()
+    bulk_insert(normalize_batch(jobs, "job-data"), batch_size=batch_size, pragmas=pragmas)
 
 # function to parse data from second rabid jobs file and insert the data into the database
-def save_job_data2(json_file):
+def save_job_data2(json_file, batch_size=BATCH_SIZE, pragmas=None):
     """Process job-data2.json and insert records into the database."""
     with open(json_file, "r", encoding="utf-8") as f:
         data = f.read().strip()
@@ -131,40 +797,202 @@ def save_job_data2(json_file):
     except json.JSONDecodeError as e:
         print(f"Error parsing {json_file}: {e}")
         return
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    for job in jobs:
-        # only skip job entries with no company data.
-        if not job.get("company"):
-            continue
+    bulk_insert(normalize_batch(jobs, "job-data2"), batch_size=batch_size, pragmas=pragmas)
 
-        min_salary = convert_float(job.get("min_amount", "0"))
-        max_salary = convert_float(job.get("max_amount", "0"))
-        job_url = job.get("job_url") or job.get("job_url_direct")
-        cursor.execute(
-            """ 
-            INSERT INTO jobs (title, company, description, location, job_type, date_posted, 
-                              min_amount, max_amount, is_remote, job_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                job.get("title"),
-                job.get("company"),
-                job.get("description"),
-                job.get("location"),
-                job.get("job_type"),
-                job.get("date_posted"),
-                min_salary,
-                max_salary,
-                convert_is_remote(job.get("is_remote")),
-                job_url,
-            ),
-        )
+# generator that yields one job at a time from a JSON feed without loading the whole file
+def iter_json_array(json_file, chunk_size=CHUNK_SIZE):  # pylint: disable=too-many-branches
+    """
+    Yield each element of the top-level JSON array in json_file, one at a time.
+    Only a window of the file is kept in memory, so memory stays flat as the feed grows.
+    A top-level object (instead of an array) is yielded as a single job.
+    Raises json.JSONDecodeError if the feed is malformed.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        in_array = None
+
+        # read more text into the buffer, dropping everything already parsed
+        def fill(size):
+            nonlocal buffer, pos, eof
+            chunk = f.read(size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        while True:
+            # skip whitespace (and commas between array elements)
+            skip = " \t\r\n," if in_array else " \t\r\n"
+            while True:
+                while pos < len(buffer) and buffer[pos] in skip:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                fill(chunk_size)
+            if pos >= len(buffer):
+                if in_array:
+                    raise json.JSONDecodeError("Unterminated array", buffer, pos)
+                return
+            if in_array is None:
+                in_array = buffer[pos] == "["
+                if in_array:
+                    pos += 1
+                continue
+            if in_array and buffer[pos] == "]":
+                return
+
+            # decode one element, reading more of the file if it is cut off
+            size = chunk_size
+            while True:
+                try:
+                    job, end = decoder.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    fill(size)
+                    size *= 2
+            pos = end
+            yield job
+            if not in_array:
+                return
+
+# stream the job objects of a feed, rejecting anything else
+def iter_jobs(json_file):
+    """
+    Yield each job object of the feed in json_file (see iter_json_array).
+    Raises ValueError for an element that is not an object, so a malformed
+    feed is reported instead of failing in normalization.
+    """
+    for index, job in enumerate(iter_json_array(json_file)):
+        if not isinstance(job, dict):
+            raise ValueError(f"Element {index} of {json_file} is a "
+                             f"{type(job).__name__}, not a job object")
+        yield job
+
+# normalize a streamed feed batch by batch, stopping (with a message) at the first parse error
+def _stream_rows(json_file, adapter, batch_size):
+    batch = []
+    try:
+        for job in iter_jobs(json_file):
+            if adapter is None:
+                adapter = detect_adapter(job)
+            batch.append(job)
+            if len(batch) >= batch_size:
+                yield from normalize_batch(batch, adapter)
+                batch = []
+    except json.JSONDecodeError as e:
+        print(f"Error parsing {json_file}: {e}")
+    if batch:
+        yield from normalize_batch(batch, adapter)
+
+# function to stream a jobs feed of any registered format into the database in bounded batches
+def stream_job_data(json_file, adapter=None, batch_size=BATCH_SIZE, pragmas=None):
+    """
+    Stream json_file into the jobs table one job object at a time.
+    adapter names the feed format (see ADAPTERS); by default it is detected from
+    the first record. Rows are normalized, written and committed batch_size at a
+    time, so neither memory nor the journal grows with the feed.
+    Returns the number of rows inserted or updated.
+    """
+    return bulk_insert(_stream_rows(json_file, adapter, batch_size), batch_size=batch_size,
+                       pragmas=pragmas, commit_batches=True)
+
+# helper function to hash a file without reading it into memory at once
+def file_hash(path):
+    """Return the sha1 hex digest of the file at path."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# look up the manifest row for a feed file
+def get_manifest_entry(conn, path):
+    """Return (size, mtime, content_hash) recorded for path, or None if never ingested."""
+    return conn.execute(
+        "SELECT size, mtime, content_hash FROM ingest_manifest WHERE path = ?", (path,)
+    ).fetchone()
+
+# record a feed file's fingerprint after it has been ingested
+def record_manifest(conn, path, size, mtime, content_hash):
+    """Insert or refresh the manifest row for path (the caller commits)."""
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO ingest_manifest (path, size, mtime, content_hash, ingested_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (path, size, mtime, content_hash, time.strftime("%Y-%m-%d %H:%M:%S")),
+    )
+
+# forget which feed files have been ingested, so the next sync reads every one again
+def clear_manifest():
+    """
+    Delete every ingest manifest row. The jobs are kept: the next sync upserts
+    them again, so they keep their ids and unchanged ones are not rewritten.
+    """
+    conn = connections.writer(DB_NAME)
+    with conn:
+        conn.execute("DELETE FROM ingest_manifest")
+
+# helper function to tell whether a file's size and mtime match its manifest row
+def is_unchanged(entry, stat):
+    """Return True if the manifest entry matches the os.stat result."""
+    return bool(entry) and entry[0] == stat.st_size and entry[1] == stat.st_mtime
+
+# ingest a feed only if its fingerprint differs from the one in the manifest
+def ingest_file(json_file, adapter=None, force=False):
+    """
+    Stream json_file into the jobs table unless the manifest shows it is unchanged.
+    A matching size and mtime skips the file without reading it; if those differ
+    but the content hash matches, only the manifest is refreshed.
+    Returns True if the file was processed, False if it was skipped.
+    """
+    path = os.path.abspath(json_file)
+    stat = os.stat(path)
+    entry = get_manifest_entry(connections.reader(DB_NAME), path)
+    if not force and is_unchanged(entry, stat):
+        return False
+    content_hash = file_hash(path)
+    processed = force or not entry or entry[2] != content_hash
+    if processed:
+        stream_job_data(path, adapter)
+
+    conn = connections.writer(DB_NAME)
+    record_manifest(conn, path, stat.st_size, stat.st_mtime, content_hash)
     conn.commit()
-    conn.close()
+    return processed
+
+# feed files ingested at startup and the adapter for each one (None to detect it)
+SOURCES = [
+    ("job-data.json", "job-data"),
+    ("job-data2.json", "job-data2"),
+]
+
+# ingest every feed in SOURCES that exists and has changed since the last run
+def sync_job_data(sources=None, force=False):
+    """
+    Bring the jobs table up to date with the feed files in sources
+    (a list of (path, adapter name) pairs, SOURCES by default). A file with an
+    element that is not a job object is reported and skipped.
+    Returns the list of paths that were processed.
+    """
+    processed = []
+    for json_file, adapter in SOURCES if sources is None else sources:
+        if not os.path.exists(json_file):
+            print(f"Skipping missing job file: {json_file}")
+            continue
+        try:
+            if ingest_file(json_file, adapter, force=force):
+                processed.append(json_file)
+        except ValueError as e:  # left out of the manifest, so it is read again next time
+            print(f"Error ingesting {json_file}: {e}")
+    return processed
 
 
 if __name__ == "__main__":
     create_table()
-    save_job_data("job-data.json")
-    save_job_data2("job-data2.json")
+    sync_job_data()
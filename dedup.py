@@ -0,0 +1,230 @@
+"""
+dedup.py
+
+This module finds jobs that are near-duplicates of each other (the same posting
+carried by several providers, with small wording changes) and groups them into
+clusters. Each description is split into word shingles and summarized by a
+MinHash signature; locality-sensitive hashing on bands of the signature finds
+candidate pairs without comparing every job with every other, and a candidate
+only joins a cluster if its estimated similarity reaches the threshold.
+
+Every job's cluster_id is the id of its cluster's canonical row, the first job
+of the cluster that was ingested, so jobs with cluster_id = id are one listing
+per posting. Only canonical rows are kept in the LSH buckets, and only new and
+changed jobs (cluster_id IS NULL) are processed.
+"""
+import zlib
+from array import array
+import connections
+import database
+
+# jobs whose estimated description similarity (Jaccard over shingles) reaches this
+# are duplicates
+DEFAULT_THRESHOLD = 0.8
+# words per shingle
+SHINGLE_SIZE = 5
+# MinHash values per signature (a power of two)
+NUM_HASHES = 64
+# jobs read, hashed and written per transaction
+DEDUP_BATCH_SIZE = 2000
+
+MASK = 0xFFFFFFFF
+# marks an empty slot in a signature before densification
+EMPTY = 0xFFFFFFFF
+# bits of each shingle hash that pick its signature slot
+SLOT_BITS = NUM_HASHES.bit_length() - 1
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """
+    Return the set of 32-bit hashes of the size-word shingles of text. Words are
+    hashed with crc32 and shingles as tuples of those ints, which (unlike hashing
+    str) gives the same values in every process.
+    """
+    words = list(map(zlib.crc32, (text or "").lower().encode("utf-8").split()))
+    if len(words) < size:
+        return {hash(tuple(words)) & MASK} if words else set()
+    return {value & MASK for value in map(hash, zip(*(words[i:] for i in range(size))))}
+
+def signature(text):
+    """
+    Return the MinHash signature of text as an array of NUM_HASHES ints, or None
+    if text has no words. It is a one-permutation MinHash: each shingle is hashed
+    once and the hash picks both its slot and its value, so the cost is linear in
+    the length of the text rather than in NUM_HASHES.
+    """
+    hashes = shingle_hashes(text)
+    if not hashes:
+        return None
+    sig = array("I", [EMPTY]) * NUM_HASHES
+    shift = 32 - SLOT_BITS
+    for value in hashes:
+        slot = value >> shift
+        if value < sig[slot]:
+            sig[slot] = value
+    # fill each empty slot from the next filled one, so signatures stay comparable
+    for slot in range(NUM_HASHES):
+        if sig[slot] == EMPTY:
+            step = 1
+            while sig[(slot + step) % NUM_HASHES] == EMPTY:
+                step += 1
+            sig[slot] = (sig[(slot + step) % NUM_HASHES] + step * 0x5BD1E995) & 0x7FFFFFFF
+    return sig
+
+def similarity(sig_a, sig_b):
+    """Estimate the Jaccard similarity of two signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_HASHES
+
+def lsh_params(threshold):
+    """
+    Return (bands, rows) for threshold: the banding whose S-curve midpoint
+    (1 / bands) ** (1 / rows) is highest without going above threshold.
+    """
+    best = (NUM_HASHES, 1)
+    for rows in range(1, NUM_HASHES + 1):
+        bands = NUM_HASHES // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+def band_keys(sig, bands, rows):
+    """Return the LSH bucket key of each band of sig (band index in the high bits)."""
+    data = sig.tobytes()
+    width = rows * sig.itemsize
+    return [(band << 32) | zlib.crc32(data[band * width:(band + 1) * width])
+            for band in range(bands)]
+
+# helper function: forget stored signatures if they were banded for another threshold
+def _check_params(conn, bands, rows):
+    stored = conn.execute("SELECT bands, rows FROM lsh_params").fetchone()
+    if stored == (bands, rows):
+        return
+    conn.execute("DELETE FROM job_lsh")
+    conn.execute("DELETE FROM job_minhash")
+    conn.execute("DELETE FROM lsh_params")
+    conn.execute("INSERT INTO lsh_params (bands, rows) VALUES (?, ?)", (bands, rows))
+    conn.execute("UPDATE jobs SET cluster_id = NULL WHERE cluster_id IS NOT NULL")
+
+def update_clusters(threshold=DEFAULT_THRESHOLD, rebuild=False):
+    """
+    Assign a cluster_id to every job that does not have one yet (new and changed
+    jobs), and to the other members of any cluster whose canonical row changed.
+    A job joins the cluster of the most similar canonical row at or above
+    threshold, or starts its own. Changing threshold, or rebuild=True,
+    reclusters every job. Returns the number of jobs processed.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError(f"Duplicate threshold must be between 0 and 1, not {threshold}")
+    bands, rows = lsh_params(threshold)
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        if rebuild:
+            conn.execute("DELETE FROM lsh_params")
+        _check_params(conn, bands, rows)
+        # members of a cluster whose canonical row changed are re-clustered with it
+        conn.execute(
+            """
+            UPDATE jobs SET cluster_id = NULL
+            WHERE cluster_id IN (SELECT id FROM jobs WHERE cluster_id IS NULL)
+            """
+        )
+    processed, after_id = 0, 0
+    while True:
+        batch = conn.execute(
+            """
+            SELECT id, description_text(codec, body)
+            FROM jobs LEFT JOIN job_descriptions ON job_descriptions.job_id = jobs.id
+            WHERE cluster_id IS NULL AND id > ?
+            ORDER BY id LIMIT ?
+            """,
+            (after_id, DEDUP_BATCH_SIZE),
+        ).fetchall()
+        if not batch:
+            return processed
+        with conn:
+            _cluster_batch(conn, batch, threshold, bands, rows)
+        processed += len(batch)
+        after_id = batch[-1][0]
+
+# helper function: sign, band and cluster one batch of (id, description) rows
+def _cluster_batch(conn, batch, threshold, bands, rows):
+    ids = [job_id for job_id, _ in batch]
+    _forget_signatures(conn, ids, bands, rows)
+    signatures, keys = {}, {}
+    for job_id, description in batch:
+        sig = signature(description)
+        if sig is not None:
+            signatures[job_id] = sig
+            keys[job_id] = band_keys(sig, bands, rows)
+
+    # candidates already clustered: canonical rows sharing at least one bucket
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS batch_lsh (band_key INTEGER, job_id INTEGER)")
+    conn.execute("DELETE FROM batch_lsh")
+    conn.executemany("INSERT INTO batch_lsh (band_key, job_id) VALUES (?, ?)",
+                     [(key, job_id) for job_id, job_keys in keys.items() for key in job_keys])
+    candidates = {}
+    for job_id, other_id in conn.execute(
+        """
+        SELECT DISTINCT batch_lsh.job_id, job_lsh.job_id
+        FROM batch_lsh CROSS JOIN job_lsh ON job_lsh.band_key = batch_lsh.band_key
+        """
+    ):
+        candidates.setdefault(job_id, set()).add(other_id)
+    _load_signatures(conn, {other_id for others in candidates.values() for other_id in others},
+                     signatures)
+
+    clusters, canonical = _assign_clusters(ids, signatures, keys, candidates, threshold)
+    conn.executemany("INSERT INTO job_lsh (band_key, job_id) VALUES (?, ?)",
+                     [(key, job_id) for job_id in canonical for key in keys[job_id]])
+    conn.executemany("INSERT INTO job_minhash (job_id, signature) VALUES (?, ?)",
+                     [(job_id, signatures[job_id].tobytes()) for job_id in canonical])
+    conn.executemany("UPDATE jobs SET cluster_id = ? WHERE id = ?",
+                     [(cluster_id, job_id) for job_id, cluster_id in clusters.items()])
+
+# helper function: drop the signatures and buckets of changed canonical rows in ids,
+# which no longer describe them
+def _forget_signatures(conn, ids, bands, rows):
+    old_signatures = {}
+    _load_signatures(conn, ids, old_signatures)
+    conn.executemany("DELETE FROM job_lsh WHERE band_key = ? AND job_id = ?",
+                     [(key, job_id) for job_id, sig in old_signatures.items()
+                      for key in band_keys(sig, bands, rows)])
+    conn.executemany("DELETE FROM job_minhash WHERE job_id = ?",
+                     [(job_id,) for job_id in old_signatures])
+
+# helper function: pick each job's cluster, in id order, given its candidates from
+# earlier batches. returns ({job id: cluster id}, [ids of new canonical rows]).
+def _assign_clusters(ids, signatures, keys, candidates, threshold):
+    # only canonical rows go into buckets, so a posting copied many times is still
+    # compared once per distinct posting rather than once per copy
+    buckets, clusters, canonical = {}, {}, []
+    for job_id in ids:
+        if job_id not in signatures:
+            clusters[job_id] = job_id
+            continue
+        found = candidates.get(job_id, set())
+        found.update(other for key in keys[job_id] for other in buckets.get(key, ()))
+        best, best_similarity = job_id, threshold
+        for other_id in sorted(found):
+            score = similarity(signatures[job_id], signatures[other_id])
+            if score >= best_similarity and (best == job_id or score > best_similarity):
+                best, best_similarity = other_id, score
+        clusters[job_id] = best
+        if best == job_id:
+            canonical.append(job_id)
+            for key in keys[job_id]:
+                buckets.setdefault(key, []).append(job_id)
+    return clusters, canonical
+
+# helper function: add the stored signatures of job_ids to signatures
+def _load_signatures(conn, job_ids, signatures):
+    job_ids = list(job_ids)
+    for start in range(0, len(job_ids), 500):
+        chunk = job_ids[start:start + 500]
+        for job_id, data in conn.execute(
+            f"SELECT job_id, signature FROM job_minhash WHERE job_id IN "
+            f"({', '.join('?' * len(chunk))})",
+            chunk,
+        ):
+            sig = array("I")
+            sig.frombytes(data)
+            signatures[job_id] = sig
@@ -0,0 +1,136 @@
+"""
+descriptions.py
+
+This module compresses job descriptions for storage. Descriptions are kept out of
+the jobs table, one row per job in job_descriptions (job_id, codec, body), so the
+rows that listing, filtering and search scan stay small; a description is only
+decompressed when a job is opened or sent to the model.
+
+Paragraphs that several descriptions share (EEO statements, benefits blurbs,
+"About us" sections) are stored once, in the description_paragraphs dictionary
+table. A description that uses them is stored with codec "dict+<codec>": a
+compressed JSON list whose items are either its own paragraphs or the ids of
+dictionary paragraphs.
+
+zlib is always available. zstd is used if the zstandard package is installed and
+DESCRIPTION_CODEC is set to "zstd".
+"""
+import functools
+import hashlib
+import json
+import zlib
+
+try:
+    import zstandard  # pylint: disable=import-error
+except ImportError:  # optional dependency
+    zstandard = None
+
+# codec new descriptions are stored with: "zlib", "zstd" or "none"
+DESCRIPTION_CODEC = "zlib"
+# descriptions shorter than this many bytes are not worth compressing
+MIN_COMPRESS_SIZE = 200
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+# descriptions are split into paragraphs at blank lines
+PARAGRAPH_SEPARATOR = "\n\n"
+# shorter paragraphs (headings, "Requirements:") are never put in the dictionary
+MIN_PARAGRAPH_SIZE = 80
+# dictionary paragraphs each connection keeps decompressed
+PARAGRAPH_CACHE_SIZE = 4096
+DICT_PREFIX = "dict+"
+
+def _compressor(codec):
+    if codec == "zlib":
+        return lambda data: zlib.compress(data, ZLIB_LEVEL)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("The zstd codec needs the zstandard package")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress
+    raise ValueError(f"Unknown description codec: {codec}")
+
+def split_paragraphs(text):
+    """Split text into paragraphs; joining them with PARAGRAPH_SEPARATOR gives text back."""
+    return (text or "").split(PARAGRAPH_SEPARATOR)
+
+def paragraph_digest(paragraph):
+    """Return the digest a paragraph is looked up by in the dictionary."""
+    return hashlib.sha1(paragraph.encode("utf-8")).digest()
+
+def compress(text, codec=None, paragraph_ids=None):
+    """
+    Return (codec, body) to store text with. Short descriptions, and ones that
+    do not get smaller, are stored as they are with codec "none".
+    paragraph_ids maps the digests of dictionary paragraphs to their ids; any of
+    them in text are stored as references.
+    """
+    codec = codec or DESCRIPTION_CODEC
+    if paragraph_ids:
+        items = [paragraph_ids.get(paragraph_digest(paragraph), paragraph)
+                 for paragraph in split_paragraphs(text)]
+        if any(isinstance(item, int) for item in items):
+            codec, body = _compress_text(json.dumps(items, ensure_ascii=False), codec)
+            return DICT_PREFIX + codec, body
+    return _compress_text(text, codec)
+
+# helper function: compress one string, or store it as it is
+def _compress_text(text, codec):
+    text = text or ""
+    data = text.encode("utf-8")
+    if codec == "none" or len(data) < MIN_COMPRESS_SIZE:
+        return "none", text
+    body = _compressor(codec)(data)
+    if len(body) >= len(data):
+        return "none", text
+    return codec, body
+
+def paragraph_refs(codec, body):
+    """Return the ids of the dictionary paragraphs a stored description refers to."""
+    if body is None or not codec.startswith(DICT_PREFIX):
+        return []
+    items = json.loads(decompress(codec[len(DICT_PREFIX):], body))
+    return [item for item in items if isinstance(item, int)]
+
+def decompress(codec, body, paragraph=None):
+    """
+    Return the text stored as (codec, body); None if there is no description.
+    paragraph(id) returns the text of a dictionary paragraph; it is needed for
+    descriptions stored with a "dict+" codec.
+    """
+    if body is None:
+        return None
+    if codec.startswith(DICT_PREFIX):
+        items = json.loads(decompress(codec[len(DICT_PREFIX):], body))
+        return PARAGRAPH_SEPARATOR.join(paragraph(item) if isinstance(item, int) else item
+                                        for item in items)
+    if codec == "none":
+        return body
+    if codec == "zlib":
+        return zlib.decompress(body).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("This description was stored with zstd; install zstandard")
+        return zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+    raise ValueError(f"Unknown description codec: {codec}")
+
+def text_function(conn):
+    """
+    Return description_text(codec, body) for conn: decompress that looks dictionary
+    paragraphs up on conn. Decompressed paragraphs are cached on (id, digest): an id
+    can be given to another paragraph when the batch that added it is rolled back.
+    """
+    @functools.lru_cache(maxsize=PARAGRAPH_CACHE_SIZE)
+    def cached_paragraph(paragraph_id, digest):  # pylint: disable=unused-argument
+        codec, body = conn.execute(
+            "SELECT codec, body FROM description_paragraphs WHERE id = ?", (paragraph_id,)
+        ).fetchone()
+        return decompress(codec, body)
+
+    def paragraph(paragraph_id):
+        digest, = conn.execute(
+            "SELECT digest FROM description_paragraphs WHERE id = ?", (paragraph_id,)
+        ).fetchone()
+        return cached_paragraph(paragraph_id, digest)
+
+    def description_text(codec, body):
+        return decompress(codec, body, paragraph)
+    return description_text
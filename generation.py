@@ -0,0 +1,236 @@
+"""
+generation.py
+
+This module runs resume and cover letter generation in the background, so the
+GUI keeps responding during the model round-trip and the PDF render. Each
+generation is a task on a small thread pool; it reports its progress through a
+post(event, value) callback (the GUI passes window.write_event_value) and can
+be cancelled. Several generations can run at once.
+
+A streamed generation reports the answer piece by piece as the model writes it,
+and writes each piece to the document's Markdown file straight away.
+
+A resume and a cover letter for the same job can be made from one request (see
+COMBINED), so the job and personal descriptions are only sent once.
+"""
+import functools
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import artifacts
+
+# event posted with (task id, status, detail) whenever a generation moves on
+GENERATION_EVENT = "-GENERATION-"
+# generations that run at the same time; more wait in the queue
+MAX_WORKERS = 3
+# task statuses; a task ends in one of the last three. A streamed task posts
+# STREAMING with each piece of the answer as its detail.
+QUEUED, GENERATING, STREAMING, SAVING, DONE, FAILED, CANCELLED = (
+    "queued", "generating", "streaming", "saving", "done", "failed", "cancelled")
+
+# what each kind of document is made with, as names in main.py, and the base
+# name of its Markdown file
+DOCUMENTS = {
+    "resume": ("create_resume", "save_resume", "resume"),
+    "cover letter": ("create_cover_letter", "save_cover_letter", "cover_letter"),
+}
+# kinds made with one model request, as the name in main.py that makes them; the
+# answer is the documents of the kinds listed, saved separately
+COMBINED = {
+    "resume and cover letter": ("create_resume_and_cover_letter", ("resume", "cover letter")),
+}
+
+class Cancelled(Exception):
+    """Raised inside a task when it has been cancelled."""
+
+class Generations:
+    """
+    Starts generation tasks on a thread pool and tracks them. post(event, value)
+    is called from the worker threads with GENERATION_EVENT and
+    (task id, status, detail); detail is the saved (markdown, pdf) paths when a
+    task is done and the error message when it failed. first_token maps each
+    streamed task that has received text to the seconds from GENERATING to its
+    first piece.
+    """
+
+    def __init__(self, post, max_workers=MAX_WORKERS):
+        self.post = post
+        self.first_token = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="generation")
+        self._ids = itertools.count(1)
+        self._tasks = {}
+
+    def start(self, kind, job_description, personal_description, refresh=False, stream=False,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+              job_id=None, profile_id=None):
+        """
+        Queue a generation of kind (a key of DOCUMENTS or COMBINED) and return its task id.
+        refresh asks the model even if the answer is cached; stream posts the
+        answer as it arrives. The saved files are recorded in the artifacts table
+        with job_id and profile_id.
+        """
+        if kind not in DOCUMENTS and kind not in COMBINED:
+            raise ValueError(f"Unknown document kind: {kind}")
+        task_id = next(self._ids)
+        cancelled = threading.Event()
+        source = document_source(kind, job_description, personal_description, job_id,
+                                 profile_id)
+        generate = functools.partial(generate_document, kind, job_description,
+                                     personal_description, refresh=refresh, stream=stream,
+                                     source=source)
+        self.post(GENERATION_EVENT, (task_id, QUEUED, None))
+        future = self._executor.submit(self._run, task_id, generate, cancelled)
+        self._tasks[task_id] = (future, cancelled)
+        return task_id
+
+    def cancel(self, task_id):
+        """
+        Cancel a task. A queued task never starts; a running one stops at its next
+        step (or streamed piece) and saves nothing. A model call already under way
+        without streaming is left to finish, and its answer is dropped.
+        """
+        future, cancelled = self._tasks[task_id]
+        cancelled.set()
+        if future.cancel():
+            self.post(GENERATION_EVENT, (task_id, CANCELLED, None))
+
+    def running(self):
+        """Return the ids of the tasks that have not finished."""
+        return [task_id for task_id, (future, _) in self._tasks.items() if not future.done()]
+
+    def shutdown(self):
+        """Cancel every task and wait for the running ones to stop."""
+        for task_id in self.running():
+            self.cancel(task_id)
+        self._executor.shutdown(wait=True)
+
+    def _run(self, task_id, generate, cancelled):
+        started = []
+
+        def report(status, detail=None):
+            if status == GENERATING:
+                started.append(time.perf_counter())
+            elif status == STREAMING and task_id not in self.first_token:
+                self.first_token[task_id] = time.perf_counter() - started[0]
+            self.post(GENERATION_EVENT, (task_id, status, detail))
+
+        try:
+            paths = generate(cancelled, report)
+        except Cancelled:
+            self.post(GENERATION_EVENT, (task_id, CANCELLED, None))
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.post(GENERATION_EVENT, (task_id, FAILED, str(e)))
+        else:
+            self.post(GENERATION_EVENT, (task_id, DONE, paths))
+
+def create_document(kind, job_description, personal_description, refresh=False,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                    on_chunk=None, before_request=None):
+    """
+    Ask the model for a document of kind (a key of DOCUMENTS) and return its text;
+    for a kind in COMBINED, return a tuple of the texts of its documents.
+    The same request made before is answered from the response cache, unless refresh.
+    With on_chunk, the answer is streamed to on_chunk(text) as it arrives.
+    before_request() is called before each request actually sent to the model.
+    """
+    import main  # pylint: disable=import-outside-toplevel  # main imports gui
+    create = getattr(main, (DOCUMENTS.get(kind) or COMBINED[kind])[0])
+    # the session holds the profile's part of the prompt if it can (see sessions.py)
+    with main.SESSIONS.session(main.profile_prefix(personal_description)) as chat:
+        return create(chat, job_description, personal_description, cache=True, refresh=refresh,
+                      on_chunk=on_chunk, before_request=before_request)
+
+def document_source(kind, job_description, personal_description, job_id=None,
+                    profile_id=None):
+    """Return what a document's files are recorded with in the artifacts table."""
+    return {"job_id": job_id, "profile_id": profile_id,
+            "prompt_hash": artifacts.prompt_hash(kind, job_description, personal_description)}
+
+def save_document(kind, document, source=None):
+    """
+    Save a document of kind as Markdown, render it to PDF and return both paths;
+    both files are recorded in the artifacts table with source (see document_source).
+    The documents of a COMBINED kind are saved in turn, and their paths returned
+    one pair after another.
+    """
+    import main  # pylint: disable=import-outside-toplevel
+    if kind in COMBINED:
+        return sum((save_document(part, text, source)
+                    for part, text in zip(COMBINED[kind][1], document)), ())
+    save = getattr(main, DOCUMENTS[kind][1])
+    md_filename = save(document, source)
+    return md_filename, main.convert_text_to_pdf(md_filename, document)
+
+def generate_document(kind, job_description, personal_description, cancelled, report,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                      refresh=False, stream=False, source=None):
+    """
+    Generate a document of kind, save it as Markdown and render it to PDF, calling
+    report(status) as each step starts. Raises Cancelled if cancelled (a
+    threading.Event) is set between steps. Returns (markdown path, pdf path), or
+    those of every document of a COMBINED kind.
+    With stream, the answer is saved as it arrives (see stream_document); a
+    COMBINED answer is only reported as it arrives, and saved once it is split.
+    The files are recorded in the artifacts table with source.
+    """
+    if cancelled.is_set():
+        raise Cancelled()
+    report(GENERATING)
+    if stream and kind not in COMBINED:
+        return stream_document(kind, job_description, personal_description, cancelled, report,
+                               refresh, source)
+
+    def on_chunk(text):
+        if cancelled.is_set():
+            raise Cancelled()
+        report(STREAMING, text)
+
+    document = create_document(kind, job_description, personal_description, refresh,
+                               on_chunk if stream else None)
+    if cancelled.is_set():
+        raise Cancelled()
+    report(SAVING)
+    return save_document(kind, document, source)
+
+def stream_document(kind, job_description, personal_description, cancelled, report,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                    refresh=False, source=None):
+    """
+    Generate a document of kind, writing the answer to the Markdown file
+    save_resume / save_cover_letter would create as it arrives and calling
+    report(STREAMING, text) with each piece; then store it and render it to PDF.
+    The file is only written if artifacts.EXPORT_ON_SAVE is set (see
+    main.open_markdown). Raises Cancelled when a piece arrives after cancelled is
+    set. The unfinished file is deleted (and forgotten by the artifacts table) if
+    the generation does not complete.
+    Returns (markdown path, pdf path).
+    """
+    import main  # pylint: disable=import-outside-toplevel
+    md_filename, file = main.open_markdown(DOCUMENTS[kind][2], source)
+    # a "\r" ending a piece may be the first half of a "\r\n"
+    pending = [""]
+    written = []
+
+    def write(text):
+        if cancelled.is_set():
+            raise Cancelled()
+        report(STREAMING, text)
+        text = pending[0] + text
+        pending[0] = "\r" if text.endswith("\r") else ""
+        text = text[:len(text) - len(pending[0])]
+        written.append(text)
+        file.write(text.replace("\r\n", "\n").replace("\r", "\n"))
+        file.flush()
+
+    try:
+        with file:
+            create_document(kind, job_description, personal_description, refresh, write)
+            file.write(pending[0].replace("\r", "\n"))
+        document = "".join(written) + pending[0]
+        main.store_markdown(md_filename, document, write=False)
+    except BaseException:
+        if os.path.exists(md_filename):
+            os.remove(md_filename)
+        artifacts.forget(md_filename)
+        raise
+    report(SAVING)
+    return md_filename, main.convert_text_to_pdf(md_filename, document)
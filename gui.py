@@ -5,15 +5,37 @@ This module creates the application's graphical user interface (GUI),
 inserts saved user profile data into the database, allows the
 user to pick a job from the database and generate a resume and cover letter
 """
-import sqlite3
+import collections
+import datetime
 import PySimpleGUI as sg
-DB_NAME = "jobs.db"
+import artifacts
+import compaction
+import connections
+import database
+import generation
+import response_cache
+import search
+
+# most search results shown in the job list at once
+SEARCH_LIMIT = 200
+# job type filter option that matches every job type
+ANY_JOB_TYPE = "Any"
+# jobs shown in the job list at a time
+PAGE_SIZE = 100
+# pages of the job list kept in memory (the current page and its neighbours)
+PAGE_CACHE_SIZE = 5
+# profile inputs, in the order of the user_profiles columns after id
+PROFILE_KEYS = ("-FULL_NAME-", "-EMAIL-", "-PHONE-", "-GITHUB-", "-LINKEDIN-",
+                "-PROJECTS-", "-COURSES-", "-OTHER-")
+# generate buttons and the kind of document (see generation.DOCUMENTS) they make
+GENERATE_BUTTONS = {"Generate Resume": "resume", "Generate Cover Letter": "cover letter",
+                    "Generate Both": "resume and cover letter"}
 
 def create_user_profiles_table():
     """
     Create the user_profiles table in the database.
     """
-    conn = sqlite3.connect(DB_NAME)
+    conn = connections.writer(database.DB_NAME)
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -31,38 +53,166 @@ def create_user_profiles_table():
         """
     )
     conn.commit()
-    conn.close()
 
-def get_jobs():
+def get_jobs(canonical_only=False):
     """
     Retrieve all job entries from the 'jobs' table, returning (id,title).
+    With canonical_only, near-duplicates are left out: one job is returned per
+    cluster found by dedup.py (jobs not clustered yet are all returned).
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title FROM jobs")
+    cursor = connections.reader(database.DB_NAME).cursor()
+    if canonical_only:
+        cursor.execute("SELECT id, title FROM jobs WHERE cluster_id IS NULL OR cluster_id = id")
+    else:
+        cursor.execute("SELECT id, title FROM jobs")
     jobs = cursor.fetchall()
-    conn.close()
     return jobs
 
+def get_jobs_page(after_id=0, limit=PAGE_SIZE, canonical_only=True):
+    """
+    Retrieve up to limit jobs with an id above after_id, returning (id,title) in id
+    order. Pages are keyset queries on the primary key, so fetching one costs the
+    same however many jobs there are. canonical_only works as in get_jobs.
+    """
+    cursor = connections.reader(database.DB_NAME).cursor()
+    duplicates = "AND (cluster_id IS NULL OR cluster_id = id)" if canonical_only else ""
+    cursor.execute(
+        f"SELECT id, title FROM jobs WHERE id > ? {duplicates} ORDER BY id LIMIT ?",
+        (after_id, limit),
+    )
+    return cursor.fetchall()
+
+class JobPager:
+    """
+    Pages through a job listing. fetch(after_id, limit) returns the (id, title)
+    rows after after_id in id order; get_jobs_page and search.filter_jobs both fit.
+    The last few pages fetched are cached, so moving back and forth between
+    neighbouring pages does not query the database again.
+    """
+
+    def __init__(self, fetch, page_size=PAGE_SIZE, cache_size=PAGE_CACHE_SIZE):
+        self.fetch = fetch
+        self.page_size = page_size
+        self.cache_size = cache_size
+        self.number = 0
+        # the after_id each page starts from, for every page reached so far
+        self._starts = [0]
+        self._cache = collections.OrderedDict()
+
+    def _load(self, number):
+        if number in self._cache:
+            self._cache.move_to_end(number)
+            return self._cache[number]
+        rows = self.fetch(self._starts[number], self.page_size)
+        self._cache[number] = rows
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        if len(rows) == self.page_size and len(self._starts) == number + 1:
+            self._starts.append(rows[-1][0])
+        return rows
+
+    def current(self):
+        """Return the rows of the current page."""
+        return self._load(self.number)
+
+    def next(self):
+        """Move to the next page and return its rows; None (staying put) at the end."""
+        if len(self._starts) <= self.number + 1:
+            return None
+        rows = self._load(self.number + 1)
+        if not rows:
+            return None
+        self.number += 1
+        return rows
+
+    def previous(self):
+        """Move to the previous page and return its rows; None on the first page."""
+        if self.number == 0:
+            return None
+        self.number -= 1
+        return self._load(self.number)
+
+    def prefetch(self):
+        """Load the page after the current one, so Next can show it straight away."""
+        if len(self._starts) > self.number + 1:
+            self._load(self.number + 1)
+            self._cache.move_to_end(self.number, last=True)
+
 def get_job_details(job_id):
     """
-    Retrieve a single job entry by its ID, returning all fields from the 'jobs' table.
+    Retrieve a single job entry by its ID, in the order format_job_details expects.
+    The description is read from job_descriptions and decompressed only here,
+    when a job is opened.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    cursor = connections.reader(database.DB_NAME).cursor()
+    cursor.execute(
+        """
+        SELECT jobs.id, title, company, description_text(codec, body), location, job_type,
+               date_posted, min_amount, max_amount, is_remote, job_url
+        FROM jobs LEFT JOIN job_descriptions ON job_descriptions.job_id = jobs.id
+        WHERE jobs.id = ?
+        """,
+        (job_id,),
+    )
     job = cursor.fetchone()
-    conn.close()
     return job
 
+def get_job_types():
+    """
+    Retrieve the distinct job types in the 'jobs' table, for the job type filter.
+    """
+    cursor = connections.reader(database.DB_NAME).cursor()
+    # step from each job type to the next through idx_jobs_job_type, so the cost grows
+    # with the number of job types rather than the number of jobs
+    cursor.execute(
+        """
+        WITH RECURSIVE job_types (job_type) AS (
+            SELECT min(job_type) FROM jobs WHERE job_type > ''
+            UNION ALL
+            SELECT (SELECT min(job_type) FROM jobs WHERE job_type > job_types.job_type)
+            FROM job_types WHERE job_type IS NOT NULL
+        )
+        SELECT job_type FROM job_types WHERE job_type IS NOT NULL
+        """
+    )
+    job_types = [row[0] for row in cursor.fetchall()]
+    return job_types
+
+def read_filters(values):
+    """
+    Build a search.filter_jobs filters dict from the filter controls in values.
+    Raises ValueError if the minimum salary or posted-since date is not valid.
+    """
+    min_salary = values["-MIN_SALARY-"].strip().replace(",", "")
+    posted_since = values["-POSTED_SINCE-"].strip()
+    if posted_since:
+        posted_since = datetime.date.fromisoformat(posted_since).isoformat()
+    job_type = values["-JOB_TYPE-"]
+    return {
+        "min_salary": float(min_salary) if min_salary else None,
+        "is_remote": "yes" if values["-REMOTE-"] else None,
+        "job_type": None if job_type in ("", ANY_JOB_TYPE) else job_type,
+        "location": values["-LOCATION-"].strip(),
+        "posted_since": posted_since,
+    }
+
+def read_token_budget(values):
+    """
+    Return the prompt token budget (see compaction.fit_description) typed in values.
+    Raises ValueError if it is not a positive whole number.
+    """
+    budget = int(values["-TOKEN_BUDGET-"].strip().replace(",", ""))
+    if budget <= 0:
+        raise ValueError(f"Token budget must be positive, not {budget}")
+    return budget
+
 def get_user_profiles():
     """
     Retrieve all user profiles from the user_profiles table.
     Each profile is returned as a tuple:
     (id, full_name, email, phone, githubID, linkedin, projects, relevant_courses, other_info)
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    cursor = connections.reader(database.DB_NAME).cursor()
     cursor.execute(
         """
         SELECT id, full_name, email, phone, githubID, 
@@ -71,14 +221,13 @@ def get_user_profiles():
         """
     )
     profiles = cursor.fetchall()
-    conn.close()
     return profiles
 
 def save_user_profile(data):
     """
     Insert a new user into the user_profiles table using the data dictionary.
     """
-    conn = sqlite3.connect(DB_NAME)
+    conn = connections.writer(database.DB_NAME)
     cursor = conn.cursor()
     # Insert the user profile data into the user_profiles table.
     cursor.execute(
@@ -100,7 +249,74 @@ def save_user_profile(data):
         ),
     )
     conn.commit()
-    conn.close()
+
+def profile_values(profile):
+    """Return a get_user_profiles row as the values of the profile inputs."""
+    return dict(zip(PROFILE_KEYS, profile[1:]))
+
+def personal_description(values):
+    """Combine the profile inputs into the personal description given to the AI."""
+    return (
+        f"Full Name: {values['-FULL_NAME-']}\n"
+        f"Email: {values['-EMAIL-']}\n"
+        f"Phone: {values['-PHONE-']}\n"
+        f"GitHub: {values['-GITHUB-']}\n"
+        f"LinkedIn: {values['-LINKEDIN-']}\n"
+        f"Projects: {values['-PROJECTS-']}\n"
+        f"Relevant Courses: {values['-COURSES-']}\n"
+        f"Other Info: {values['-OTHER-']}"
+    )
+
+def format_tasks(tasks):
+    """Format {task id: [label, status]} as lines for the Generations list, newest first."""
+    return [f"#{task_id} {label}: {status}"
+            for task_id, (label, status) in sorted(tasks.items(), reverse=True)]
+
+def selected_job(values):
+    """
+    Return (job, None) for the job selected in the job list, as get_job_details
+    returns it, or (None, a message saying why there is none).
+    """
+    selected = values["-JOB_LIST-"]
+    if not selected:
+        return None, "Please select a job from the list."
+    try:
+        job_id = int(selected[0].split(":")[0])
+    except ValueError:
+        return None, "Invalid job selection."
+    job = get_job_details(job_id)
+    return (job, None) if job else (None, "Job details not found.")
+
+def show_generation_event(window, value, tasks, previews, preview_task, first_token):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    """
+    Show a generation.GENERATION_EVENT value (task id, status, detail) in the window.
+    Streamed text is added to the task's previews and shown if it is preview_task;
+    the Generations list (tasks) only changes for the first piece, with the seconds
+    first_token says it took, and when the task is done or failed.
+    """
+    task_id, status, detail = value
+    if status == generation.STREAMING:
+        previews[task_id].append(detail)
+        if task_id == preview_task:
+            window["-PREVIEW-"].update(detail, append=True)
+        if len(previews[task_id]) > 1:
+            return
+        status = f"writing (first text after {first_token[task_id]:.1f} s)"
+    elif status == generation.DONE:
+        status = f"saved as {', '.join(detail[:-1])} and {detail[-1]}"
+    elif status == generation.FAILED:
+        status = f"failed: {detail}"
+    tasks[task_id][1] = status
+    window["-TASKS-"].update(values=format_tasks(tasks))
+
+def scrolled_past_end(window):
+    """
+    Return True if the scroll event just read from window scrolled down while the
+    job list was already showing its last row.
+    """
+    scroll = window.user_bind_event
+    scrolled_down = getattr(scroll, "num", None) == 5 or getattr(scroll, "delta", 0) < 0
+    return scrolled_down and window["-JOB_LIST-"].Widget.yview()[1] >= 1.0
 
 def format_job_details(job):
     """
@@ -131,10 +347,13 @@ def main():
     """
     # call function to create new table in jobs.db
     create_user_profiles_table()
+    # a document generated here is wanted now, so its files are written as it is saved
+    artifacts.EXPORT_ON_SAVE = True
 
-    # get all job listings from database, with their id and title
-    jobs = get_jobs()
-    job_list = [f"{job[0]}: {job[1]}" for job in jobs]
+    # page through the job listings, with their id and title, one per posting.
+    # only the first page is read before the window opens.
+    pager = JobPager(get_jobs_page)
+    job_list = [f"{job[0]}: {job[1]}" for job in pager.current()]
 
     # get saved profiles for the dropdown menu
     profiles = get_user_profiles()
@@ -146,6 +365,16 @@ def main():
     # layout for job listings and details.
     job_layout = [
         [sg.Text("Job Listings")],
+        [sg.Text("Search"), sg.Input(key="-SEARCH-", size=(43, 1), enable_events=True)],
+        # structured filters, applied with the Apply Filters button
+        [sg.Text("Min Salary"), sg.Input(key="-MIN_SALARY-", size=(10, 1)),
+         sg.Checkbox("Remote only", key="-REMOTE-"),
+         sg.Combo([ANY_JOB_TYPE] + get_job_types(), default_value=ANY_JOB_TYPE,
+                  key="-JOB_TYPE-", readonly=True, size=(12, 1))],
+        [sg.Text("Location"), sg.Input(key="-LOCATION-", size=(15, 1)),
+         sg.Text("Posted Since"), sg.Input(key="-POSTED_SINCE-", size=(10, 1),
+                                           tooltip="YYYY-MM-DD")],
+        [sg.Button("Apply Filters"), sg.Button("Clear Filters")],
         [
             sg.Listbox(
                 values=job_list,
@@ -154,6 +383,7 @@ def main():
                 enable_events=True
             )
         ],
+        [sg.Button("Prev"), sg.Text("Page 1", key="-PAGE-", size=(20, 1)), sg.Button("Next")],
         [sg.Text("Job Details")],
         [sg.Multiline("", size=(60, 10), key="-JOB_DETAILS-")]
     ]
@@ -172,10 +402,23 @@ def main():
         [sg.Text("Relevant Courses", size=(15, 1)),
          sg.Multiline("", size=(30, 4), key="-COURSES-")],
         [sg.Text("Other", size=(15, 1)), sg.Multiline("", size=(30, 4), key="-OTHER-")],
-        # three buttons: one to save profile, one to generate resume, and one for cover letter.
+        # buttons to save the profile and to generate a resume, a cover letter, or both
+        # from one model request
         [sg.Button("Save Profile", size=(15, 1)),
          sg.Button("Generate Resume", size=(15, 1)),
-         sg.Button("Generate Cover Letter", size=(15, 1))]
+         sg.Button("Generate Cover Letter", size=(15, 1)),
+         sg.Button("Generate Both", size=(15, 1))],
+        # a document generated before for the same job and profile comes from the cache
+        [sg.Checkbox("Ask the model again instead of using a cached answer", key="-REFRESH-")],
+        # job descriptions are compacted so a whole prompt fits in this many tokens
+        [sg.Text("Token Budget", size=(15, 1)),
+         sg.Input(str(compaction.PROMPT_TOKEN_BUDGET), key="-TOKEN_BUDGET-", size=(8, 1))],
+        # generations running in the background, with their progress
+        [sg.Text("Generations", size=(15, 1))],
+        [sg.Listbox([], size=(60, 4), key="-TASKS-", enable_events=True)],
+        [sg.Button("Cancel Generation", size=(15, 1))],
+        # the text of the selected (or latest) generation, as the model writes it
+        [sg.Multiline("", size=(60, 10), key="-PREVIEW-", disabled=True, autoscroll=True)]
     ]
 
     # create vertical separator for better user experience
@@ -184,6 +427,23 @@ def main():
     ]
 
     window = sg.Window("Job Finder", layout, finalize=True)
+    # resumes and cover letters are generated on worker threads, which report back
+    # through window events; tasks maps each task id to [label, status] and
+    # previews to the pieces of text it has streamed so far
+    generations = generation.Generations(window.write_event_value)
+    tasks = {}
+    previews = {}
+    preview_task = None
+    # scrolling past the end of the job list turns to the next page
+    for scroll_event in ("<MouseWheel>", "<Button-5>"):
+        window["-JOB_LIST-"].bind(scroll_event, "+SCROLL")
+
+    # show the current page of the pager in the job list
+    def show_page(rows):
+        window["-JOB_LIST-"].update(values=[f"{r[0]}: {r[1]}" for r in rows])
+        window["-PAGE-"].update(f"Page {pager.number + 1}")
+        pager.prefetch()
+    pager.prefetch()
 
     # loop to read events from the window
     while True:
@@ -191,41 +451,61 @@ def main():
         if event == sg.WINDOW_CLOSED:
             break
 
+        # as the user types in the search box, filter the job list to the best matches.
+        if event == "-SEARCH-":
+            if values["-SEARCH-"].strip():
+                results = search.search_jobs(values["-SEARCH-"], limit=SEARCH_LIMIT)
+                window["-JOB_LIST-"].update(values=[f"{r[0]}: {r[1]}" for r in results])
+            else:
+                show_page(pager.current())
+
+        # show only the jobs matching the filter controls.
+        if event == "Apply Filters":
+            try:
+                filters = read_filters(values)
+            except ValueError:
+                sg.popup("Min Salary must be a number and Posted Since a date (YYYY-MM-DD).")
+                continue
+            pager = JobPager(lambda after_id, limit, filters=filters:
+                             search.filter_jobs(filters, after_id=after_id, limit=limit))
+            show_page(pager.current())
+
+        # reset the filter controls and show every job again.
+        if event == "Clear Filters":
+            for key in ("-MIN_SALARY-", "-LOCATION-", "-POSTED_SINCE-", "-SEARCH-"):
+                window[key].update("")
+            window["-REMOTE-"].update(False)
+            window["-JOB_TYPE-"].update(ANY_JOB_TYPE)
+            pager = JobPager(get_jobs_page)
+            show_page(pager.current())
+
+        # page through the listing (search results are a single ranked list).
+        if event in ("Next", "Prev", "-JOB_LIST-+SCROLL") and not values["-SEARCH-"].strip():
+            if event == "Prev":
+                rows = pager.previous()
+            elif event == "Next" or scrolled_past_end(window):
+                rows = pager.next()
+            else:
+                rows = None
+            if rows is not None:
+                show_page(rows)
+
         # when a job is selected, update the job details display.
-        if event == "-JOB_LIST-":
-            selected = values["-JOB_LIST-"]
-            if selected:
-                job_id_str = selected[0].split(":")[0]
-                try:
-                    job_id = int(job_id_str)
-                    job = get_job_details(job_id)
-                    if job:
-                        # Use the helper function to format job details.
-                        details = format_job_details(job)
-                        window["-JOB_DETAILS-"].update(details)
-                    else:
-                        window["-JOB_DETAILS-"].update("Job details not found.")
-                except ValueError:
-                    window["-JOB_DETAILS-"].update("Invalid job selection.")
+        if event == "-JOB_LIST-" and values["-JOB_LIST-"]:
+            job, error = selected_job(values)
+            # Use the helper function to format job details.
+            window["-JOB_DETAILS-"].update(format_job_details(job) if job else error)
 
         # when a saved profile is selected, autofill the profile fields.
         if event == "-PROFILE_SELECT-":
             selected_profile = values["-PROFILE_SELECT-"]
             if selected_profile:
                 profile_id = int(selected_profile.split(":")[0])
-                profiles = get_user_profiles()
                 # get the latest profile
-                for p in profiles:
-                    if p[0] == profile_id:
-                        window["-FULL_NAME-"].update(p[1])
-                        window["-EMAIL-"].update(p[2])
-                        window["-PHONE-"].update(p[3])
-                        window["-GITHUB-"].update(p[4])
-                        window["-LINKEDIN-"].update(p[5])
-                        window["-PROJECTS-"].update(p[6])
-                        window["-COURSES-"].update(p[7])
-                        window["-OTHER-"].update(p[8])
-                        break
+                profile = next((p for p in get_user_profiles() if p[0] == profile_id), None)
+                if profile:
+                    for key, value in profile_values(profile).items():
+                        window[key].update(value)
 
         # when "Save Profile" is clicked, save the profile and update the dropdown.
         if event == "Save Profile":
@@ -248,106 +528,62 @@ def main():
                 profile_options = [f"{p[0]}: {p[1]}" for p in profiles]
                 window["-PROFILE_SELECT-"].update(values=profile_options)
 
-        # when "Generate Resume" is clicked, generate a resume using AI.
-        if event == "Generate Resume":
-            from main import setup_model, create_resume, save_resume, convert_text_to_pdf
+        # "Generate Resume" and "Generate Cover Letter" start a generation in the
+        # background; the window stays usable and the Generations list shows progress.
+        if event in GENERATE_BUTTONS:
             # Check if a job is selected
-            selected = values["-JOB_LIST-"]
-            if not selected:
-                sg.popup("Please select a job from the list.")
-                continue
-            job_id_str = selected[0].split(":")[0]
-            try:
-                job_id = int(job_id_str)
-            except ValueError:
-                sg.popup("Invalid job selection.")
-                continue
-
-            job = get_job_details(job_id)
+            job, error = selected_job(values)
             if not job:
-                sg.popup("Job details not found.")
+                sg.popup(error)
                 continue
 
-            # provide the AI with description from gui
-            job_description = job[3]
-            # combine profile inputs to from a personal description
-            personal_description = (
-                f"Full Name: {values['-FULL_NAME-']}\n"
-                f"Email: {values['-EMAIL-']}\n"
-                f"Phone: {values['-PHONE-']}\n"
-                f"GitHub: {values['-GITHUB-']}\n"
-                f"LinkedIn: {values['-LINKEDIN-']}\n"
-                f"Projects: {values['-PROJECTS-']}\n"
-                f"Relevant Courses: {values['-COURSES-']}\n"
-                f"Other Info: {values['-OTHER-']}"
-            )
-
             # check that required profile fields are filled.
+            kind = GENERATE_BUTTONS[event]
             if not values["-FULL_NAME-"] or not values["-EMAIL-"]:
-                sg.popup("Please fill in your Full Name and Email before generating a resume.")
-                continue
-
-            # call setup model
-            sg.popup("Generating resume, please wait...")
-            gemini_chat = setup_model()
-            resume = create_resume(gemini_chat, job_description, personal_description)
-            # save the resume as a Markdown file
-            md_filename = save_resume(resume)
-            # immediately convert the newly saved Markdown file to PDF
-            pdf_filename = convert_text_to_pdf(md_filename)
-            sg.popup(f"Resume generated and saved as: {md_filename}")
-            sg.popup(f"PDF version generated: {pdf_filename}")
-
-        # when "Generate Cover Letter" is clicked, generate a cover letter using AI.
-        if event == "Generate Cover Letter":
-            from main import (setup_model, create_cover_letter,
-                              save_cover_letter, convert_text_to_pdf)
-            selected = values["-JOB_LIST-"]
-            if not selected:
-                sg.popup("Please select a job from the list.")
+                sg.popup(f"Please fill in your Full Name and Email before generating a {kind}.")
                 continue
-            job_id_str = selected[0].split(":")[0]
             try:
-                job_id = int(job_id_str)
+                budget = read_token_budget(values)
             except ValueError:
-                sg.popup("Invalid job selection.")
-                continue
-
-            job = get_job_details(job_id)
-            if not job:
-                sg.popup("Job details not found.")
-                continue
-
-            job_description = job[3]
-            # combine profile inputs to form a personal description.
-            personal_description = (
-                f"Full Name: {values['-FULL_NAME-']}\n"
-                f"Email: {values['-EMAIL-']}\n"
-                f"Phone: {values['-PHONE-']}\n"
-                f"GitHub: {values['-GITHUB-']}\n"
-                f"LinkedIn: {values['-LINKEDIN-']}\n"
-                f"Projects: {values['-PROJECTS-']}\n"
-                f"Relevant Courses: {values['-COURSES-']}\n"
-                f"Other Info: {values['-OTHER-']}"
-            )
-
-            if not values["-FULL_NAME-"] or not values["-EMAIL-"]:
-                sg.popup("Please fill in your Full Name and Email before "
-                         "generating a cover letter.")
+                sg.popup("Token Budget must be a positive whole number.")
                 continue
-            # call setup model
-            sg.popup("Generating cover letter, please wait...")
-            gemini_chat = setup_model()
-            # generate a cover letter using the selected job description and user profile info.
-            cover_letter = create_cover_letter(gemini_chat, job_description, personal_description)
-            # immediately convert files and save
-            md_filename = save_cover_letter(cover_letter)
-            pdf_filename = convert_text_to_pdf(md_filename)
-            sg.popup(f"Cover letter generated and saved as: {md_filename}")
-            sg.popup(f"PDF version generated: {pdf_filename}")
 
+            # provide the AI with the job description, without the sections that would
+            # not fit the prompt's token budget, and the profile from the gui
+            # the files are recorded with the job and the saved profile picked, if any
+            personal = personal_description(values)
+            profile_id = (int(values["-PROFILE_SELECT-"].split(":")[0])
+                          if values["-PROFILE_SELECT-"] else None)
+            task_id = generations.start(
+                kind, compaction.fit_description(job[0], job[3], personal, budget), personal,
+                refresh=values["-REFRESH-"], stream=True, job_id=job[0], profile_id=profile_id)
+            tasks[task_id] = [f"{kind.capitalize()} for {job[1]}", generation.QUEUED]
+            previews[task_id] = []
+            preview_task = task_id
+            window["-TASKS-"].update(values=format_tasks(tasks))
+            window["-PREVIEW-"].update("")
+
+        # a background generation moved on: show its progress, or where it was saved.
+        if event == generation.GENERATION_EVENT:
+            show_generation_event(window, values[event], tasks, previews, preview_task,
+                                  generations.first_token)
+
+        # show the text of the generation selected in the Generations list.
+        if event == "-TASKS-" and values["-TASKS-"]:
+            preview_task = int(values["-TASKS-"][0].split(" ")[0].lstrip("#"))
+            window["-PREVIEW-"].update("".join(previews.get(preview_task, [])))
+
+        # cancel the generation selected in the Generations list.
+        if event == "Cancel Generation":
+            for line in values["-TASKS-"]:
+                task_id = int(line.split(" ")[0].lstrip("#"))
+                if task_id in generations.running():
+                    generations.cancel(task_id)
 
     window.close()
+    generations.shutdown()
+    response_cache.flush()
+    connections.close_all()
 
 if __name__ == "__main__":
     main()
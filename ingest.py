@@ -0,0 +1,170 @@
+"""
+ingest.py
+
+This module ingests many job feed shards at once. Shards are parsed and normalized
+(with the adapter detected from each shard's first record) in a pool of worker
+processes, and the normalized batches are sent back through a bounded queue to a
+single writer (this process) that owns the SQLite connection.
+
+Usage (from the project root):
+    python ingest.py feeds/                 # every *.json file in a directory
+    python ingest.py "feeds/2025-*.json" --workers 8
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import queue
+import time
+import connections
+import database
+import dedup
+
+# queue the worker processes send batches through, set by _init_worker
+_QUEUE = None
+
+# turn a directory or glob pattern into a sorted list of feed files
+def expand_sources(source):
+    """Return the JSON files in directory source, or the files matching glob pattern source."""
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.json")))
+    return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+
+def _init_worker(batch_queue):
+    """Give each worker process the shared batch queue."""
+    global _QUEUE  # pylint: disable=global-statement
+    _QUEUE = batch_queue
+
+# runs in a worker process: parse and normalize one shard, sending batches to the writer
+def _ingest_shard(task):
+    """Stream one shard onto the queue as ("rows", path, batch) messages."""
+    path, old_hash, force, batch_size = task
+    try:
+        content_hash = database.file_hash(path)
+        if not force and content_hash == old_hash:
+            _QUEUE.put(("done", path, content_hash, False))
+            return
+        adapter = None
+        batch = []
+        for job in database.iter_jobs(path):
+            if adapter is None:
+                adapter = database.detect_adapter(job)
+            batch.append(job)
+            if len(batch) >= batch_size:
+                _QUEUE.put(("rows", path, database.normalize_batch(batch, adapter)))
+                batch = []
+        if batch:
+            _QUEUE.put(("rows", path, database.normalize_batch(batch, adapter)))
+        _QUEUE.put(("done", path, content_hash, True))
+    except (OSError, ValueError) as e:  # JSONDecodeError is a ValueError
+        _QUEUE.put(("error", path, str(e)))
+
+# ingest many shards in parallel, writing everything through one connection
+def ingest_paths(paths, workers=None, force=False, batch_size=database.BATCH_SIZE):
+    """
+    Ingest the feed files in paths with a pool of worker processes.
+    Files whose manifest fingerprint is unchanged are skipped unless force is set.
+    Returns a dict with the number of files processed, skipped and failed,
+    rows written, and elapsed seconds.
+    """
+    start = time.perf_counter()
+    database.create_table()
+    conn = connections.writer(database.DB_NAME)
+    database.apply_pragmas(conn, database.LOAD_PRAGMAS)
+    stats = {"processed": 0, "skipped": 0, "errors": 0, "rows": 0}
+
+    # work out which shards need reading; a matching size and mtime skips a shard outright
+    tasks = []
+    stats_by_path = {}
+    for json_file in paths:
+        path = os.path.abspath(json_file)
+        stat = os.stat(path)
+        entry = database.get_manifest_entry(conn, path)
+        if not force and database.is_unchanged(entry, stat):
+            stats["skipped"] += 1
+            continue
+        stats_by_path[path] = stat
+        tasks.append((path, entry[2] if entry else None, force, batch_size))
+
+    try:
+        if tasks:
+            _run_pool(conn, tasks, min(workers or os.cpu_count() or 1, len(tasks)),
+                      stats_by_path, stats)
+    finally:
+        conn.rollback()  # only a failed batch is left uncommitted
+        database.apply_pragmas(conn, connections.WRITER_PRAGMAS)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+# start the worker pool and write its batches as they arrive
+def _run_pool(conn, tasks, workers, stats_by_path, stats):
+    """Run _ingest_shard over tasks in workers processes, writing through conn."""
+    # bounded, so workers block instead of piling batches up in memory
+    batch_queue = multiprocessing.Queue(maxsize=workers * 4)
+    with multiprocessing.Pool(workers, _init_worker, (batch_queue,)) as pool:
+        result = pool.map_async(_ingest_shard, tasks)
+        remaining = len(tasks)
+        while remaining:
+            try:
+                message = batch_queue.get(timeout=1)
+            except queue.Empty:
+                if result.ready():
+                    # re-raises a worker crash. otherwise every shard put its last
+                    # message before its task returned, so the rest are still on
+                    # their way through the queue: keep reading until they are in.
+                    result.get()
+                continue
+            remaining -= _write_message(conn, message, stats_by_path, stats)
+        result.wait()
+
+# the single writer: apply one message from a worker to the database
+def _write_message(conn, message, stats_by_path, stats):
+    """Write a batch or finish a shard; returns 1 when a shard is finished, else 0."""
+    kind, path = message[0], message[1]
+    if kind == "rows":
+        stats["rows"] += database.write_rows(conn, message[2])
+        conn.commit()
+        return 0
+    if kind == "error":
+        print(f"Error ingesting {path}: {message[2]}")
+        stats["errors"] += 1
+        return 1
+    stat = stats_by_path[path]
+    database.record_manifest(conn, path, stat.st_size, stat.st_mtime, message[2])
+    conn.commit()
+    stats["processed" if message[3] else "skipped"] += 1
+    return 1
+
+
+def main():
+    """Parse command line arguments and ingest the matching shards."""
+    parser = argparse.ArgumentParser(description="Ingest job feed shards in parallel.")
+    parser.add_argument("source", help="directory of .json shards or a glob pattern")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=database.BATCH_SIZE)
+    parser.add_argument("--force", action="store_true",
+                        help="ingest shards even if they have not changed")
+    parser.add_argument("--dedup-threshold", type=float, default=dedup.DEFAULT_THRESHOLD,
+                        help="description similarity (0-1) at which jobs are duplicates")
+    parser.add_argument("--boilerplate", type=int, default=0, metavar="N",
+                        help="list the N description paragraphs shared by the most jobs")
+    args = parser.parse_args()
+
+    paths = expand_sources(args.source)
+    if not paths:
+        print(f"No job files found for {args.source}")
+        return
+    stats = ingest_paths(paths, args.workers, args.force, args.batch_size)
+    print(f"{stats['processed']} processed, {stats['skipped']} skipped, "
+          f"{stats['errors']} failed, {stats['rows']} rows written "
+          f"in {stats['seconds']:.2f}s")
+    print(f"{dedup.update_clusters(args.dedup_threshold)} jobs checked for duplicates")
+    saved, shared = database.paragraph_report(args.boilerplate)
+    print(f"{saved:,} bytes of repeated description paragraphs stored once")
+    for uses, size, paragraph in shared:
+        print(f"  used {uses} times, {size:,} bytes: {paragraph[:70]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,178 +6,353 @@ based on a job description and personal description, saves them as Markdown file
 in a subfolder (markdown_files), and converts those Markdown files to PDF files
 in a separate subfolder (pdf_files). The AI is instructed to output only the
 resume/cover letter text, with no additional commentary or explanations.
+Saved documents are kept in the artifacts store, and their files are written
+when they are exported (see artifacts.py).
 """
+import argparse
+import io
 import os
-import google.generativeai as genai
-from fpdf import FPDF
+import re
+import artifacts
+import backends
 import database
+import dedup
 import gui
+import rendering
+import response_cache
+import sessions
 
 
+# the line between the resume and the cover letter in a combined answer
+DOCUMENT_SEPARATOR = "===COVER LETTER==="
+# where a combined answer may be split: at the separator, loosely written, or
+# failing that before a Markdown heading naming the cover letter (which is kept)
+SEPARATOR_PATTERNS = (
+    re.compile(r"^[ \t]*=+[ \t]*cover[ \t]+letter[ \t]*=+[ \t]*$", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"^(?=[ \t]*#{1,3}[ \t]*cover[ \t]+letter\b)", re.IGNORECASE | re.MULTILINE),
+)
+
 # subfolder names for Markdown and PDF files
 MARKDOWN_FOLDER = "markdown_files"
 PDF_FOLDER = "pdf_files"
 
-# setup code from the aistudio.google.com website
+# model configuration
+MODEL_NAME = "gemini-2.0-flash-exp"
+GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 8192,
+    "response_mime_type": "text/plain",
+}
+# modified system instructions to yield better prompting results.
+SYSTEM_INSTRUCTION = (
+    "You are to produce only the requested content (resume or cover letter) in Markdown, "
+    "with no additional commentary, analysis, or key improvements. Do not include anything "
+    "beyond the final text."
+)
+
+# the backend models come from; see backends.py (and use_backend for a stand-in)
+BACKEND = backends.GeminiBackend(MODEL_NAME, GENERATION_CONFIG, SYSTEM_INSTRUCTION)
+
+def build_model():
+    """Return a model from BACKEND (for Gemini, configured with the key in secrets.txt)."""
+    return BACKEND.build_model()
+
 def setup_model():
-    """Set up the generative AI model using an API key from secrets.txt."""
-    with open("secrets.txt", "r", encoding="utf-8") as file:
-        api_key = file.read().strip()
-        genai.configure(api_key=api_key)
-    # model configuration
-    generation_config = {
-        "temperature": 1,
-        "top_p": 0.95,
-        "top_k": 40,
-        "max_output_tokens": 8192,
-        "response_mime_type": "text/plain",
-    }
-
-    # modified system instructions to yield better prompting results.
-    model = genai.GenerativeModel(  # pylint: disable=no-member
-        model_name="gemini-2.0-flash-exp",
-        generation_config=generation_config,
-        system_instruction=(
-            "You are to produce only the requested content (resume or cover letter) in Markdown, "
-            "with no additional commentary, analysis, or key improvements. Do not include anything "
-            "beyond the final text."
-        ),
+    """Set up the generative AI model and return a new chat with it."""
+    return build_model().start_chat(history=[])
+
+def build_prefix_model(prefix):
+    """Return a model from BACKEND holding prefix in a context cache, or None if it cannot."""
+    if not hasattr(BACKEND, "prefix_model"):
+        return None
+    return BACKEND.prefix_model(prefix)
+
+def release_prefix_model(model):
+    """Let BACKEND delete the context cache of a model from build_prefix_model."""
+    if hasattr(BACKEND, "release_prefix_model"):
+        BACKEND.release_prefix_model(model)
+
+# chat sessions shared by every generation; the model is built once, on first use
+SESSIONS = sessions.SessionPool(build_model, make_prefix_model=build_prefix_model,
+                                release_prefix_model=release_prefix_model)
+
+def use_backend(backend):
+    """Make generations use backend (see backends.py), with a new pool of sessions on it."""
+    global BACKEND, SESSIONS  # pylint: disable=global-statement
+    BACKEND = backend
+    SESSIONS = sessions.SessionPool(build_model, make_prefix_model=build_prefix_model,
+                                    release_prefix_model=release_prefix_model)
+
+# send a prompt to a fresh chat, answering it from response_cache when asked to
+def send_prompt(gemini_chat, prompt, cache=False, refresh=False, on_chunk=None, prefix="",  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                before_request=None):
+    """
+    Send prefix + prompt to the model and return the answer's text; only prompt is
+    sent if gemini_chat already holds prefix (see sessions.py). With cache, an answer
+    to the same prompt and model setup is returned from response_cache if there is
+    one, and a new answer is stored there; refresh asks the model anyway and
+    replaces the cached answer. gemini_chat must have no history beyond the
+    prefix it holds, since the cache key does not cover it. With on_chunk, the
+    answer is streamed and on_chunk(text) is called with each piece as it
+    arrives (a cached answer is one piece). before_request() is called just before
+    the model is asked, so not for a cached answer (batch.py waits on its rate
+    limiter there).
+    """
+    key = cache and response_cache.prompt_key(prefix + prompt, BACKEND.model_name,
+                                              SYSTEM_INSTRUCTION, GENERATION_CONFIG)
+    if cache and not refresh:
+        text = response_cache.get(key)
+        if text is not None:
+            if on_chunk:
+                on_chunk(text)
+            return text
+    if getattr(gemini_chat, "prefix", "") != prefix:
+        prompt = prefix + prompt
+    if before_request:
+        before_request()
+    if on_chunk:
+        pieces = []
+        for chunk in gemini_chat.send_message(prompt, stream=True):
+            if chunk.parts:  # the last chunk may only carry the finish reason
+                pieces.append(chunk.text)
+                on_chunk(chunk.text)
+        text = "".join(pieces)
+    else:
+        text = gemini_chat.send_message(prompt).text
+    if cache:
+        response_cache.put(key, text, BACKEND.model_name)
+    return text
+
+# function profile_prefix returns the start every prompt for one profile shares, so a
+# session can hold it (see sessions.py) instead of it being sent again for every job
+def profile_prefix(personal_description):
+    """Return the part of every prompt that only depends on personal_description."""
+    return (
+        "You will write job application documents in markdown format for the person "
+        "described below, for the job in each request that follows.\n\n"
+        "Personal Description:\n"
+        f"{personal_description}\n\n"
     )
-    return model.start_chat(history=[])
 
 # function create_resume prompts the ai to create professional resume based on job
 # and personal_description
-def create_resume(gemini_chat, job_description, personal_description):
+def create_resume(gemini_chat, job_description, personal_description, cache=False,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                  refresh=False, on_chunk=None, before_request=None):
     """
     Prompt the AI to create a professional resume in markdown format.
     Instruct the model explicitly to output only the resume content,
     with no additional commentary or analysis.
+    cache, refresh, on_chunk and before_request are passed to send_prompt.
     """
     prompt = (
-        "Create a professional resume in markdown format based on the following info.\n\n"
+        "Create a professional resume in markdown format based on the personal "
+        "description and the following job.\n\n"
         "Do NOT include any commentary, key improvements, or "
         "explanations only the final resume text.\n\n"
         "Job Description:\n"
         f"{job_description}\n\n"
-        "Personal Description:\n"
-        f"{personal_description}\n\n"
         "Format the resume to highlight relevant skills and experience. "
         "Include sections for summary, skills, experience, and education.\n"
         "Do not add any extra text or commentary beyond the resume itself."
     )
-    response = gemini_chat.send_message(prompt)
-    return response.text
+    return send_prompt(gemini_chat, prompt, cache, refresh, on_chunk,
+                       profile_prefix(personal_description), before_request)
 
-# save_resume function saves resume, sets the filename and renames newer versions
-# to prevent overwriting resumes
-# it saves files to subfolders depending on the extension for organization
-def save_resume(resume):
+# helper function: a new Markdown file name for base_name, numbered by the artifacts
+# table (markdown_files/0000/resume-17.md) so it never overwrites an older one
+def next_markdown_path(base_name, source=None):
     """
-    Save the generated resume to a Markdown file in MARKDOWN_FOLDER,
-    and return the path to that file.
+    Return the path in MARKDOWN_FOLDER the next base_name document is saved to, and
+    record it in the artifacts table with source (see artifacts.allocate).
     """
-    os.makedirs(MARKDOWN_FOLDER, exist_ok=True)
-    base_name = "resume"
-    extension = ".md"
-    filename = os.path.join(MARKDOWN_FOLDER, base_name + extension)
+    return artifacts.allocate(MARKDOWN_FOLDER, base_name, ".md", source)
 
-    counter = 1
-    while os.path.exists(filename):
-        filename = os.path.join(MARKDOWN_FOLDER, f"{base_name}{counter}{extension}")
-        counter += 1
+# create the Markdown file a streamed document is written to as it arrives
+def open_markdown(base_name, source=None):
+    """
+    Create the file save_resume (base_name "resume") or save_cover_letter
+    ("cover_letter") would save to next, and return (path, file open for writing).
+    Unless artifacts.EXPORT_ON_SAVE is set, the file is an in-memory one and the
+    caller stores what was written with store_markdown.
+    """
+    filename = next_markdown_path(base_name, source)
+    if not artifacts.EXPORT_ON_SAVE:
+        return filename, io.StringIO()
+    file = open(filename, "x", encoding="utf-8", newline="\n")  # pylint: disable=consider-using-with
+    return filename, file
 
-    with open(filename, "w", encoding="utf-8", newline="\n") as file:
-        normalized_text = resume.replace("\r\n", "\n").replace("\r", "\n")
-        file.write(normalized_text)
+# store a saved document's text in the artifacts store, and write its file if
+# documents are exported as they are saved
+def store_markdown(filename, text, write=True):
+    """
+    Store text (line endings normalized) as the content of the Markdown file
+    recorded at filename, and write the file if artifacts.EXPORT_ON_SAVE is set
+    and write (a streamed file is written already). Returns filename.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    artifacts.attach(filename, text.encode("utf-8"))
+    if write and artifacts.EXPORT_ON_SAVE:
+        with open(filename, "x", encoding="utf-8", newline="\n") as file:
+            file.write(text)
     return filename
 
+# save_resume function saves resume under a new numbered filename, to prevent
+# overwriting resumes
+# it saves files to subfolders depending on the extension for organization
+def save_resume(resume, source=None):
+    """
+    Save the generated resume as a Markdown file in MARKDOWN_FOLDER (see
+    store_markdown), and return the path to that file. source (the job id,
+    profile id and prompt hash) is recorded with it in the artifacts table.
+    """
+    return store_markdown(next_markdown_path("resume", source), resume)
+
 # function create_cover_letter prompts the ai to create a professional cover letter based on job
 # and personal_description
-def create_cover_letter(gemini_chat, job_description, personal_description):
+def create_cover_letter(gemini_chat, job_description, personal_description, cache=False,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                        refresh=False, on_chunk=None, before_request=None):
     """
     Prompt the AI to create a professional cover letter in Markdown format.
     Instruct the model explicitly to output only the cover letter text,
     with no additional commentary or analysis.
+    cache, refresh, on_chunk and before_request are passed to send_prompt.
     """
     prompt = (
-        "Create a professional cover letter in markdown format based on the following info.\n\n"
+        "Create a professional cover letter in markdown format based on the personal "
+        "description and the following job.\n\n"
         "Do NOT include any commentary, key improvements, or explanations "
         "only the final cover letter text.\n\n"
         "Job Description:\n"
         f"{job_description}\n\n"
-        "Personal Information:\n"
-        f"{personal_description}\n\n"
         "Explain why you are an ideal candidate for this role and highlight your key "
         "qualifications.\n"
         "Do not add any extra text or commentary beyond the cover letter itself."
     )
-    response = gemini_chat.send_message(prompt)
-    return response.text
+    return send_prompt(gemini_chat, prompt, cache, refresh, on_chunk,
+                       profile_prefix(personal_description), before_request)
 
-# save_cover_letter function saves cover letter, sets the filename and renames newer versions
-# to prevent overwriting cover letters
-# it saves files to subfolders depending on the extension for organization
-def save_cover_letter(cover_letter):
+# function create_resume_and_cover_letter prompts the ai for both documents at once, so
+# the job and personal descriptions are sent (and paid for) once instead of twice
+def create_resume_and_cover_letter(gemini_chat, job_description, personal_description,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                                   cache=False, refresh=False, on_chunk=None,
+                                   before_request=None):
     """
-    Save the generated cover letter to a Markdown file in MARKDOWN_FOLDER,
-    and return the path to that file.
+    Prompt the AI for a resume and a cover letter in one answer, separated by a
+    DOCUMENT_SEPARATOR line, and return (resume, cover letter). An answer that
+    cannot be split is asked for once more (replacing it in the cache); if that
+    cannot be split either, ValueError is raised.
+    cache, refresh, on_chunk and before_request are passed to send_prompt.
     """
-    os.makedirs(MARKDOWN_FOLDER, exist_ok=True)
-    base_name = "cover_letter"
-    extension = ".md"
-    filename = os.path.join(MARKDOWN_FOLDER, base_name + extension)
+    prompt = (
+        "Create a professional resume and a professional cover letter in markdown format "
+        "based on the personal description and the following job.\n\n"
+        "Do NOT include any commentary, key improvements, or explanations "
+        "only the final resume and cover letter text.\n\n"
+        "Job Description:\n"
+        f"{job_description}\n\n"
+        "First write the resume. Format it to highlight relevant skills and experience, "
+        "with sections for summary, skills, experience, and education.\n"
+        "Then write a line containing only\n"
+        f"{DOCUMENT_SEPARATOR}\n"
+        "and after it the cover letter. Explain why you are an ideal candidate for this "
+        "role and highlight your key qualifications.\n"
+        "Do not add any extra text or commentary beyond the resume and the cover letter."
+    )
+    prefix, history = profile_prefix(personal_description), list(gemini_chat.history)
+    try:
+        return split_documents(send_prompt(gemini_chat, prompt, cache, refresh, on_chunk, prefix,
+                                           before_request))
+    except ValueError:
+        gemini_chat.history = history
+        return split_documents(send_prompt(gemini_chat, prompt, cache, True, on_chunk, prefix,
+                                           before_request))
 
-    counter = 1
-    while os.path.exists(filename):
-        filename = os.path.join(MARKDOWN_FOLDER, f"{base_name}{counter}{extension}")
-        counter += 1
+# helper function: split a combined answer at its separator line
+def split_documents(text):
+    """
+    Return (resume, cover letter) from the text of a combined answer. Raises
+    ValueError if there is no separator, or either part is empty.
+    """
+    for pattern in SEPARATOR_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            resume, cover_letter = text[:match.start()].strip(), text[match.end():].strip()
+            if resume and cover_letter:
+                return resume + "\n", cover_letter + "\n"
+    raise ValueError("The answer could not be split into a resume and a cover letter")
 
-    with open(filename, "w", encoding="utf-8", newline="\n") as file:
-        normalized_text = cover_letter.replace("\r\n", "\n").replace("\r", "\n")
-        file.write(normalized_text)
-    return filename
+# save_cover_letter function saves cover letter under a new numbered filename, to
+# prevent overwriting cover letters
+# it saves files to subfolders depending on the extension for organization
+def save_cover_letter(cover_letter, source=None):
+    """
+    Save the generated cover letter as a Markdown file in MARKDOWN_FOLDER (see
+    store_markdown), and return the path to that file. source (the job id,
+    profile id and prompt hash) is recorded with it in the artifacts table.
+    """
+    return store_markdown(next_markdown_path("cover_letter", source), cover_letter)
 
 # function to convert markdown files to pdf, saves to pdf subfolder
-def convert_text_to_pdf(text_filepath):
-    """
-    Convert the given Markdown file to a PDF file using the FPDF module.
-    The PDF file is saved in the PDF_FOLDER subfolder.
-    Before writing, replace problematic Unicode characters with ASCII equivalents.
-    """
-    os.makedirs(PDF_FOLDER, exist_ok=True)
-    base_name = os.path.splitext(os.path.basename(text_filepath))[0]
-    pdf_filename = os.path.join(PDF_FOLDER, base_name + ".pdf")
-    counter = 1
-    while os.path.exists(pdf_filename):
-        pdf_filename = os.path.join(PDF_FOLDER, f"{base_name}{counter}.pdf")
-        counter += 1
-
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    with open(text_filepath, "r", encoding="utf-8") as f:
-        content = f.read()
-    # replace problematic Unicode characters
-    content = content.replace("\u2013", "-")
-    content = content.replace("\u2019", "'")
-
-    pdf.multi_cell(0, 10, content)
-    pdf.output(pdf_filename)
+def convert_text_to_pdf(text_filepath, text=None):
+    """
+    Render the given Markdown file to a PDF file (see render_pdf).
+    The PDF file is saved in the PDF_FOLDER subfolder, under the name and shard
+    folder of a Markdown file saved by this module (converting it again replaces
+    it), and recorded in the artifacts table with the same source and content.
+    A stored Markdown file's PDF is only rendered if artifacts.EXPORT_ON_SAVE is
+    set; otherwise artifacts.export renders it when it is asked for.
+    text, if given, is the Markdown file's text, so it is not read back.
+    """
+    found = artifacts.lookup(text_filepath)
+    content = artifacts.content_hash(text_filepath) if found else None
+    if found:
+        pdf_filename = os.path.join(PDF_FOLDER, os.path.splitext(
+            os.path.relpath(text_filepath, MARKDOWN_FOLDER))[0] + ".pdf")
+        artifacts.record(pdf_filename, *found, content=content)
+    else:
+        base_name = os.path.splitext(os.path.basename(text_filepath))[0]
+        pdf_filename = artifacts.allocate(PDF_FOLDER, base_name, ".pdf")
+    if content is not None and not artifacts.EXPORT_ON_SAVE:
+        return pdf_filename
+
+    if text is None and content is not None:
+        text = artifacts.read(text_filepath).decode("utf-8")
+    elif text is None:
+        with open(text_filepath, "r", encoding="utf-8") as f:
+            text = f.read()
+    render_pdf(text, pdf_filename)
     return pdf_filename
 
+# function to render markdown text to a pdf file
+def render_pdf(content, pdf_filename):
+    """
+    Render Markdown text to a PDF file at pdf_filename: headings, bullets and bold
+    text are laid out as such, and characters the PDF fonts lack are replaced
+    (see rendering.py).
+    """
+    with open(pdf_filename, "wb") as file:
+        file.write(rendering.render(content))
+
 
-def output():
+def output(force_reingest=False, dedup_threshold=dedup.DEFAULT_THRESHOLD):
     """
-    Main function that calls create database and gui with AI setup functionality.
-    After the GUI interaction, it converts all generated resume and cover letter Markdown files
-    in MARKDOWN_FOLDER to PDF files in PDF_FOLDER.
+    Main function that creates the database, brings it up to date with the job
+    files and runs the GUI, where documents are generated and saved (see
+    artifacts.py). Only job files that changed since the last run are ingested,
+    unless force_reingest is set: the ingest manifest is then cleared, so every
+    job file is read and upserted again (jobs keep their ids).
+    New and changed jobs are then grouped with their near-duplicates (see dedup.py);
+    dedup_threshold is the description similarity (0-1) at which two jobs are
+    duplicates, and changing it reclusters every job.
     """
     try:
         database.create_table()
-        database.save_job_data("job-data.json")
-        database.save_job_data2("job-data2.json")
+        if force_reingest:
+            database.clear_manifest()
+        database.sync_job_data()
+        dedup.update_clusters(dedup_threshold)
         gui.main()
 
     except Exception as e:  # pylint: disable=broad-exception-caught
@@ -185,4 +360,10 @@ def output():
         print("please make sure your secrets.txt file contains a valid API key and try again.")
 
 if __name__ == "__main__":
-    output()
+    parser = argparse.ArgumentParser(description="AI resume and cover letter generator")
+    parser.add_argument("--force-reingest", action="store_true",
+                        help="read every job file again, even unchanged ones")
+    parser.add_argument("--dedup-threshold", type=float, default=dedup.DEFAULT_THRESHOLD,
+                        help="description similarity (0-1) at which jobs are duplicates")
+    args = parser.parse_args()
+    output(force_reingest=args.force_reingest, dedup_threshold=args.dedup_threshold)
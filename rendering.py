@@ -0,0 +1,309 @@
+"""
+rendering.py
+
+This module renders a generated document's Markdown to PDF in memory. The text
+is parsed once into blocks (headings, bullets, numbered items, paragraph lines
+and rules), each a list of plain, bold and italic spans, and laid out with
+FPDF's core fonts: headings are larger and bold, list items are indented with
+their marker, and the Markdown markup itself is not printed.
+
+Lines are broken with each font's character widths, which are read once per
+process into a table: a span is measured in one pass over that table, and its
+line breaks are found by bisection rather than word by word. Page, font and
+spacing settings live in the STYLES table.
+
+The core fonts only cover the WinAnsi (cp1252) characters. UNICODE_REPLACEMENTS
+says what every other character is printed as (curly quotes, dashes and
+bullets keep their cp1252 glyphs, arrows become "->", and so on); characters it
+does not list are decomposed to their base letter, or else printed as "?".
+"""
+import bisect
+import collections
+import itertools
+import re
+import unicodedata
+from fpdf import FPDF
+
+FONT_FAMILY = "Arial"
+# page margins and the bottom margin that starts a new page, in mm
+MARGIN = 15
+# (size in points, font style, space above in mm, space below in mm) of each kind of line
+STYLES = {
+    1: (18, "B", 2, 2),
+    2: (14, "B", 4, 1.5),
+    3: (12, "B", 3, 1),
+    "text": (11, "", 0, 0),
+}
+# headings below level 3 look like level 3
+MAX_HEADING_LEVEL = 3
+# line height as a multiple of the font size
+LINE_SPACING = 1.35
+# mm a list item is indented by per nesting level, and from its marker to its text
+INDENT = 5
+# mm of space a blank line leaves
+BLANK_LINE = 2.5
+# gray (0-255) of the rule under level 1 and 2 headings and of "---" lines
+RULE_GRAY = 160
+
+# what characters the core fonts cannot print are printed as; the cp1252
+# characters (curly quotes, dashes, bullet, ellipsis, euro sign, ...) are mapped
+# to the bytes the fonts print them from
+UNICODE_REPLACEMENTS = {
+    # hyphens, figure dash, horizontal bar, minus sign
+    "\u2010": "-", "\u2011": "-", "\u2012": "-", "\u2015": "\x97", "\u2212": "-",
+    # primes and reversed quotes
+    "\u2032": "'", "\u2033": '"', "\u201b": "'", "\u201f": '"',
+    # bullets
+    "\u25cf": "\x95", "\u25aa": "\x95", "\u25a0": "\x95", "\u2023": "\x95", "\u2219": "\x95",
+    "\u25e6": "o", "\u2043": "-",
+    # arrows and comparisons
+    "\u2192": "->", "\u2190": "<-", "\u2194": "<->", "\u21d2": "=>",
+    "\u2264": "<=", "\u2265": ">=", "\u2260": "!=", "\u2248": "~",
+    # letters without a decomposition to a Latin-1 letter
+    "\u0141": "L", "\u0142": "l", "\u0110": "D", "\u0111": "d", "\u0131": "i",
+    # check marks, crosses and stars
+    "\u2713": "v", "\u2714": "v", "\u2717": "x", "\u2718": "x", "\u2605": "*", "\u2606": "*",
+    # spaces of other widths, and characters that print nothing
+    "\u2002": " ", "\u2003": " ", "\u2009": " ", "\u202f": " ", "\u3000": " ",
+    "\u200b": "", "\u200c": "", "\u200d": "", "\u2060": "", "\ufeff": "", "\ufe0f": "",
+    "\t": "    ",
+}
+# bytes 0x81, 0x8d, 0x8f, 0x90 and 0x9d have no cp1252 character
+UNICODE_REPLACEMENTS.update({bytes([byte]).decode("cp1252"): chr(byte)
+                             for byte in range(0x80, 0xa0)
+                             if byte not in (0x81, 0x8d, 0x8f, 0x90, 0x9d)})
+
+# a parsed line: kind is "heading", "item", "text", "rule" or "blank"; level is the
+# heading level or the item's nesting depth; marker is an item's bullet or number;
+# spans is a list of (text, font style)
+Block = collections.namedtuple("Block", "kind level marker spans")
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+ITEM = re.compile(r"^(\s*)([-*+]|\d{1,3}[.)])\s+(.*)$")
+RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+# backslash escapes, bold italic (***), bold (**, __), italic (*, _), code and
+# links; _ only marks whole words, so snake_case is kept. The lookahead lets a
+# search skip the characters no markup starts with.
+INLINE = re.compile(r"(?=[\\*_`\[])(?:\\(?P<escaped>[\\`*_{}\[\]()#+\-.!|])"
+                    r"|\*\*\*(?P<bi>.+?)\*\*\*|\*\*(?P<b1>.+?)\*\*|(?<!\w)__(?P<b2>.+?)__(?!\w)"
+                    r"|\*(?P<i1>[^\s*](?:.*?[^\s*])?)\*|(?<!\w)_(?P<i2>[^\s_](?:.*?[^\s_])?)_(?!\w)"
+                    r"|`(?P<code>[^`]+)`|\[(?P<link>[^\]]+)\]\([^)]*\))")
+# a line without any of these has no inline markup
+MARKUP = re.compile(r"[*_`\[\\]")
+BULLET = "\x95"
+
+class _Table(dict):
+    """UNICODE_REPLACEMENTS for str.translate, filling in characters as they are met."""
+
+    def __missing__(self, code):
+        if code < 0x80 or 0xa0 <= code < 0x100:
+            self[code] = code
+        else:
+            decomposed = "".join(char for char in unicodedata.normalize("NFKD", chr(code))
+                                 if not unicodedata.combining(char))
+            if decomposed and all(ord(char) < 0x80 or 0xa0 <= ord(char) < 0x100
+                                  for char in decomposed):
+                self[code] = decomposed
+            else:
+                self[code] = "?"
+        return self[code]
+
+_TABLE = _Table({ord(char): text for char, text in UNICODE_REPLACEMENTS.items()})
+# the characters normalize replaces: all but printable Latin-1 and line breaks
+UNPRINTABLE = re.compile(r"[^\n\r\x20-\x7e\xa0-\xff]+")
+
+def normalize(text):
+    """Return text with every character the core fonts cannot print replaced."""
+    return UNPRINTABLE.sub(lambda match: match.group().translate(_TABLE), text)
+
+def parse_inline(text, style=""):
+    """Split a line of Markdown into (text, font style) spans, dropping the markup."""
+    if not MARKUP.search(text):
+        return [(text, style)] if text else []
+    spans, position = [], 0
+    for match in INLINE.finditer(text):
+        if match.start() > position:
+            spans.append((text[position:match.start()], style))
+        name = match.lastgroup
+        inner = match.group(name)
+        if name == "bi":
+            spans.extend(parse_inline(inner, "BI"))
+        elif name in ("b1", "b2"):
+            # FPDF names bold italic "BI"
+            spans.extend(parse_inline(inner, "".join(sorted(set(style + "B")))))
+        elif name in ("i1", "i2"):
+            spans.extend(parse_inline(inner, "".join(sorted(set(style + "I")))))
+        else:
+            spans.append((inner, style))
+        position = match.end()
+    if position < len(text):
+        spans.append((text[position:], style))
+    # join neighbours of the same style (an escaped character and the text around it)
+    joined = []
+    for part, part_style in spans:
+        if joined and joined[-1][1] == part_style:
+            joined[-1] = (joined[-1][0] + part, part_style)
+        elif part:
+            joined.append((part, part_style))
+    return joined
+
+def parse(markdown):
+    """Parse Markdown text into a list of Blocks, one per line."""
+    blocks = []
+    for line in normalize(markdown.replace("\r\n", "\n").replace("\r", "\n")).split("\n"):
+        heading, item = HEADING.match(line), ITEM.match(line)
+        if not line.strip():
+            blocks.append(Block("blank", 0, "", []))
+        elif heading:
+            level = min(len(heading.group(1)), MAX_HEADING_LEVEL)
+            blocks.append(Block("heading", level, "",
+                                parse_inline(heading.group(2), STYLES[level][1])))
+        elif RULE.match(line):
+            blocks.append(Block("rule", 0, "", []))
+        elif item:
+            marker = item.group(2)
+            blocks.append(Block("item", len(item.group(1)) // 2,
+                                BULLET if marker in "-*+" else marker,
+                                parse_inline(item.group(3))))
+        else:
+            blocks.append(Block("text", 0, "", parse_inline(line.strip())))
+    return blocks
+
+# font style -> the widths of the 256 characters of a core font style, in 1/1000
+# of the font size; filled on first use
+_WIDTHS = {}
+
+# helper function: the character widths of style, reading them from pdf the first time
+def _widths(pdf, style):
+    widths = _WIDTHS.get(style)
+    if widths is None:
+        pdf.set_font(FONT_FAMILY, style)
+        font_widths = pdf.current_font["cw"]
+        widths = _WIDTHS[style] = [font_widths.get(chr(code), 0) for code in range(256)]
+    return widths
+
+# helper function: break spans into lines no wider than width mm at size points;
+# each line is a list of (text, style, width in mm) runs. A span is measured once,
+# into the widths of all its starts, and each line break is found in those by
+# bisection: at the last space that fits, or inside a word wider than a line.
+def _lines(pdf, spans, width, size):  # pylint: disable=too-many-locals
+    scale = size / 1000 / pdf.k
+    limit = width / scale
+    lines, line, used = [], [], 0
+    for text, style in spans:
+        ends = list(itertools.accumulate(map(_widths(pdf, style).__getitem__,
+                                             text.encode("latin-1")), initial=0))
+        start, length = 0, len(text)
+        while True:
+            if not line:
+                while start < length and text[start] == " ":
+                    start += 1
+            if start >= length:
+                break
+            # text[start:end] is the longest piece that fits after what is on the line
+            end = bisect.bisect_right(ends, ends[start] + limit - used, start) - 1
+            if end >= length:
+                line.append((text[start:], style, (ends[length] - ends[start]) * scale))
+                used += ends[length] - ends[start]
+                break
+            space = text.rfind(" ", start, end + 1)
+            if space >= start:
+                if space > start:
+                    line.append((text[start:space], style, (ends[space] - ends[start]) * scale))
+                start = space + 1
+            elif not line:
+                end = max(end, start + 1)
+                line.append((text[start:end], style, (ends[end] - ends[start]) * scale))
+                start = end
+            lines.append(line)
+            line, used = [], 0
+    if line:
+        lines.append(line)
+    return lines or [[]]
+
+class _Document(FPDF):
+    """
+    An FPDF document that writes a line of runs in several styles as one text
+    object, selecting each font with an operator kept from its first use.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # (style, size) -> the operator selecting that font, once it is in the document
+        self.font_operators = {}
+
+    def write_runs(self, x, baseline, runs, size):
+        """Write runs of (text, style, width) one after another from x on baseline."""
+        parts = [f"BT {x * self.k:.2f} {(self.h - baseline) * self.k:.2f} Td"]
+        for text, style, _ in runs:
+            operator = self.font_operators.get((style, size))
+            if operator is None:
+                self.set_font(FONT_FAMILY, style, size)
+                operator = self.font_operators[style, size] = \
+                    f"/F{self.current_font['i']} {size:.2f} Tf"
+            escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            parts.append(f"{operator} ({escaped}) Tj")
+        parts.append("ET")
+        self._out(" ".join(parts))
+
+# helper function: write the lines of one block, each starting at x, starting a
+# new page when a line does not fit; marker (a list item's) is written before
+# the first line, at marker_x
+def _write_lines(pdf, lines, size, x, marker="", marker_x=0):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    height = size * LINE_SPACING / pdf.k
+    for number, line in enumerate(lines):
+        if pdf.y + height > pdf.page_break_trigger:
+            pdf.add_page()
+        # where cell would put the text's baseline
+        baseline = pdf.y + 0.5 * height + 0.3 * size / pdf.k
+        if marker and number == 0:
+            pdf.write_runs(marker_x, baseline, [(marker, "", 0)], size)
+        if line:
+            pdf.write_runs(x, baseline, line, size)
+        pdf.y += height
+
+# helper function: draw a horizontal rule across the text width at the current line
+def _rule(pdf):
+    pdf.set_draw_color(RULE_GRAY)
+    pdf.line(pdf.l_margin, pdf.get_y(), pdf.w - pdf.r_margin, pdf.get_y())
+    pdf.set_draw_color(0)
+
+# helper function: write a list item, its marker indented by its level and its
+# text (every line of it) after the marker
+def _item(pdf, block, size):
+    pdf.set_font(FONT_FAMILY, "", size)
+    marker_x = pdf.l_margin + block.level * INDENT
+    text_x = marker_x + INDENT + (pdf.get_string_width(block.marker)
+                                  if block.marker != BULLET else 0)
+    _write_lines(pdf, _lines(pdf, block.spans, pdf.w - pdf.r_margin - text_x, size), size,
+                 text_x, block.marker, marker_x)
+
+def layout(blocks):
+    """Lay blocks out on the pages of a new FPDF document and return it."""
+    pdf = _Document()
+    pdf.set_margins(MARGIN, MARGIN)
+    pdf.set_auto_page_break(auto=True, margin=MARGIN)
+    pdf.add_page()
+    pdf.set_font(FONT_FAMILY, "", STYLES["text"][0])
+    left, width = pdf.l_margin, pdf.w - pdf.l_margin - pdf.r_margin
+    for block in blocks:
+        size, _, above, below = STYLES.get(block.level if block.kind == "heading" else "text")
+        if block.kind == "blank":
+            pdf.ln(BLANK_LINE)
+        elif block.kind == "rule":
+            pdf.ln(BLANK_LINE)
+            _rule(pdf)
+            pdf.ln(BLANK_LINE)
+        elif block.kind == "item":
+            _item(pdf, block, size)
+        else:
+            pdf.ln(above)
+            _write_lines(pdf, _lines(pdf, block.spans, width, size), size, left)
+            if block.kind == "heading" and block.level <= 2:
+                _rule(pdf)
+            pdf.ln(below)
+    return pdf
+
+def render(markdown):
+    """Render Markdown text to PDF and return the PDF file's bytes."""
+    return layout(parse(markdown)).output(dest="S").encode("latin-1")
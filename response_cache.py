@@ -0,0 +1,170 @@
+"""
+response_cache.py
+
+This module caches the model's answers, so generating the same document for the
+same job and profile again (while adjusting a profile, say) takes milliseconds
+instead of a model round-trip. Answers are stored in the llm_responses table,
+keyed on a hash of everything that decides them: the prompt, the model name,
+the system instruction and the generation config.
+
+The cache is kept under MAX_BYTES by evicting the least recently used answers,
+and answers older than MAX_AGE_DAYS are neither served nor kept. Hits, misses
+and evictions are counted in llm_cache_stats, next to the running size of the
+cached answers. Lookups only read: when each answer was last used, and the
+counters, are kept in memory and written TOUCH_BATCH_SIZE lookups at a time (or
+with the next put, stats or flush, which also runs at exit), so reading the cache
+does not queue on the shared writer.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import connections
+import database
+
+# total size of the cached answers (UTF-8 bytes) before the least recently used go
+MAX_BYTES = 50 * 1024 * 1024
+# answers older than this are treated as missing and evicted
+MAX_AGE_DAYS = 30
+# counters kept in llm_cache_stats; "bytes" there is the size of the cached answers
+COUNTERS = ("hits", "misses", "evictions")
+# lookups recorded in memory before they are written to the database together
+TOUCH_BATCH_SIZE = 100
+
+# lookups not written yet: database path -> ({key: (last used, hits)}, {counter: amount})
+_PENDING = {}
+_PENDING_LOCK = threading.Lock()
+
+# helper function: add to one of the COUNTERS (the caller commits)
+def _count(conn, name, amount=1):
+    conn.execute(
+        """
+        INSERT INTO llm_cache_stats (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """,
+        (name, amount),
+    )
+
+def prompt_key(prompt, model_name, system_instruction, generation_config):
+    """Return the cache key of a prompt sent to a model set up with the other arguments."""
+    payload = json.dumps([prompt, model_name, system_instruction, generation_config],
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# helper function: write the lookups recorded in memory for the database at path
+# (database.DB_NAME by default; the caller commits)
+def _write_pending(conn, path=None):
+    with _PENDING_LOCK:
+        touches, counts = _PENDING.pop(os.path.abspath(path or database.DB_NAME), ({}, {}))
+    conn.executemany(
+        "UPDATE llm_responses SET last_used = max(last_used, ?), hits = hits + ? WHERE key = ?",
+        [(last_used, hits, key) for key, (last_used, hits) in touches.items()],
+    )
+    for name, amount in counts.items():
+        _count(conn, name, amount)
+
+def get(key, now=None):
+    """Return the cached answer for key, or None if there is none (or it is too old)."""
+    now = time.time() if now is None else now
+    row = connections.reader(database.DB_NAME).execute(
+        "SELECT response FROM llm_responses WHERE key = ? AND created_at >= ?",
+        (key, now - MAX_AGE_DAYS * 86400),
+    ).fetchone()
+    with _PENDING_LOCK:
+        touches, counts = _PENDING.setdefault(os.path.abspath(database.DB_NAME), ({}, {}))
+        if row:
+            last_used, hits = touches.get(key, (now, 0))
+            touches[key] = (max(now, last_used), hits + 1)
+        name = "hits" if row else "misses"
+        counts[name] = counts.get(name, 0) + 1
+        full = sum(counts.values()) >= TOUCH_BATCH_SIZE
+    if full:
+        conn = connections.writer(database.DB_NAME)
+        with conn:
+            _write_pending(conn)
+    return row[0] if row else None
+
+def put(key, response, model_name=None, now=None):
+    """Cache response under key, replacing any earlier answer, then evict what no longer fits."""
+    now = time.time() if now is None else now
+    size = len(response.encode("utf-8"))
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        _write_pending(conn)
+        replaced = conn.execute("SELECT size FROM llm_responses WHERE key = ?",
+                                (key,)).fetchone()
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO llm_responses
+                (key, model_name, response, size, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (key, model_name, response, size, now, now),
+        )
+        _count(conn, "bytes", size - (replaced[0] if replaced else 0))
+        evict(conn, now)
+
+def evict(conn, now=None):
+    """
+    Delete answers older than MAX_AGE_DAYS, then the least recently used ones until
+    the rest fit in MAX_BYTES. Returns the number deleted (the caller commits).
+    """
+    now = time.time() if now is None else now
+    freed = [size for (size,) in conn.execute(
+        "DELETE FROM llm_responses WHERE created_at < ? RETURNING size",
+        (now - MAX_AGE_DAYS * 86400,)).fetchall()]
+    # drop the least recently used answers until the rest fit in MAX_BYTES
+    row = conn.execute("SELECT value FROM llm_cache_stats WHERE name = 'bytes'").fetchone()
+    excess = (row[0] if row else 0) - sum(freed) - MAX_BYTES
+    if excess > 0:
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM llm_responses ORDER BY last_used"):
+            victims.append((key,))
+            freed.append(size)
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM llm_responses WHERE key = ?", victims)
+    if freed:
+        _count(conn, "evictions", len(freed))
+        _count(conn, "bytes", -sum(freed))
+    return len(freed)
+
+def stats():
+    """Return a dict of the number of cached answers, their bytes and the COUNTERS."""
+    conn = connections.writer(database.DB_NAME)
+    with conn:
+        _write_pending(conn)
+    entries, = conn.execute("SELECT count(*) FROM llm_responses").fetchone()
+    counters = dict.fromkeys(COUNTERS + ("bytes",), 0)
+    counters.update(conn.execute("SELECT name, value FROM llm_cache_stats").fetchall())
+    return {"entries": entries, **counters}
+
+@atexit.register
+def flush():
+    """
+    Write the lookups recorded in memory, for every database they were made on.
+    Runs at exit, so hits and last-used times are kept however short the run;
+    those of a database file that has since been deleted are dropped.
+    """
+    with _PENDING_LOCK:
+        paths = list(_PENDING)
+    for path in paths:
+        if not os.path.exists(path):
+            with _PENDING_LOCK:
+                _PENDING.pop(path, None)
+            continue
+        conn = connections.writer(path)
+        with conn:
+            _write_pending(conn, path)
+
+def clear():
+    """Delete every cached answer and reset the counters."""
+    conn = connections.writer(database.DB_NAME)
+    with _PENDING_LOCK:
+        _PENDING.pop(os.path.abspath(database.DB_NAME), None)
+    with conn:
+        conn.execute("DELETE FROM llm_responses")
+        conn.execute("DELETE FROM llm_cache_stats")
@@ -0,0 +1,330 @@
+"""
+search.py
+
+This module answers full-text searches over the jobs table using the jobs_fts
+FTS5 index that database.create_table maintains. Results are ranked with BM25
+a recency window of RANK_WINDOW matches at a time, newest first (title matches
+count most), and come with a highlighted description snippet. Words are indexed
+as they are written, not stemmed, so a partly typed word matches as a prefix.
+It also filters jobs on structured fields (salary, remote, job type, location,
+posting date) using the jobs table's secondary indexes, a page at a time.
+"""
+import re
+import unicodedata
+import connections
+import database
+
+# words in the user's query; everything else (quotes, operators) is ignored
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# matches are ranked RANK_WINDOW at a time, newest first, so a broad query on a big
+# table costs the same as a narrow one
+RANK_WINDOW = 2000
+# above every rowid: the end of the newest window
+MAX_ROWID = 2 ** 63 - 1
+# bm25 counts every document containing each query term before it can score anything.
+# if a term is in more than RANK_LIMIT documents that count is too slow for a keystroke,
+# and each window is ranked by where the words appear (title, company, location) instead.
+RANK_LIMIT = 20000
+# weights for the fallback ranking, matching the bm25 column weights in database.py
+TITLE_WEIGHT, COMPANY_WEIGHT, LOCATION_WEIGHT = 10.0, 4.0, 2.0
+# a character the unicode61 tokenizer keeps in a word (a letter or digit), and a word
+TOKEN_CHAR = r"[^\W_]"
+TOKEN_RE = re.compile(TOKEN_CHAR + "+", re.UNICODE)
+
+def build_match_terms(text):
+    """
+    Turn free text typed by the user into a list of quoted FTS5 terms.
+    The last word may still be being typed: it is treated as a prefix once it is
+    at least two characters (which the prefix index covers), and left out while it
+    is one, so results update sensibly as the user types.
+    """
+    words = WORD_RE.findall(text)
+    terms = [f'"{word}"' for word in words]
+    if words and not text[-1].isspace():
+        if len(words[-1]) > 1:
+            terms[-1] += "*"
+        else:
+            terms.pop()
+    return terms
+
+def build_match_query(text):
+    """Turn free text into an FTS5 MATCH expression where every word must match."""
+    return " ".join(build_match_terms(text)) or None
+
+# helper function: the rowid of the count-th newest match below before, or 0 if there
+# are fewer
+def _nth_newest(cursor, match, count, before=MAX_ROWID):
+    cursor.execute(
+        """
+        SELECT rowid FROM jobs_fts WHERE jobs_fts MATCH ? AND rowid < ?
+        ORDER BY rowid DESC LIMIT 1 OFFSET ?
+        """,
+        (match, before, count - 1),
+    )
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+# helper function: rank the matches with rowids in bounds (start inclusive, end exclusive)
+# by bm25 and return the page of them at offset
+def _bm25_page(cursor, terms, bounds, limit, offset):
+    cursor.execute(
+        """
+        SELECT jobs.id, jobs.title, jobs.company,
+               snippet(jobs_fts, 2, '[', ']', '...', 12), jobs_fts.rank
+        FROM jobs_fts
+        CROSS JOIN jobs ON jobs.id = jobs_fts.rowid
+        WHERE jobs_fts MATCH ? AND jobs_fts.rowid >= ? AND jobs_fts.rowid < ?
+        ORDER BY jobs_fts.rank
+        LIMIT ? OFFSET ?
+        """,
+        (" ".join(terms), *bounds, limit, offset),
+    )
+    return cursor.fetchall()
+
+# helper function: text case folded and without diacritics, as the tokenizer indexes it
+def _fold(text):
+    text = (text or "").lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return text
+
+# helper function: the first word of an FTS5 term and a pattern finding its words in
+# _fold-ed text the way the tokenizer matches them: as whole words, and the last one as a
+# word start if the term is a prefix. text without the first word is skipped quickly.
+def _term_pattern(term):
+    words = TOKEN_RE.findall(_fold(term))
+    end = "" if term.endswith("*") else f"(?!{TOKEN_CHAR})"
+    return words[0], re.compile(
+        f"(?<!{TOKEN_CHAR})" + "[\\W_]+".join(map(re.escape, words)) + end)
+
+# helper function: score a job by which of its fields contain the typed words
+def _fallback_score(patterns, title, company, location):
+    fields = ((title, TITLE_WEIGHT), (company, COMPANY_WEIGHT), (location, LOCATION_WEIGHT))
+    score = 0.0
+    for text, weight in fields:
+        text = _fold(text)
+        score += weight * sum(1 for word, pattern in patterns
+                              if word in text and pattern.search(text))
+    return -score
+
+# helper function: rank the matches with rowids in bounds by which fields contain the
+# typed words, newest first on ties, and return the page of them at offset
+def _fallback_page(cursor, terms, bounds, limit, offset):
+    match = " ".join(terms)
+    cursor.execute(
+        """
+        SELECT jobs.id, jobs.title, jobs.company, jobs.location
+        FROM jobs_fts
+        CROSS JOIN jobs ON jobs.id = jobs_fts.rowid
+        WHERE jobs_fts MATCH ? AND jobs_fts.rowid >= ? AND jobs_fts.rowid < ?
+        ORDER BY jobs_fts.rowid DESC
+        """,
+        (match, *bounds),
+    )
+    patterns = [_term_pattern(term) for term in terms if TOKEN_RE.search(term)]
+    ranked = sorted(
+        ((_fallback_score(patterns, title, company, location), job_id, title, company)
+         for job_id, title, company, location in cursor.fetchall()),
+        key=lambda item: item[0],
+    )[offset:offset + limit]
+    snippets = {}
+    if ranked:
+        ids = [item[1] for item in ranked]
+        # the rowid range keeps this a single pass over the match; "+rowid IN" is then
+        # only a filter (a plain rowid IN would re-run the match once per id)
+        cursor.execute(
+            f"""
+            SELECT rowid, snippet(jobs_fts, 2, '[', ']', '...', 12) FROM jobs_fts
+            WHERE jobs_fts MATCH ? AND rowid BETWEEN ? AND ?
+            AND +rowid IN ({", ".join("?" * len(ids))})
+            """,
+            [match, min(ids), max(ids)] + ids,
+        )
+        snippets = dict(cursor.fetchall())
+    return [(job_id, title, company, snippets.get(job_id), score)
+            for score, job_id, title, company in ranked]
+
+def search_jobs(query, limit=50, offset=0):
+    """
+    Search jobs for query, best matches first.
+    Returns a list of (id, title, company, snippet, score) tuples, where snippet is
+    a short piece of the description with matches in [brackets] and a lower score
+    is a better match. Matches are ranked RANK_WINDOW at a time, newest window
+    first: each window is ranked by BM25 (or by where the words appear, if a word
+    is in more than RANK_LIMIT jobs), and offset pages on through older windows.
+    """
+    terms = build_match_terms(query)
+    if not terms:
+        return []
+    match = " ".join(terms)
+    cursor = connections.reader(database.DB_NAME).cursor()
+    rank_page = _bm25_page
+    if any(_nth_newest(cursor, term, RANK_LIMIT) for term in terms):
+        rank_page = _fallback_page
+    window, offset = divmod(offset, RANK_WINDOW)
+    end = _nth_newest(cursor, match, window * RANK_WINDOW) if window else MAX_ROWID
+    results = []
+    # each window ends where the newer one starts; the oldest starts at 0
+    while end and len(results) < limit:
+        start = _nth_newest(cursor, match, RANK_WINDOW, end)
+        results += rank_page(cursor, terms, (start, end), limit - len(results), offset)
+        end, offset = start, 0
+    return results
+
+# structured filters: name -> WHERE clause. every clause is on an indexed column
+# (see database.FILTER_INDEXES); location is a case-insensitive prefix range so it
+# can use the NOCASE location index instead of a LIKE scan.
+FILTERS = {
+    "min_salary": "min_amount >= ?",
+    "max_salary": "max_amount <= ?",
+    "is_remote": "is_remote = ?",
+    "job_type": "job_type = ?",
+    "location": "location COLLATE NOCASE >= ? AND location COLLATE NOCASE < ?",
+    "posted_since": "posted_date >= ?",
+}
+# the indexes a filtered query can be driven by, and the filters each one answers
+DRIVING_INDEXES = [
+    ("idx_jobs_remote_min_amount", ("is_remote", "min_salary")),
+    ("idx_jobs_min_amount", ("min_salary",)),
+    ("idx_jobs_max_amount", ("max_salary",)),
+    ("idx_jobs_remote", ("is_remote",)),
+    ("idx_jobs_job_type", ("job_type",)),
+    ("idx_jobs_location", ("location",)),
+    ("idx_jobs_posted_date", ("posted_since",)),
+]
+# columns filter_jobs may return
+FILTER_COLUMNS = ("id", "title", "company", "location", "job_type", "date_posted",
+                  "posted_date", "min_amount", "max_amount", "is_remote", "job_url")
+# sorts after every character, closing the location prefix range
+PREFIX_END = "\U0010ffff"
+# a range filter's index is only used to drive the query if it matches fewer rows than
+# this: its matches come out of the index in value order and must be sorted by id, while
+# a broad filter finds a page sooner by walking the table in id order.
+FILTER_SORT_LIMIT = 5000
+# rows sampled ahead of a page when every index matches FILTER_SORT_LIMIT rows or more
+FILTER_PROBE_ROWS = 500
+# rows a walk of the table in id order may read to fill a page; a query that would need
+# more is driven by an index instead
+FILTER_WALK_ROWS = 20000
+# filters whose index returns its matches in id order, so SQLite scans it for a page
+EQUALITY_FILTERS = ("is_remote", "job_type")
+
+# helper function: the WHERE clauses and parameters for the filters that are set
+def _filter_clauses(filters):
+    clauses = {}
+    for name, value in filters.items():
+        if value is None or value == "":
+            continue
+        if name == "location":
+            clauses[name] = (FILTERS[name], [value, value + PREFIX_END])
+        else:
+            clauses[name] = (FILTERS[name], [value])
+    return clauses
+
+# helper function: the WHERE clause and parameters of the filters named in names
+def _where(clauses, names):
+    return (" AND ".join(clauses[name][0] for name in names),
+            [param for name in names for param in clauses[name][1]])
+
+# helper function: of the next FILTER_PROBE_ROWS rows past after_id, return how many
+# there are, how many match every filter, and how many match each group of filters in groups
+def _sample(cursor, clauses, groups, after_id):
+    wheres = [_where(clauses, clauses)] + [_where(clauses, names) for names in groups]
+    cursor.execute(
+        f"""
+        SELECT count(*), {", ".join(f"coalesce(sum({where}), 0)" for where, _ in wheres)}
+        FROM (SELECT * FROM jobs WHERE id > ? ORDER BY id LIMIT ?)
+        """,
+        [param for _, params in wheres for param in params] + [after_id, FILTER_PROBE_ROWS],
+    )
+    return cursor.fetchone()
+
+# helper function: whether walking the table in id order past after_id fills a page of
+# limit rows within FILTER_WALK_ROWS rows, or reaches the last row first
+def _walk_fills_page(cursor, clauses, after_id, limit):
+    where, params = _where(clauses, clauses)
+    cursor.execute(
+        f"""
+        SELECT count(*) FROM (
+            SELECT 1 FROM (SELECT * FROM jobs WHERE id > ? ORDER BY id LIMIT ?)
+            WHERE {where} LIMIT ?
+        )
+        """,
+        [after_id, FILTER_WALK_ROWS] + params + [limit],
+    )
+    if cursor.fetchone()[0] >= limit:
+        return True
+    cursor.execute("SELECT count(*) FROM (SELECT 1 FROM jobs WHERE id > ? LIMIT ?)",
+                   (after_id, FILTER_WALK_ROWS))
+    return cursor.fetchone()[0] < FILTER_WALK_ROWS
+
+# helper function: the index to drive the query with, or None to leave it to SQLite.
+# The index matching the fewest rows is used if that is under FILTER_SORT_LIMIT
+# (counted in the index alone, which never touches the table). If every index matches
+# more and only range filters are set, SQLite would walk the table in id order. The next
+# FILTER_PROBE_ROWS rows are sampled, and the walk is kept when they are the last rows, when
+# every index matches all of them, or when some of them match and a walk bounded to
+# FILTER_WALK_ROWS rows fills a page. Otherwise the filters are broad alone but narrow
+# together (or their matches are clustered) and the walk could scan the whole table, so the
+# index matching the fewest of the sampled rows drives the query.
+def _driving_index(cursor, clauses, after_id, limit):
+    usable = [(index, names) for index, names in DRIVING_INDEXES
+              if all(name in clauses for name in names)]
+    best, best_count = None, FILTER_SORT_LIMIT
+    for index, names in usable:
+        where, params = _where(clauses, names)
+        cursor.execute(
+            f"""
+            SELECT count(*) FROM (
+                SELECT 1 FROM jobs INDEXED BY {index} WHERE {where} AND id > ? LIMIT ?
+            )
+            """,
+            params + [after_id, best_count],
+        )
+        count = cursor.fetchone()[0]
+        if count < best_count:
+            best, best_count = index, count
+    if best or not usable or any(name in clauses for name in EQUALITY_FILTERS):
+        return best
+    seen, matched, *sampled = _sample(cursor, clauses, [names for _, names in usable], after_id)
+    if seen < FILTER_PROBE_ROWS or min(sampled) == seen:
+        return None
+    if matched and _walk_fills_page(cursor, clauses, after_id, limit):
+        return None
+    return usable[sampled.index(min(sampled))][0]
+
+def build_filter_query(cursor, filters, columns=("id", "title"), after_id=0, limit=50):
+    """
+    Return the (sql, params) filter_jobs runs, probing indexes through cursor to pick
+    the one to drive the query with. Raises ValueError on unknown filters or columns.
+    """
+    filters = filters or {}
+    unknown = [name for name in filters if name not in FILTERS]
+    unknown += [column for column in columns if column not in FILTER_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown filter or column: {', '.join(unknown)}")
+    columns = ["id"] + [column for column in columns if column != "id"]
+    clauses = _filter_clauses(filters)
+    index = _driving_index(cursor, clauses, after_id, limit)
+    where = ["id > ?"] + [clause for clause, _ in clauses.values()]
+    params = [after_id] + [param for _, values in clauses.values() for param in values]
+    sql = f"""
+        SELECT {", ".join(columns)} FROM jobs {f"INDEXED BY {index}" if index else ""}
+        WHERE {" AND ".join(where)}
+        ORDER BY id LIMIT ?
+        """
+    return sql, params + [limit]
+
+def filter_jobs(filters=None, columns=("id", "title"), after_id=0, limit=50):
+    """
+    Return jobs matching every filter in filters (a dict keyed by FILTERS), in id order.
+    Pages are keyset based: pass the last id of a page as after_id to get the next one.
+    columns picks what each row contains; id is always the first column.
+    Filters whose value is None or "" are ignored.
+    """
+    cursor = connections.reader(database.DB_NAME).cursor()
+    sql, params = build_filter_query(cursor, filters, columns, after_id, limit)
+    cursor.execute(sql, params)
+    return cursor.fetchall()
@@ -0,0 +1,159 @@
+"""
+sessions.py
+
+This module hands out chat sessions with the model, so a generation does not set
+the model up again on every click. The model (reading the API key, configuring
+the client, building the GenerativeModel) is made once, on first use, and shared
+by every thread. Sessions are checked out one thread at a time and come back
+with their history cleared, so a reused session never sends earlier turns with
+a new prompt. Up to POOL_SIZE idle sessions are kept.
+
+A session can also be checked out for a prompt prefix, the part of every
+prompt that only depends on the profile (see main.profile_prefix). Such a
+session already holds the prefix, so only the job part of a prompt is sent. The
+prefix is held in the backend's context cache when it has one for it, or else
+in the first turn of the session's history (a seeded session); failing both,
+the session is a plain one and the whole prompt is sent. Sessions of the
+PREFIX_POOLS most recently used prefixes are kept. A context cache is released
+(deleted, for Gemini) once its prefix's sessions are made again or dropped and
+none of them is checked out any more.
+"""
+import collections
+import contextlib
+import hashlib
+import queue
+import threading
+import time
+
+# idle sessions kept for reuse; more are started when more are checked out at once
+POOL_SIZE = 4
+# prefixes (profiles) whose sessions are kept; the least recently used goes first
+PREFIX_POOLS = 8
+# a prefix shorter than this many characters is sent with every prompt instead
+MIN_PREFIX_SIZE = 200
+# seconds a prefix's context cache is used for; it is made again after that,
+# before the backend forgets it (backends.CONTEXT_CACHE_TTL)
+PREFIX_MAX_AGE = 3000
+# the model's turn after the prefix in a seeded session
+SEED_REPLY = "Understood."
+# how a session holds its prefix (its reuse attribute)
+CONTEXT_CACHE, SEEDED, FULL_PROMPT = "context cache", "seeded session", "full prompt"
+
+# a prefix's sessions: the model they are started on, the history they start with
+# and come back to, how they hold the prefix, when the entry was made, the idle ones
+# and [sessions checked out, whether the entry has been replaced or dropped]
+_PrefixPool = collections.namedtuple("_PrefixPool", "model seed reuse created idle state")
+
+class SessionPool:  # pylint: disable=too-many-instance-attributes
+    """
+    A pool of chat sessions on one model. make_model() is called once, on first
+    use, and must return an object with start_chat(history=...).
+    make_prefix_model(prefix), if given, returns a model holding prefix in a
+    context cache, or None; seed allows seeded sessions when it does not.
+    release_prefix_model(model), if given, is called with such a model once it
+    is no longer used, so its context cache can be deleted.
+    """
+
+    def __init__(self, make_model, size=POOL_SIZE, make_prefix_model=None, seed=True,  # pylint: disable=too-many-arguments,too-many-positional-arguments
+                 release_prefix_model=None):
+        self.make_model = make_model
+        self.make_prefix_model = make_prefix_model
+        self.release_prefix_model = release_prefix_model
+        self.seed = seed
+        self.size = size
+        self._model = None
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._prefixes = collections.OrderedDict()
+
+    def model(self):
+        """Return the shared model, making it the first time."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.make_model()
+        return self._model
+
+    @contextlib.contextmanager
+    def session(self, prefix=""):
+        """
+        Check out a session with an empty history; it goes back to the pool afterwards.
+        With prefix, the session holds prefix if it can: its prefix attribute is the
+        prefix it holds ("" if none) and its reuse attribute says how (CONTEXT_CACHE,
+        SEEDED or FULL_PROMPT).
+        """
+        pool = self._prefix_pool(prefix) if len(prefix) >= MIN_PREFIX_SIZE else None
+        idle = pool.idle if pool else self._idle
+        chat = None
+        try:
+            try:
+                chat = idle.get_nowait()
+            except queue.Empty:
+                chat = (pool.model if pool else self.model()).start_chat(
+                    history=list(pool.seed) if pool else [])
+                chat.prefix, chat.reuse = (prefix, pool.reuse) if pool else ("", FULL_PROMPT)
+            yield chat
+        finally:
+            if chat is not None:
+                chat.history = list(pool.seed) if pool else []
+                try:
+                    idle.put_nowait(chat)
+                except queue.Full:
+                    pass
+            if pool:
+                with self._lock:
+                    pool.state[0] -= 1
+                    unused = pool.state[1] and not pool.state[0]
+                if unused:
+                    self._release(pool)
+
+    # helper function: the sessions of prefix, made (or made again, when its context
+    # cache is about to expire) on first use, and checked out by the caller; None if
+    # prefix cannot be held, which is remembered too
+    def _prefix_pool(self, prefix):
+        digest = hashlib.sha1(prefix.encode("utf-8")).digest()
+        with self._lock:
+            pool = self._prefixes.get(digest)
+            if pool and (pool.reuse != CONTEXT_CACHE
+                         or time.monotonic() - pool.created < PREFIX_MAX_AGE):
+                self._prefixes.move_to_end(digest)
+                return self._check_out(pool)
+        model = self.make_prefix_model(prefix) if self.make_prefix_model else None
+        if model is not None:
+            pool = _PrefixPool(model, [], CONTEXT_CACHE, time.monotonic(),
+                               queue.LifoQueue(maxsize=self.size), [0, False])
+        elif self.seed:
+            seed = [{"role": "user", "parts": [prefix]}, {"role": "model", "parts": [SEED_REPLY]}]
+            pool = _PrefixPool(self.model(), seed, SEEDED, time.monotonic(),
+                               queue.LifoQueue(maxsize=self.size), [0, False])
+        else:
+            pool = _PrefixPool(None, [], FULL_PROMPT, time.monotonic(), None, [0, False])
+        with self._lock:
+            dropped = [self._prefixes.pop(digest, None)]
+            self._prefixes[digest] = pool
+            while len(self._prefixes) > PREFIX_POOLS:
+                dropped.append(self._prefixes.popitem(last=False)[1])
+            unused = []
+            for old in dropped:
+                if old:
+                    old.state[1] = True
+                    if not old.state[0]:
+                        unused.append(old)
+            pool = self._check_out(pool)
+        for old in unused:
+            self._release(old)
+        return pool
+
+    # helper function: count a session of pool as checked out (the caller holds the
+    # lock); None for a pool whose prefix cannot be held
+    @staticmethod
+    def _check_out(pool):
+        if pool.reuse == FULL_PROMPT:
+            return None
+        pool.state[0] += 1
+        return pool
+
+    # helper function: let go of the context cache of a pool that is no longer used
+    def _release(self, pool):
+        if pool.reuse == CONTEXT_CACHE and self.release_prefix_model:
+            self.release_prefix_model(pool.model)
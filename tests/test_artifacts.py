@@ -0,0 +1,137 @@
+"""
+tests/test_artifacts.py
+
+This module contains unit tests for naming and recording generated files.
+It checks that file names come from the artifacts table, are spread over shard
+folders and are never handed out twice, even to threads saving at once, that
+saved Markdown files and their PDFs can be found by job and profile, and that
+documents are stored once, compressed, and only written out when exported,
+and that a stored document is committed together with its record.
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import artifacts
+import connections
+import database
+import main
+
+
+class TestArtifacts(unittest.TestCase):
+    """Unit tests for artifacts.py and the save functions of main.py."""
+
+    def setUp(self):
+        """Save into a temporary directory with its own database."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.markdown_folder = os.path.join(self.tmp.name, "markdown_files")
+        patches = {"database.DB_NAME": os.path.join(self.tmp.name, "jobs.db"),
+                   "main.MARKDOWN_FOLDER": self.markdown_folder,
+                   "main.PDF_FOLDER": os.path.join(self.tmp.name, "pdf_files")}
+        for name, value in patches.items():
+            patcher = mock.patch(name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        database.create_table()
+
+    def tearDown(self):
+        """Close the connections and delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def test_allocate(self):
+        """Numbers are handed out once, across threads, in shard folders of SHARD_SIZE."""
+        paths = []
+
+        def work():
+            for _ in range(25):
+                paths.append(artifacts.allocate(self.markdown_folder, "resume", ".md"))
+
+        with mock.patch("artifacts.SHARD_SIZE", 10):
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(set(paths)), 100)
+        self.assertEqual(sorted(os.listdir(self.markdown_folder)),
+                         [f"{shard:04d}" for shard in range(11)])
+        self.assertIn(os.path.join(self.markdown_folder, "0009", "resume-95.md"), paths)
+
+    def test_save_and_find(self):
+        """A saved document and its PDF are recorded with the job, profile and prompt hash."""
+        patcher = mock.patch("artifacts.EXPORT_ON_SAVE", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        source = {"job_id": 12, "profile_id": 3,
+                  "prompt_hash": artifacts.prompt_hash("resume", "job", "me")}
+        md_filename = main.save_resume("# Resume\r\nAda", source)
+        self.assertEqual(md_filename, os.path.join(self.markdown_folder, "0000", "resume-1.md"))
+        with open(md_filename, encoding="utf-8", newline="") as f:
+            self.assertEqual(f.read(), "# Resume\nAda")
+        pdf_filename = main.convert_text_to_pdf(md_filename)
+        self.assertEqual(pdf_filename, os.path.join(main.PDF_FOLDER, "0000", "resume-1.pdf"))
+        self.assertTrue(os.path.exists(pdf_filename))
+        # converting again replaces the PDF rather than adding one
+        self.assertEqual(main.convert_text_to_pdf(md_filename), pdf_filename)
+        main.save_cover_letter("Dear Acme", {"job_id": 13, "profile_id": 3})
+
+        self.assertEqual([row[2] for row in artifacts.find(job_id=12)],
+                         [pdf_filename, md_filename])
+        self.assertEqual({row[1] for row in artifacts.find(profile_id=3)},
+                         {"resume", "cover_letter"})
+        self.assertEqual(len(artifacts.find(prompt=source["prompt_hash"])), 2)
+        self.assertEqual(artifacts.lookup(pdf_filename), ("resume", source))
+        self.assertIsNone(artifacts.lookup("elsewhere.md"))
+
+    def test_attach_is_one_transaction(self):
+        """A blob is committed with the record pointing at it, never before."""
+        path = artifacts.allocate(self.markdown_folder, "resume", ".md")
+        statements = []
+        conn = connections.writer(database.DB_NAME)
+        conn.set_trace_callback(statements.append)
+        try:
+            digest = artifacts.attach(path, b"# Resume")
+        finally:
+            conn.set_trace_callback(None)
+        self.assertEqual([statement.split()[0] for statement in statements],
+                         ["BEGIN", "INSERT", "UPDATE", "COMMIT"])
+        self.assertEqual(artifacts.collect_garbage(), (0, 0))
+        self.assertEqual(artifacts.content_hash(path), digest)
+        self.assertEqual(artifacts.read(path), b"# Resume")
+
+    def test_store_export_and_collect(self):
+        """Identical documents share a blob; files are written on export; unused blobs go."""
+        resume = "# Resume\n" + "Built data pipelines in Python and SQL.\n" * 20
+        first = main.save_resume(resume, {"job_id": 1})
+        second = main.save_resume(resume.replace("\n", "\r\n"), {"job_id": 2})
+        pdf_filename = main.convert_text_to_pdf(first)
+        letter = main.save_cover_letter("Dear Acme", {"job_id": 2})
+        self.assertFalse(any(map(os.path.exists, (first, second, pdf_filename, letter))))
+        self.assertEqual(artifacts.read(second), resume.encode("utf-8"))
+        self.assertEqual(artifacts.content_hash(pdf_filename), artifacts.content_hash(first))
+        records, blobs, size, stored = artifacts.stats()
+        self.assertEqual((records, blobs, size), (4, 2, len(resume) + len("Dear Acme")))
+        self.assertLess(stored, size / 2)
+
+        self.assertEqual(artifacts.export(pdf_filename), pdf_filename)
+        with open(pdf_filename, "rb") as f:
+            self.assertTrue(f.read().startswith(b"%PDF"))
+        artifacts.export(letter)
+        with open(letter, encoding="utf-8") as f:
+            self.assertEqual(f.read(), "Dear Acme")
+        with self.assertRaises(KeyError):
+            artifacts.export(os.path.join(self.markdown_folder, "missing.md"))
+
+        # the resume blob is still used by the second job's resume
+        self.assertEqual(artifacts.delete(job_id=1), 2)
+        self.assertEqual(artifacts.collect_garbage(), (0, 0))
+        self.assertEqual(artifacts.delete(job_id=2), 2)
+        self.assertEqual(artifacts.collect_garbage(), (2, len(resume) + len("Dear Acme")))
+        self.assertEqual(artifacts.stats(), (0, 0, 0, 0))
+        self.assertTrue(os.path.exists(letter))
+
+
+if __name__ == "__main__":
+    unittest.main()
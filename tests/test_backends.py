@@ -0,0 +1,150 @@
+"""
+tests/test_backends.py
+
+This module contains unit tests for the model backends.
+It checks that the stand-in backend answers like a google.generativeai chat,
+streamed or not, waits the simulated delays, fails at its error rate, and that
+main.py generates documents through whichever backend it is switched to,
+sending only the job to a session that holds the profile. It also checks that
+the Gemini backend only creates context caches the model supports, and deletes
+them when they are released.
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+import backends
+import connections
+import database
+import generation
+import main
+import response_cache
+import sessions
+
+
+class TestStandInBackend(unittest.TestCase):
+    """Unit tests for backends.StandInBackend."""
+
+    def setUp(self):
+        """Record the waits instead of sleeping."""
+        self.waits = []
+
+    def _backend(self, **options):
+        options.setdefault("seed", 1)
+        return backends.StandInBackend(sleep=self.waits.append, **options)
+
+    def test_send_message(self):
+        """An answer waits the first-token delay and the time it takes to write."""
+        backend = self._backend(latency=0.5, jitter=0, tokens_per_second=100,
+                                answer_tokens=50)
+        chat = backend.build_model().start_chat(history=[])
+        response = chat.send_message("write a resume")
+        self.assertTrue(response.text.startswith("# Document"))
+        self.assertEqual(response.text, backend.answer("write a resume"))
+        self.assertEqual(self.waits[0], 0.5)
+        self.assertAlmostEqual(self.waits[1], len(response.text) / 4 / 100)
+        self.assertEqual(chat.history, ["write a resume", response.text])
+
+    def test_stream(self):
+        """A streamed answer comes in chunks, the last one without parts."""
+        backend = self._backend(jitter=0, chunk_tokens=5, answer_tokens=50)
+        chunks = list(backend.build_model().start_chat().send_message("prompt", stream=True))
+        self.assertEqual(chunks[-1].parts, [])
+        self.assertTrue(all(len(chunk.text) <= 20 for chunk in chunks))
+        self.assertEqual("".join(chunk.text for chunk in chunks), backend.answer("prompt"))
+        # the first-token delay, then one wait per chunk with text
+        self.assertEqual(len(self.waits), len(chunks))
+
+    def test_errors_and_seed(self):
+        """Requests fail at the error rate, and a seed repeats the same delays."""
+        chat = self._backend(error_rate=1).build_model().start_chat()
+        with self.assertRaises(backends.StandInError):
+            chat.send_message("prompt")
+        first, second = self._backend(seed=7), self._backend(seed=7)
+        self.assertEqual([first.draw() for _ in range(5)], [second.draw() for _ in range(5)])
+        with self.assertRaises(ValueError):
+            backends.StandInBackend(error_rate=2)
+
+
+class TestGeminiBackend(unittest.TestCase):
+    """Unit tests for the Gemini backend's context caches, with the API mocked."""
+
+    def setUp(self):
+        """Mock the Gemini API."""
+        patchers = [mock.patch("backends.genai"), mock.patch("backends.caching")]
+        self.genai, self.caching = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.backend = backends.GeminiBackend("gemini-test", {}, "Write documents.")
+        self.backend._configure = mock.Mock()  # pylint: disable=protected-access
+        self.prefix = "profile " * 2000
+
+    def test_unsupported_model(self):
+        """No context cache is created for a model that cannot hold one; it is asked once."""
+        self.genai.get_model.return_value.supported_generation_methods = ["generateContent"]
+        for _ in range(2):
+            self.assertIsNone(self.backend.prefix_model(self.prefix))
+        self.genai.get_model.assert_called_once_with("models/gemini-test")
+        self.caching.CachedContent.create.assert_not_called()
+
+    def test_release_prefix_model(self):
+        """Releasing a prefix model deletes its context cache, once."""
+        self.genai.get_model.return_value.supported_generation_methods = [
+            "generateContent", "createCachedContent"]
+        cached = self.caching.CachedContent.create.return_value
+        cached.name = "cachedContents/1"
+        self.genai.GenerativeModel.from_cached_content.return_value.cached_content = cached.name
+        model = self.backend.prefix_model(self.prefix)
+        self.caching.CachedContent.create.assert_called_once()
+        for _ in range(2):
+            self.backend.release_prefix_model(model)
+        cached.delete.assert_called_once_with()
+        self.backend.release_prefix_model(mock.Mock(cached_content=None))
+        cached.delete.assert_called_once_with()
+
+
+class TestUseBackend(unittest.TestCase):
+    """Unit tests for generating documents through main.use_backend."""
+
+    def setUp(self):
+        """Use a temporary response cache and put the Gemini backend back afterwards."""
+        tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(connections.close_all)
+        database.DB_NAME = os.path.join(tmp.name, "jobs.db")
+        database.create_table()
+        self.addCleanup(main.use_backend, main.BACKEND)
+
+    def test_create_document(self):
+        """Documents come from the stand-in, and are cached under its model name."""
+        backend = backends.StandInBackend(latency=0, jitter=0, tokens_per_second=None)
+        main.use_backend(backend)
+        pieces = []
+        text = generation.create_document("resume", "job", "me", on_chunk=pieces.append)
+        self.assertEqual("".join(pieces), text)
+        self.assertTrue(text.startswith("# Document"))
+        self.assertEqual(response_cache.stats()["entries"], 1)
+        conn = connections.reader(database.DB_NAME)
+        self.assertEqual(conn.execute("SELECT model_name FROM llm_responses").fetchone()[0],
+                         "stand-in")
+
+    def test_profile_prefix(self):
+        """A session holding the profile is only sent the job; the cache key is unchanged."""
+        profile = "Alex Doe, data engineer. " * 20
+        for context_cache, reuse in ((True, sessions.CONTEXT_CACHE), (False, sessions.SEEDED)):
+            main.use_backend(backends.StandInBackend(latency=0, jitter=0, tokens_per_second=None,
+                                                     context_cache=context_cache))
+            with main.SESSIONS.session(main.profile_prefix(profile)) as chat:
+                self.assertEqual(chat.reuse, reuse)
+                main.create_resume(chat, "Data engineer at Acme", profile, cache=True,
+                                   refresh=True)
+                self.assertNotIn(profile, chat.history[-2])
+                self.assertIn("Data engineer at Acme", chat.history[-2])
+            # the same answer without the session is a cache hit
+            plain = main.setup_model()
+            main.create_resume(plain, "Data engineer at Acme", profile, cache=True)
+            self.assertEqual(plain.history, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
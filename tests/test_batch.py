@@ -0,0 +1,155 @@
+"""
+tests/test_batch.py
+
+This module contains unit tests for headless batch generation.
+The model, file saving and PDF steps of main.py are replaced with stand-ins. It
+checks that the rate limiter spaces out requests, that jobs and profiles are
+selected from the database, and that a batch generates every document, retries
+model calls that fail with a transient error and reports the ones that keep
+failing. Cached answers do not wait on the rate limiter.
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import backends
+import batch
+import connections
+import database
+import gui
+import sessions
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Unit tests for batch.RateLimiter with a fake clock."""
+
+    def test_spacing(self):
+        """Requests are spaced 60 / per_minute seconds apart; idle time is not saved up."""
+        now = [100.0]
+        limiter = batch.RateLimiter(30, clock=lambda: now[0],
+                                    sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+        self.assertEqual([limiter.acquire() for _ in range(3)], [0, 2.0, 2.0])
+        self.assertEqual(now[0], 104.0)
+        now[0] += 10
+        self.assertEqual(limiter.acquire(), 0)
+        with self.assertRaises(ValueError):
+            batch.RateLimiter(0)
+
+
+class TestBatch(unittest.TestCase):
+    """Unit tests for job and profile selection and batch.run against a temporary database."""
+
+    def setUp(self):
+        """Create a temporary database with three jobs and two profiles and patch main.py."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        database.DB_NAME = os.path.join(self.tmp.name, "jobs.db")
+        database.create_table()
+        gui.create_user_profiles_table()
+        database.bulk_insert(database.key_rows(
+            [{"id": f"job{i}"} for i in range(3)],
+            [(f"Engineer {i}", "Acme", f"Job {i} description.", "Remote", "fulltime",
+              "2024-05-01", 90000.0 + i * 10000, 150000.0, remote, f"https://acme.example/{i}")
+             for i, remote in enumerate(["yes", "no", "yes"])]))
+        for name in ("Ada", "Grace"):
+            gui.save_user_profile({"full_name": name, "email": "", "phone": "", "githubID": "",
+                                   "linkedin": "", "projects": "", "relevant_courses": "",
+                                   "other_info": ""})
+        self.failures = {}
+        self.cached = set()
+        self.error = backends.StandInError("429 resource exhausted")
+        self.lock = threading.Lock()
+        self.saved = []
+        patches = {
+            # sessions on a stand-in model
+            "SESSIONS": sessions.SessionPool(mock.Mock),
+            "create_resume": mock.Mock(side_effect=self._create),
+            "create_cover_letter": mock.Mock(side_effect=self._create),
+            "save_resume": mock.Mock(side_effect=self._save),
+            "save_cover_letter": mock.Mock(side_effect=self._save),
+            "convert_text_to_pdf": mock.Mock(side_effect=lambda path, _text=None: path + ".pdf"),
+        }
+        for name, stand_in in patches.items():
+            patcher = mock.patch(f"main.{name}", stand_in)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Close the connections and delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def _create(self, _chat, job_description, personal_description, **options):
+        # answer self.cached jobs without a request; fail the first
+        # self.failures[job_description] calls for the others
+        if job_description not in self.cached:
+            options["before_request"]()
+        with self.lock:
+            failing = self.failures.get(job_description, 0) > 0
+            if failing:
+                self.failures[job_description] -= 1
+        if failing:
+            raise self.error
+        return f"{personal_description.splitlines()[0]} / {job_description}"
+
+    def _save(self, document, _source=None):
+        self.saved.append(document)
+        return f"doc{len(self.saved)}.md"
+
+    def test_select(self):
+        """Jobs are selected by id or by filter; unknown ids are errors."""
+        self.assertEqual([job[0] for job in batch.select_jobs([3, 1])], [3, 1])
+        self.assertEqual(batch.select_jobs([1])[0][3], "Job 0 description.")
+        self.assertEqual([job[0] for job in batch.select_jobs(filters={"is_remote": "yes"})],
+                         [1, 3])
+        self.assertEqual([job[0] for job in batch.select_jobs(filters={}, limit=2)], [1, 2])
+        self.assertEqual([p[1] for p in batch.select_profiles([2, 1])], ["Grace", "Ada"])
+        with self.assertRaises(ValueError):
+            batch.select_jobs([4])
+        with self.assertRaises(ValueError):
+            batch.select_profiles([1, 5])
+
+    def test_run(self):
+        """Every job, profile and kind is generated; failures are retried, then reported."""
+        self.failures = {"Job 0 description.": 1, "Job 1 description.": 99}
+        jobs = batch.select_jobs([1, 2])
+        profiles = batch.select_profiles([1, 2])
+        with mock.patch("batch.random.uniform", return_value=0):
+            stats = batch.run(jobs, profiles, ["resume", "cover letter"], concurrency=3,
+                              per_minute=60000, retries=2)
+        done = sorted(key for key, _, succeeded in stats["results"] if succeeded)
+        failed = [(key, error) for key, error, succeeded in stats["results"] if not succeeded]
+        # job 1 fails once in the first task to reach it, then succeeds everywhere
+        self.assertEqual(done, [(1, 1, "cover letter"), (1, 1, "resume"),
+                                (1, 2, "cover letter"), (1, 2, "resume")])
+        self.assertEqual(len(failed), 4)
+        self.assertTrue(all(error == "429 resource exhausted" for _, error in failed))
+        self.assertEqual(stats["retries"], 1 + 4 * 2)
+        self.assertEqual(len(self.saved), 4)
+        self.assertIn("Full Name: Grace / Job 0 description.", self.saved)
+        self.assertEqual(len(stats["timings"]["model"]), 8)
+        self.assertEqual(len(stats["timings"]["save"]), 4)
+
+    def test_errors_that_are_not_transient(self):
+        """An error that would recur (a missing API key file) fails at once."""
+        self.failures = {"Job 0 description.": 1}
+        self.error = FileNotFoundError("secrets.txt")
+        with mock.patch("batch.time.sleep") as sleep:
+            stats = batch.run(batch.select_jobs([1]), batch.select_profiles([1]), ["resume"],
+                              per_minute=60000, retries=2)
+        self.assertEqual(stats["results"], [((1, 1, "resume"), "secrets.txt", False)])
+        self.assertEqual(stats["retries"], 0)
+        sleep.assert_not_called()
+
+    def test_cached_answers_skip_the_rate_limiter(self):
+        """Only requests sent to the model take a rate limiter slot."""
+        self.cached = {"Job 0 description."}
+        with mock.patch.object(batch.RateLimiter, "acquire", return_value=0) as acquire:
+            stats = batch.run(batch.select_jobs([1, 2]), batch.select_profiles([1]),
+                              ["resume"], per_minute=1)
+        self.assertTrue(all(result[2] for result in stats["results"]))
+        self.assertEqual(acquire.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
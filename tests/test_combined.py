@@ -0,0 +1,53 @@
+"""
+tests/test_combined.py
+
+This module contains unit tests for generating a resume and a cover letter with
+one model request. It checks that combined answers are split at the separator
+line (or a cover letter heading), and that an answer that cannot be split is
+asked for once more before giving up.
+"""
+import unittest
+from unittest import mock
+import main
+
+
+class TestCombined(unittest.TestCase):
+    """Unit tests for main.create_resume_and_cover_letter and main.split_documents."""
+
+    def test_split(self):
+        """Answers split at the separator, loosely written, or before a cover letter heading."""
+        self.assertEqual(main.split_documents(f"# Resume\n\n{main.DOCUMENT_SEPARATOR}\nDear"),
+                         ("# Resume\n", "Dear\n"))
+        self.assertEqual(main.split_documents("# Resume\n  == Cover Letter ==  \n\nDear"),
+                         ("# Resume\n", "Dear\n"))
+        self.assertEqual(main.split_documents("# Resume\n\n## Cover Letter\nDear"),
+                         ("# Resume\n", "## Cover Letter\nDear\n"))
+        for text in ("# Resume only", f"{main.DOCUMENT_SEPARATOR}\nDear", "# Cover letter"):
+            with self.assertRaises(ValueError):
+                main.split_documents(text)
+
+    def test_one_request(self):
+        """Both descriptions are sent once, and the answer comes back as two documents."""
+        chat = mock.Mock(history=[])
+        chat.send_message.return_value.text = f"# Resume\n{main.DOCUMENT_SEPARATOR}\nDear"
+        self.assertEqual(main.create_resume_and_cover_letter(chat, "Data engineer", "Alex Doe"),
+                         ("# Resume\n", "Dear\n"))
+        prompt = chat.send_message.call_args[0][0]
+        self.assertEqual((prompt.count("Data engineer"), prompt.count("Alex Doe")), (1, 1))
+        self.assertIn(f"\n{main.DOCUMENT_SEPARATOR}\n", prompt)
+
+    def test_retry(self):
+        """An answer without a separator is asked for again, then given up on."""
+        chat = mock.Mock(history=[])
+        answer = f"# Resume\n{main.DOCUMENT_SEPARATOR}\nDear"
+        chat.send_message.side_effect = [mock.Mock(text="# Resume"), mock.Mock(text=answer)]
+        self.assertEqual(main.create_resume_and_cover_letter(chat, "job", "me")[1], "Dear\n")
+        chat.send_message.side_effect = None
+        chat.send_message.return_value.text = "# Resume"
+        with self.assertRaises(ValueError):
+            main.create_resume_and_cover_letter(chat, "job", "me")
+        self.assertEqual(chat.send_message.call_count, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+tests/test_compaction.py
+
+This module contains unit tests for job description compaction.
+It checks that descriptions are split into sections at headings, that the
+sections the model needs are kept while benefits, EEO and shared boilerplate go
+first, that compacted descriptions are cached per job, and that the report adds
+up the tokens saved.
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+import compaction
+import connections
+import database
+import descriptions
+
+ROLE = "Senior Data Engineer\n\nJoin the data platform team building pipelines for analytics."
+REQUIREMENTS = ("Requirements\n\n- 5+ years of experience with Python and SQL\n"
+                "- Strong skills in Spark and Airflow\n- Degree in computer science")
+BENEFITS = ("Benefits\n\nWe offer medical, dental and vision insurance, a 401(k) match, "
+            "paid time off and a generous home office budget for every employee.")
+EEO = ("Acme is an equal opportunity employer and values diversity. All qualified applicants "
+       "will receive consideration without regard to any protected characteristic.")
+DESCRIPTION = "\n\n".join([ROLE, REQUIREMENTS, BENEFITS, EEO])
+
+
+class TestCompact(unittest.TestCase):
+    """Unit tests for split_sections and compact."""
+
+    def test_sections(self):
+        """Headings (not list items) start sections; paragraphs join back into the text."""
+        sections = compaction.split_sections(DESCRIPTION)
+        self.assertEqual([section[0] for section in sections],
+                         ["Senior Data Engineer", "Requirements", "Benefits"])
+        self.assertEqual("\n\n".join(p for section in sections for p in section), DESCRIPTION)
+
+    def test_low_value_sections_go_first(self):
+        """Benefits and EEO are dropped before the role and its requirements."""
+        self.assertEqual(compaction.compact(DESCRIPTION, 1000), DESCRIPTION)
+        budget = compaction.estimate_tokens("\n\n".join([ROLE, REQUIREMENTS])) + 2
+        self.assertEqual(compaction.compact(DESCRIPTION, budget),
+                         "\n\n".join([ROLE, REQUIREMENTS]))
+        # too small for even the best section: cut at a line break
+        short = compaction.compact(DESCRIPTION, 15)
+        self.assertLessEqual(len(short), 15 * compaction.CHARS_PER_TOKEN)
+        self.assertTrue(REQUIREMENTS.startswith(short))
+
+    def test_words_match_whole_words(self):
+        """Low value words are not found inside other words, and stems match word starts."""
+        self.assertEqual(compaction.score_section(["Benefits", "Paid time off and PTO."]), -4)
+        self.assertEqual(compaction.score_section(
+            ["Security", "Cryptography on a laptop is beneficial to privacy engineering."]), 0)
+        self.assertEqual(compaction.score_section(["Responsibilities", "Payroll control."]), 2)
+
+    def test_shared_paragraphs_score_low(self):
+        """A section made of boilerplate other postings share goes before an equal one."""
+        first = "Team\n\nYou will work with the mobile team on our apps every day of the week."
+        second = "Office\n\nYou will work from our Berlin office, close to the main station."
+        text = f"{first}\n\n{second}"
+        budget = compaction.estimate_tokens(first) + 2
+        self.assertEqual(compaction.compact(text, budget), first)
+        shared = {descriptions.paragraph_digest(first.split("\n\n")[1])}
+        self.assertEqual(compaction.compact(text, budget, shared), second)
+
+
+class TestFitDescription(unittest.TestCase):
+    """Unit tests for fit_description and report against a temporary database."""
+
+    def setUp(self):
+        """Create a temporary database."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        database.DB_NAME = os.path.join(self.tmp.name, "jobs.db")
+        database.create_table()
+
+    def tearDown(self):
+        """Close the connections and delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def test_cache(self):
+        """A compacted description is made once per job and budget, and again if it changes."""
+        with mock.patch("compaction.MIN_DESCRIPTION_TOKENS", 10), \
+                mock.patch("compaction.BUDGET_STEP", 1), \
+                mock.patch("compaction.compact", wraps=compaction.compact) as compact:
+            budget = (compaction.PROMPT_OVERHEAD_TOKENS + compaction.estimate_tokens("me")
+                      + compaction.estimate_tokens("\n\n".join([ROLE, REQUIREMENTS])) + 2)
+            fitted = compaction.fit_description(1, DESCRIPTION, "me", budget)
+            self.assertEqual(fitted, "\n\n".join([ROLE, REQUIREMENTS]))
+            self.assertEqual(compaction.fit_description(1, DESCRIPTION, "me", budget), fitted)
+            self.assertEqual(compact.call_count, 1)
+            changed = DESCRIPTION.replace("Spark", "Flink")
+            self.assertIn("Flink", compaction.fit_description(1, changed, "me", budget))
+            self.assertEqual(compact.call_count, 2)
+            # a description that fits is neither compacted nor cached
+            self.assertEqual(compaction.fit_description(2, ROLE, "me", budget), ROLE)
+            self.assertEqual(compact.call_count, 2)
+
+    def test_report(self):
+        """The report counts every job and the prompt tokens compaction saves."""
+        database.bulk_insert(database.key_rows(
+            [{"id": "0"}, {"id": "1"}],
+            [(f"Engineer {i}", "Acme", text, "Remote", "", "", None, None, "yes", "")
+             for i, text in enumerate([DESCRIPTION, ROLE])]))
+        with mock.patch("compaction.MIN_DESCRIPTION_TOKENS", 10), \
+                mock.patch("compaction.BUDGET_STEP", 1):
+            budget = compaction.PROMPT_OVERHEAD_TOKENS + compaction.estimate_tokens(ROLE) + 2
+            jobs, compacted, before, after = compaction.report(budget)
+            fitted = compaction.compact(DESCRIPTION, compaction.description_budget("", budget))
+        fixed = compaction.PROMPT_OVERHEAD_TOKENS
+        self.assertEqual((jobs, compacted), (2, 1))
+        self.assertEqual(before, 2 * fixed + compaction.estimate_tokens(DESCRIPTION)
+                         + compaction.estimate_tokens(ROLE))
+        self.assertEqual(after, 2 * fixed + compaction.estimate_tokens(fitted)
+                         + compaction.estimate_tokens(ROLE))
+        self.assertLessEqual(compaction.estimate_tokens(fitted), compaction.estimate_tokens(ROLE))
+
+
+if __name__ == "__main__":
+    unittest.main()
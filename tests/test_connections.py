@@ -0,0 +1,69 @@
+"""
+tests/test_connections.py
+
+This module contains unit tests for the shared connection manager.
+It checks that connections are reused per thread, that the reader cannot write
+but sees the writer's commits, and that databases are put in WAL mode.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+import connections
+
+
+class TestConnections(unittest.TestCase):
+    """Unit tests for connections.reader and connections.writer."""
+
+    def setUp(self):
+        """Create a temporary directory for the database."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.db_path = os.path.join(self.tmp.name, "jobs.db")
+
+    def tearDown(self):
+        """Close the connections and delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def test_connections_are_reused(self):
+        """The same thread gets the same reader and writer back until close_all."""
+        reader, writer = connections.reader(self.db_path), connections.writer(self.db_path)
+        self.assertIsNot(reader, writer)
+        self.assertIs(connections.reader(self.db_path), reader)
+        self.assertIs(connections.writer(self.db_path), writer)
+        connections.close_all()
+        self.assertIsNot(connections.reader(self.db_path), reader)
+
+    def test_reader_sees_commits_and_cannot_write(self):
+        """The reader is read-only, in WAL mode, and sees what the writer commits."""
+        writer = connections.writer(self.db_path)
+        writer.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY, title TEXT)")
+        reader = connections.reader(self.db_path)
+        self.assertEqual(reader.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(reader.execute("SELECT count(*) FROM jobs").fetchone()[0], 0)
+        writer.execute("INSERT INTO jobs (title) VALUES ('Engineer')")
+        writer.commit()
+        self.assertEqual(reader.execute("SELECT count(*) FROM jobs").fetchone()[0], 1)
+        with self.assertRaises(sqlite3.OperationalError):
+            reader.execute("DELETE FROM jobs")
+
+    def test_threads_get_their_own_connections(self):
+        """Each thread has its own connections, so they can be used from worker threads."""
+        reader = connections.reader(self.db_path)
+        seen = []
+
+        def work():
+            conn = connections.reader(self.db_path)
+            seen.append((conn, conn.execute("SELECT 1").fetchone()[0]))
+            connections.close_all()
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        self.assertIsNot(seen[0][0], reader)
+        self.assertEqual(seen[0][1], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,16 +3,27 @@ tests/test_db.py
 
 This module contains unit tests for the database module functions.
 It tests the creation of the jobs table, the insertion of job data,
-and that every inserted job record has a non-empty 'company' field.
+that every inserted job record has a non-empty 'company' field,
+and that streaming ingest keeps memory flat on large feeds.
 """
 
+import hashlib
 import os
 import sqlite3
 import json
+import subprocess
+import sys
 import tempfile
 import time
 import unittest
+import connections
 import database
+import descriptions
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 class TestDatabaseFunctions(unittest.TestCase):
     """Unit tests for database functions."""
@@ -26,6 +37,7 @@ class TestDatabaseFunctions(unittest.TestCase):
 
     def tearDown(self):
         """Delete the temporary database file after each test."""
+        connections.close_all()
         for _ in range(3):
             try:
                 os.remove(self.db_path)
@@ -150,5 +162,299 @@ class TestDatabaseFunctions(unittest.TestCase):
         for (company,) in rows:
             self.assertTrue(company, "A job record has an empty 'company' field.")
 
+class TestSourceAdapters(unittest.TestCase):
+    """Unit tests for the adapter registry and batched normalization."""
+
+    def test_normalize_batch(self):
+        """Each adapter maps its feed's fields onto the jobs columns and keys the rows."""
+        salaries = ["", "50,000-70,000", "50000 - 70000.5", "65000", "$50k", "50000-", None]
+        jobs = [
+            {"id": f"j{i}", "title": f"Job{i}", "company": "" if i == 3 else "Company",
+             "employmentType": "Full-time", "salaryRange": salary,
+             "jobProviders": [{"jobProvider": "x"}, {"url": f"http://example.com/{i}"}]}
+            for i, salary in enumerate(salaries)
+        ]
+        amounts = {0: (0, 0), 1: (50000.0, 70000.0), 2: (50000.0, 70000.5),
+                   4: (0, 0), 5: (0, 0), 6: (0, 0)}
+        expected = [(f"Job{i}", "Company", None, None, "Full-time", None) + salary
+                    + ("no", f"http://example.com/{i}") for i, salary in amounts.items()]
+        rows = database.normalize_batch(jobs, "job-data")
+        self.assertEqual([row[:10] for row in rows], expected)
+        self.assertEqual([row[10] for row in rows], [f"j{i}" for i in amounts])
+
+        jobs2 = [
+            {"title": f"Job{i}", "company": "Company", "job_type": "fulltime",
+             "min_amount": amount, "max_amount": "9", "is_remote": remote,
+             "job_url": None if i % 2 else "http://a", "job_url_direct": "http://b"}
+            for i, (amount, remote) in enumerate([("1", True), (None, "1"), ("x", 0), (2.5, "no")])
+        ]
+        expected = [(f"Job{i}", "Company", None, None, "fulltime", None, low, 9.0, remote, url)
+                    for i, (low, remote, url) in enumerate([
+                        (1.0, "yes", "http://a"), (0.0, "yes", "http://b"),
+                        (0.0, "no", "http://a"), (2.5, "no", "http://b")])]
+        rows = database.normalize_batch(jobs2, "job-data2")
+        self.assertEqual([row[:10] for row in rows], expected)
+        # jobs without an id of their own are keyed on a hash of who and where they are
+        self.assertEqual([row[10] for row in rows], list(map(database.hash_source_id, expected)))
+        self.assertEqual(rows[0][11], hashlib.sha1("\x1f".join(map(str, expected[0]))
+                                                   .encode("utf-8")).hexdigest())
+
+    def test_detect_adapter(self):
+        """The feed format is detected from a single record."""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with open(os.path.join(root, "job-data.json"), "r", encoding="utf-8") as f:
+            first = json.load(f)[0]
+        self.assertEqual(database.detect_adapter(first)["name"], "job-data")
+        self.assertEqual(database.detect_adapter({"job_type": "x", "is_remote": True})["name"],
+                         "job-data2")
+
+
+class TestStreamingIngest(unittest.TestCase):
+    """Unit tests for the streaming ingest mode."""
+
+    def setUp(self):
+        """Create a temporary database file and initialize the jobs table."""
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp:
+            self.db_path = tmp.name
+        database.DB_NAME = self.db_path
+        database.create_table()
+
+    def tearDown(self):
+        """Delete the temporary database file after each test."""
+        connections.close_all()
+        os.remove(self.db_path)
+
+    def test_stream_matches_save_job_data(self):
+        """Streaming with a tiny read size inserts the same rows as save_job_data."""
+        sample_data = [
+            {
+                "title": f"Job{i}",
+                "company": f"Company{i}" if i % 3 else "",
+                "description": "Desc, with [brackets] and \"quotes\" " * i,
+                "location": "Loc",
+                "employmentType": "Full-Time",
+                "datePosted": "2025-01-01",
+                "salaryRange": "50,000-70,000",
+                "jobProviders": [{"url": f"http://example.com/{i}"}]
+            }
+            for i in range(25)
+        ]
+        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix=".json") as temp_json:
+            json.dump(sample_data, temp_json, indent=4)
+            json_file_path = temp_json.name
+
+        self.assertEqual(list(database.iter_json_array(json_file_path, chunk_size=7)),
+                         sample_data)
+        database.save_job_data(json_file_path)
+        expected = self._stored_jobs()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("DELETE FROM jobs")
+
+        inserted = database.stream_job_data(json_file_path, batch_size=4)
+        os.remove(json_file_path)
+
+        rows = self._stored_jobs()
+        self.assertEqual(inserted, 16)
+        self.assertEqual([row[1:] for row in rows], [row[1:] for row in expected])
+        self.assertIn("[brackets]", rows[-1][3])
+
+    def _stored_jobs(self):
+        """Return the jobs rows with their description read back from job_descriptions."""
+        with sqlite3.connect(self.db_path) as conn:
+            text = descriptions.text_function(conn)
+            rows = conn.execute(
+                """
+                SELECT jobs.*, codec, body FROM jobs
+                LEFT JOIN job_descriptions ON job_descriptions.job_id = jobs.id ORDER BY id
+                """
+            ).fetchall()
+        return [row[:3] + (text(*row[-2:]),) + row[4:-2] for row in rows]
+
+    def test_bulk_insert_batches_and_pragmas(self):
+        """bulk_insert writes every row across batches and applies the given pragmas."""
+        rows = [(f"Job{i}", "Company", "Desc", "Loc", "Full-Time", "2025-01-01",
+                 1.0, 2.0, "no", None, f"id-{i}", "hash") for i in range(10)]
+        inserted = database.bulk_insert(iter(rows), batch_size=3,
+                                        pragmas={"journal_mode": "WAL", "synchronous": "OFF"})
+        with sqlite3.connect(self.db_path) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(inserted, 10)
+        self.assertEqual(count, 10)
+        self.assertEqual(journal_mode, "wal")
+        with self.assertRaises(ValueError):
+            database.bulk_insert(rows, pragmas={"cache_size; DROP TABLE jobs": 1})
+
+    def test_reingest_upserts_and_keeps_ids(self):
+        """Re-ingesting skips identical jobs, updates changed ones in place and adds new ones."""
+        sample_data = [
+            {"id": f"job-{i}", "title": f"Job{i}", "company": "Company",
+             "description": f"Desc{i}", "salaryRange": "50000-70000"}
+            for i in range(5)
+        ]
+        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix=".json") as temp_json:
+            json.dump(sample_data, temp_json)
+            json_file_path = temp_json.name
+        self.assertEqual(database.stream_job_data(json_file_path), 5)
+        with sqlite3.connect(self.db_path) as conn:
+            ids = dict(conn.execute("SELECT source_id, id FROM jobs"))
+
+        # loading the same feed again, even after create_table, changes nothing
+        database.create_table()
+        self.assertEqual(database.stream_job_data(json_file_path), 0)
+
+        sample_data[2]["description"] = "Changed"
+        sample_data.append({"id": "job-5", "title": "Job5", "company": "Company"})
+        with open(json_file_path, "w", encoding="utf-8") as f:
+            json.dump(sample_data, f)
+        self.assertEqual(database.stream_job_data(json_file_path), 2)
+        os.remove(json_file_path)
+
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT source_id, id, body FROM jobs JOIN job_descriptions ON job_id = id"
+            ).fetchall()
+        self.assertEqual(len(rows), 6)
+        for source_id, job_id, description in rows:
+            if source_id in ids:
+                self.assertEqual(job_id, ids[source_id])
+            if source_id == "job-2":
+                self.assertEqual(description, "Changed")
+
+    def test_upgrade_from_unkeyed_database(self):
+        """Jobs a version without source ids wrote are loaded again once, not duplicated."""
+        connections.close_all()
+        os.remove(self.db_path)
+        # the jobs table as the first version created it
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, company TEXT,
+                description TEXT, location TEXT, job_type TEXT, date_posted TEXT,
+                min_amount REAL, max_amount REAL, is_remote TEXT, job_url TEXT
+            )
+        """)
+        conn.execute("INSERT INTO jobs (title, company, description) "
+                     "VALUES ('Job1', 'Company', 'Desc1')")
+        conn.commit()
+        conn.close()
+
+        database.create_table()
+        sample_data = [{"id": "job-1", "title": "Job1", "company": "Company",
+                        "description": "Desc1"}]
+        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix=".json") as temp_json:
+            json.dump(sample_data, temp_json)
+            json_file_path = temp_json.name
+        database.sync_job_data([(json_file_path, "job-data")])
+        database.create_table()
+        database.sync_job_data([(json_file_path, "job-data")], force=True)
+        os.remove(json_file_path)
+
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT source_id, title FROM jobs").fetchall()
+        self.assertEqual(rows, [("job-1", "Job1")])
+
+    def test_upgrade_backfills_posted_date(self):
+        """Jobs stored before posted_date existed get it from their date_posted once."""
+        connections.close_all()
+        os.remove(self.db_path)
+        # the jobs table of a version that keyed jobs but had no posted_date
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, company TEXT,
+                description TEXT, location TEXT, job_type TEXT, date_posted TEXT,
+                min_amount REAL, max_amount REAL, is_remote TEXT, job_url TEXT,
+                source_id TEXT, content_hash TEXT
+            )
+        """)
+        conn.executemany("INSERT INTO jobs (title, date_posted, source_id) VALUES (?, ?, ?)",
+                         [("Job1", "2025-01-05T10:00:00", "job-1"), ("Job2", "", "job-2")])
+        conn.commit()
+        conn.close()
+
+        database.create_table()
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT title, posted_date FROM jobs ORDER BY id").fetchall()
+        self.assertEqual(rows, [("Job1", "2025-01-05"), ("Job2", None)])
+
+    def test_sync_skips_unchanged_files(self):
+        """sync_job_data only processes files whose fingerprint changed."""
+        sample_data = [{"id": "job-1", "title": "Job1", "company": "Company"}]
+        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix=".json") as temp_json:
+            json.dump(sample_data, temp_json)
+            json_file_path = temp_json.name
+        sources = [(json_file_path, "job-data"), (json_file_path + ".missing", None)]
+
+        self.assertEqual(database.sync_job_data(sources), [json_file_path])
+        self.assertEqual(database.sync_job_data(sources), [])
+        # touching the file without changing it only refreshes the manifest
+        os.utime(json_file_path, (time.time() + 10, time.time() + 10))
+        self.assertEqual(database.sync_job_data(sources), [])
+        self.assertEqual(database.sync_job_data(sources, force=True), [json_file_path])
+
+        with sqlite3.connect(self.db_path) as conn:
+            ids = conn.execute("SELECT id FROM jobs").fetchall()
+        # a forced re-ingest reads the file again but keeps the jobs and their ids
+        database.clear_manifest()
+        self.assertEqual(database.sync_job_data(sources), [json_file_path])
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT id FROM jobs").fetchall(), ids)
+
+        sample_data.append({"id": "job-2", "title": "Job2", "company": "Company"})
+        with open(json_file_path, "w", encoding="utf-8") as f:
+            json.dump(sample_data, f)
+        self.assertEqual(database.sync_job_data(sources), [json_file_path])
+        os.remove(json_file_path)
+
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0], 2)
+
+    @unittest.skipIf(resource is None, "resource module is not available")
+    def test_stream_peak_memory_is_flat(self):
+        """Streaming a large synthetic feed must not grow peak RSS with the feed size."""
+        job = {
+            "title": "Software Engineer",
+            "company": "Company",
+            "description": "x" * 4000,
+            "location": "Boston, MA",
+            "job_type": "fulltime",
+            "date_posted": "2025-01-01",
+            "min_amount": "50000",
+            "max_amount": "70000",
+            "is_remote": True,
+            "job_url": "http://example.com"
+        }
+        with tempfile.NamedTemporaryFile(delete=False, mode='w', suffix=".json") as temp_json:
+            temp_json.write("[")
+            for i in range(10000):
+                temp_json.write(("," if i else "") + json.dumps(dict(job, id=f"job-{i}")))
+            temp_json.write("]")
+            json_file_path = temp_json.name
+        feed_size = os.path.getsize(json_file_path)
+
+        # measure in a child process so the test runner's own memory does not count
+        script = (
+            "import resource, sys, database\n"
+            "database.DB_NAME = sys.argv[1]\n"
+            "before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+            "if sys.argv[2] != '-':\n"
+            "    database.stream_job_data(sys.argv[2], 'job-data2')\n"
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, "-c", script, self.db_path, json_file_path],
+                                cwd=root, capture_output=True, text=True, check=True)
+        os.remove(json_file_path)
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        growth = int(result.stdout.strip()) * scale
+
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0], 10000)
+        self.assertLess(growth, feed_size // 4,
+                        f"peak RSS grew by {growth} bytes for a {feed_size} byte feed")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,124 @@
+"""
+tests/test_dedup.py
+
+This module contains unit tests for near-duplicate job detection.
+It checks that MinHash signatures estimate description similarity, that
+reworded copies of a posting end up in one cluster with the first copy as its
+canonical row, and that changed jobs and a new threshold are re-clustered.
+"""
+import json
+import os
+import random
+import tempfile
+import unittest
+import connections
+import database
+import dedup
+import gui
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+
+def description(seed, length=120):
+    """Return a random description; the same seed gives the same text."""
+    return " ".join(random.Random(seed).choices(WORDS, k=length))
+
+
+def reword(text, changes, seed=0):
+    """Return text with changes of its words replaced."""
+    rng = random.Random(seed)
+    words = text.split()
+    for i in rng.sample(range(len(words)), changes):
+        words[i] = "changed"
+    return " ".join(words)
+
+
+class TestSignatures(unittest.TestCase):
+    """Unit tests for shingling, signatures and banding."""
+
+    def test_similarity_estimate(self):
+        """Signatures of similar texts agree about as often as their shingles overlap."""
+        text = description(1)
+        self.assertEqual(dedup.similarity(dedup.signature(text), dedup.signature(text)), 1.0)
+        near = dedup.similarity(dedup.signature(text), dedup.signature(reword(text, 2)))
+        self.assertGreater(near, 0.75)
+        far = dedup.similarity(dedup.signature(text), dedup.signature(description(2)))
+        self.assertLess(far, 0.1)
+        self.assertIsNone(dedup.signature("  "))
+
+    def test_lsh_params(self):
+        """A higher threshold means fewer, wider bands."""
+        self.assertEqual(dedup.lsh_params(0.8), (8, 8))
+        self.assertEqual(dedup.lsh_params(0.5), (16, 4))
+        bands, rows = dedup.lsh_params(0.9)
+        self.assertLessEqual(bands * rows, dedup.NUM_HASHES)
+        self.assertLess(bands, 8)
+
+
+class TestUpdateClusters(unittest.TestCase):
+    """Unit tests for update_clusters against a temporary database."""
+
+    def setUp(self):
+        """Create a temporary database with three postings, two of them copied."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        database.DB_NAME = os.path.join(self.tmp.name, "jobs.db")
+        database.create_table()
+        first, second = description(10), description(20)
+        self.jobs = [
+            {"id": "a", "title": "Engineer", "company": "Acme", "description": first},
+            {"id": "b", "title": "Analyst", "company": "Initech", "description": second},
+            {"id": "c", "title": "Engineer (via board)", "company": "Acme",
+             "description": reword(first, 2)},
+            {"id": "d", "title": "Designer", "company": "Hooli", "description": description(30)},
+            {"id": "e", "title": "Analyst", "company": "Initech", "description": second},
+            {"id": "f", "title": "No description", "company": "Acme", "description": ""},
+        ]
+        self._ingest()
+
+    def tearDown(self):
+        """Close the connections and delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def _ingest(self):
+        feed = os.path.join(self.tmp.name, "feed.json")
+        with open(feed, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f)
+        database.stream_job_data(feed, "job-data2")
+
+    def _clusters(self):
+        conn = connections.reader(database.DB_NAME)
+        return dict(conn.execute("SELECT source_id, cluster_id FROM jobs"))
+
+    def test_near_duplicates_share_a_cluster(self):
+        """Copies join the cluster of the first copy and get_jobs can skip them."""
+        self.assertEqual(dedup.update_clusters(), 6)
+        self.assertEqual(self._clusters(), {"a": 1, "b": 2, "c": 1, "d": 4, "e": 2, "f": 6})
+        self.assertEqual([title for _, title in gui.get_jobs(canonical_only=True)],
+                         ["Engineer", "Analyst", "Designer", "No description"])
+        self.assertEqual(len(gui.get_jobs()), 6)
+        # nothing new, nothing to do
+        self.assertEqual(dedup.update_clusters(), 0)
+
+    def test_changed_jobs_are_reclustered(self):
+        """A changed canonical row is re-clustered together with its members."""
+        dedup.update_clusters()
+        self.jobs[0]["description"] = description(40)
+        self._ingest()
+        self.assertEqual(dedup.update_clusters(), 2)
+        self.assertEqual(self._clusters()["a"], 1)
+        self.assertEqual(self._clusters()["c"], 3)
+
+    def test_threshold(self):
+        """A threshold above the copies' similarity separates them; a new threshold reclusters."""
+        dedup.update_clusters()
+        self.assertEqual(dedup.update_clusters(threshold=0.99), 6)
+        self.assertEqual(self._clusters()["c"], 3)
+        self.assertEqual(self._clusters()["e"], 2)
+        self.assertEqual(dedup.update_clusters(threshold=0.99, rebuild=True), 6)
+        with self.assertRaises(ValueError):
+            dedup.update_clusters(threshold=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+tests/test_descriptions.py
+
+This module contains unit tests for the compressed description store.
+It checks that descriptions round-trip through compression, that jobs rows no
+longer carry the description text, that opening a job and searching still see
+it, that a database with inline descriptions is migrated, and that paragraphs
+shared by several descriptions are stored once and counted.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+import connections
+import database
+import descriptions
+import gui
+import search
+
+
+class TestCompress(unittest.TestCase):
+    """Unit tests for compress and decompress."""
+
+    def test_round_trip(self):
+        """Long text is compressed, short text is stored as it is."""
+        text = "Design and build data pipelines. " * 50
+        codec, body = descriptions.compress(text)
+        self.assertEqual(codec, "zlib")
+        self.assertLess(len(body), len(text))
+        self.assertEqual(descriptions.decompress(codec, body), text)
+        self.assertEqual(descriptions.compress("Short."), ("none", "Short."))
+        self.assertEqual(descriptions.compress(None), ("none", ""))
+        self.assertEqual(descriptions.compress(text, codec="none"), ("none", text))
+        self.assertIsNone(descriptions.decompress(None, None))
+        with self.assertRaises(ValueError):
+            descriptions.compress(text, codec="lz4")
+
+    def test_paragraph_references(self):
+        """Dictionary paragraphs are stored as ids and looked up again."""
+        shared = "We are an equal opportunity employer. " * 3
+        text = f"Intro.\n\n{shared}\n\nApply today."
+        ids = {descriptions.paragraph_digest(shared): 7}
+        codec, body = descriptions.compress(text, paragraph_ids=ids)
+        self.assertTrue(codec.startswith(descriptions.DICT_PREFIX))
+        self.assertEqual(descriptions.paragraph_refs(codec, body), [7])
+        self.assertEqual(descriptions.decompress(codec, body, {7: shared}.get), text)
+        # nothing shared: stored as before
+        self.assertEqual(descriptions.compress("Intro.", paragraph_ids=ids), ("none", "Intro."))
+
+
+class TestDescriptionStore(unittest.TestCase):
+    """Unit tests for job_descriptions against a temporary database."""
+
+    def setUp(self):
+        """Create a temporary database path."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.db_path = os.path.join(self.tmp.name, "jobs.db")
+        database.DB_NAME = self.db_path
+        self.text = "Build Kubernetes operators in Go for our platform team. " * 20
+
+    def tearDown(self):
+        """Close the connections and delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def _ingest(self, jobs):
+        feed = os.path.join(self.tmp.name, "feed.json")
+        with open(feed, "w", encoding="utf-8") as f:
+            json.dump(jobs, f)
+        return database.stream_job_data(feed, "job-data2")
+
+    def test_lazy_description(self):
+        """Only job_descriptions holds the text; details and search decompress it."""
+        database.create_table()
+        self._ingest([{"id": "a", "title": "Platform Engineer", "company": "Acme",
+                       "description": self.text}])
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertIsNone(conn.execute("SELECT description FROM jobs").fetchone()[0])
+            codec, = conn.execute("SELECT codec FROM job_descriptions").fetchone()
+        self.assertEqual(codec, "zlib")
+        self.assertEqual(gui.get_job_details(1)[3], self.text)
+        self.assertEqual([job[0] for job in search.search_jobs("kubernetes")], [1])
+
+        # a changed description is re-indexed; an unchanged feed writes nothing
+        self._ingest([{"id": "a", "title": "Platform Engineer", "company": "Acme",
+                       "description": "Terraform modules."}])
+        self.assertEqual(search.search_jobs("kubernetes"), [])
+        self.assertEqual([job[0] for job in search.search_jobs("terraform")], [1])
+        self.assertEqual(self._ingest([{"id": "a", "title": "Platform Engineer",
+                                        "company": "Acme", "description": "Terraform modules."}]),
+                         0)
+
+    def test_repeated_source_id_in_one_batch(self):
+        """A job repeated within one batch is indexed once, with its last version."""
+        database.create_table()
+        self._ingest([{"id": "a", "title": "Platform Engineer", "company": "Acme",
+                       "description": self.text},
+                      {"id": "a", "title": "Site Reliability Engineer", "company": "Acme",
+                       "description": "Terraform modules."}])
+        # raises "database disk image is malformed" if the index lost track of the job
+        with connections.writer(self.db_path) as conn:
+            conn.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('integrity-check')")
+        self.assertEqual([job[0] for job in search.search_jobs("terraform")], [1])
+        self.assertEqual(search.search_jobs("platform"), [])
+
+    def test_shared_paragraphs(self):
+        """Repeated paragraphs are stored once and dropped when nothing uses them."""
+        database.create_table()
+        boilerplate = "Acme is an equal opportunity employer and values diversity. " * 3
+        jobs = [{"id": str(i), "title": f"Job {i}", "company": "Acme",
+                 "description": f"Role {i} builds things.\n\n{boilerplate}"} for i in range(3)]
+        self._ingest(jobs)
+        saved, shared = database.paragraph_report()
+        size = len(boilerplate)
+        self.assertEqual(saved, 2 * size)
+        self.assertEqual(shared, [(3, size, boilerplate)])
+        self.assertEqual(gui.get_job_details(2)[3], jobs[1]["description"])
+        self.assertEqual([job[0] for job in search.search_jobs("diversity")], [1, 2, 3])
+
+        for job in jobs:
+            job["description"] = "Rewritten."
+        self._ingest(jobs)
+        self.assertEqual(database.paragraph_report(), (0, []))
+        self.assertEqual(search.search_jobs("diversity"), [])
+
+    def test_paragraph_id_reused_after_rollback(self):
+        """A paragraph id handed out again after a rollback is not read from the cache."""
+        database.create_table()
+        conn = connections.writer(self.db_path)
+        text = descriptions.text_function(conn)
+        for paragraph in ("First boilerplate. " * 5, "Second boilerplate. " * 5):
+            paragraph_id = database.store_paragraphs(conn, [paragraph, paragraph])[
+                descriptions.paragraph_digest(paragraph)]
+            codec, body = descriptions.compress(paragraph, paragraph_ids={
+                descriptions.paragraph_digest(paragraph): paragraph_id})
+            self.assertEqual(text(codec, body), paragraph)
+            conn.rollback()
+        self.assertEqual(paragraph_id, 1)
+
+    def test_inline_descriptions_are_moved(self):
+        """create_table moves descriptions out of a database from an older version."""
+        # the jobs table of a version that kept descriptions inline
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, "
+                         "company TEXT, description TEXT, location TEXT, job_type TEXT, "
+                         "date_posted TEXT, min_amount REAL, max_amount REAL, "
+                         "is_remote TEXT, job_url TEXT, source_id TEXT, content_hash TEXT)")
+            conn.execute("INSERT INTO jobs (title, company, description, source_id) "
+                         "VALUES (?, ?, ?, ?)", ("Platform Engineer", "Acme", self.text, "1"))
+        database.create_table()
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertIsNone(conn.execute("SELECT description FROM jobs").fetchone()[0])
+        self.assertEqual(gui.get_job_details(1)[3], self.text)
+        self.assertEqual([job[0] for job in search.search_jobs("operators")], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
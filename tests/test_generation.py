@@ -0,0 +1,185 @@
+"""
+tests/test_generation.py
+
+This module contains unit tests for background resume and cover letter generation.
+The model, file saving and PDF steps of main.py are replaced with stand-ins. It
+checks that tasks report their progress as events, that several run at once,
+that cancelled and failing tasks end without saving anything, that a
+streamed answer is posted and written to its Markdown file as it arrives, and
+that both documents of a combined generation are saved.
+"""
+import os
+import queue
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import artifacts
+import connections
+import database
+import generation
+import main
+import sessions
+
+
+class TestGenerations(unittest.TestCase):
+    """Unit tests for generation.Generations."""
+
+    def setUp(self):
+        """Replace the steps in main.py and collect posted events in a queue."""
+        self.events = queue.Queue()
+        # task id -> [(status, detail), ...] taken off the queue so far
+        self.posted = {}
+        self.release = threading.Event()
+        self.saved = []
+        patches = {
+            # sessions on a stand-in model
+            "SESSIONS": sessions.SessionPool(mock.Mock),
+            "create_resume": mock.Mock(side_effect=self._create),
+            "create_cover_letter": mock.Mock(side_effect=self._create),
+            "create_resume_and_cover_letter": mock.Mock(side_effect=self._create_both),
+            "save_resume": mock.Mock(side_effect=self._save),
+            "save_cover_letter": mock.Mock(side_effect=self._save),
+            "convert_text_to_pdf": mock.Mock(side_effect=lambda path, _text=None: path + ".pdf"),
+        }
+        for name, stand_in in patches.items():
+            patcher = mock.patch(f"main.{name}", stand_in)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmp.cleanup)
+        self.markdown_folder = os.path.join(tmp.name, "markdown_files")
+        for name, value in (("main.MARKDOWN_FOLDER", self.markdown_folder),
+                            ("database.DB_NAME", os.path.join(tmp.name, "jobs.db"))):
+            patcher = mock.patch(name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        database.create_table()
+        self.addCleanup(connections.close_all)
+        self.generations = generation.Generations(lambda event, value: self.events.put(value))
+        self.addCleanup(self.generations.shutdown)
+
+    def _create(self, _chat, job_description, _personal_description, on_chunk=None,
+                **_options):
+        self.release.wait(5)
+        if job_description == "broken":
+            raise RuntimeError("quota exceeded")
+        if on_chunk:
+            # the "\r\n" is split between two pieces
+            for piece in ("# Resume\r", "\nfor ", job_description):
+                on_chunk(piece)
+            return f"# Resume\r\nfor {job_description}"
+        return f"document for {job_description}"
+
+    def _create_both(self, chat, job_description, personal_description, on_chunk=None,
+                     **options):
+        resume = self._create(chat, job_description, personal_description, **options)
+        if on_chunk:
+            for piece in (resume, "\n===COVER LETTER===\n", "letter"):
+                on_chunk(piece)
+        return resume, f"letter for {job_description}"
+
+    def _save(self, document, _source=None):
+        self.saved.append(document)
+        return f"doc{len(self.saved)}.md"
+
+    def _statuses(self, task_id, last):
+        """Return the statuses task_id has posted, waiting until last is among them."""
+        while last not in [status for status, _ in self.posted.get(task_id, [])]:
+            event_task, status, detail = self.events.get(timeout=5)
+            self.posted.setdefault(event_task, []).append((status, detail))
+        return [status for status, _ in self.posted[task_id]]
+
+    def test_tasks_run_at_once(self):
+        """Two tasks are generating at the same time, and both save their document."""
+        first = self.generations.start("resume", "job a", "me")
+        second = self.generations.start("cover letter", "job b", "me")
+        self.assertEqual(self._statuses(first, generation.GENERATING),
+                         [generation.QUEUED, generation.GENERATING])
+        self.assertEqual(self._statuses(second, generation.GENERATING),
+                         [generation.QUEUED, generation.GENERATING])
+        self.assertEqual(sorted(self.generations.running()), [first, second])
+        self.release.set()
+        self.assertEqual(self._statuses(first, generation.DONE)[-2:],
+                         [generation.SAVING, generation.DONE])
+        self._statuses(second, generation.DONE)
+        self.assertEqual(sorted(self.saved), ["document for job a", "document for job b"])
+        self.assertEqual(self.generations.running(), [])
+
+    def test_cancel_and_failure(self):
+        """A cancelled task saves nothing; a failing one reports its error."""
+        cancelled = self.generations.start("resume", "job a", "me")
+        failing = self.generations.start("resume", "broken", "me")
+        self._statuses(cancelled, generation.GENERATING)
+        self.generations.cancel(cancelled)
+        self.release.set()
+        self.assertEqual(self._statuses(cancelled, generation.CANCELLED)[-1],
+                         generation.CANCELLED)
+        self._statuses(failing, generation.FAILED)
+        self.assertEqual(self.posted[failing][-1], (generation.FAILED, "quota exceeded"))
+        self.assertEqual(self.saved, [])
+        with self.assertRaises(ValueError):
+            self.generations.start("poem", "job a", "me")
+
+    def test_stream(self):
+        """Streamed pieces are posted and written to the Markdown file as they arrive."""
+        patcher = mock.patch("artifacts.EXPORT_ON_SAVE", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        task_id = self.generations.start("resume", "job a", "me", stream=True)
+        self.release.set()
+        statuses = self._statuses(task_id, generation.DONE)
+        self.assertEqual(statuses, [generation.QUEUED, generation.GENERATING]
+                         + [generation.STREAMING] * 3 + [generation.SAVING, generation.DONE])
+        pieces = [detail for status, detail in self.posted[task_id]
+                  if status == generation.STREAMING]
+        self.assertEqual("".join(pieces), "# Resume\r\nfor job a")
+        md_filename, pdf_filename = self.posted[task_id][-1][1]
+        self.assertEqual(md_filename, os.path.join(self.markdown_folder, "0000", "resume-1.md"))
+        self.assertEqual(pdf_filename, md_filename + ".pdf")
+        with open(md_filename, encoding="utf-8", newline="") as f:
+            self.assertEqual(f.read(), "# Resume\nfor job a")
+        self.assertEqual(artifacts.read(md_filename), b"# Resume\nfor job a")
+        self.assertGreaterEqual(self.generations.first_token[task_id], 0)
+        self.assertEqual(self.saved, [])
+
+    def test_cancel_stream(self):
+        """A streamed task cancelled before its first piece leaves no file behind."""
+        task_id = self.generations.start("cover letter", "job a", "me", stream=True)
+        self._statuses(task_id, generation.GENERATING)
+        self.generations.cancel(task_id)
+        self.release.set()
+        self.assertEqual(self._statuses(task_id, generation.CANCELLED)[-1],
+                         generation.CANCELLED)
+        self.assertEqual(os.listdir(os.path.join(self.markdown_folder, "0000")), [])
+        self.assertEqual(artifacts.find(), [])
+
+    def test_combined(self):
+        """Both documents of a combined task are saved, streamed or not."""
+        task_id = self.generations.start("resume and cover letter", "job a", "me")
+        streamed = self.generations.start("resume and cover letter", "job b", "me", stream=True)
+        self.release.set()
+        self._statuses(task_id, generation.DONE)
+        resume_md, resume_pdf, letter_md, letter_pdf = self.posted[task_id][-1][1]
+        self.assertEqual((resume_pdf, letter_pdf), (resume_md + ".pdf", letter_md + ".pdf"))
+        self.assertNotEqual(resume_md, letter_md)
+        self.assertEqual(self._statuses(streamed, generation.DONE).count(generation.STREAMING),
+                         3)
+        self.assertEqual(sorted(self.saved), ["document for job a", "document for job b",
+                                              "letter for job a", "letter for job b"])
+
+    def test_send_prompt_streams(self):
+        """send_prompt passes each streamed piece on and returns the whole answer."""
+        chat = mock.Mock()
+        chat.send_message.return_value = [mock.Mock(parts=[1], text="# Cover"),
+                                          mock.Mock(parts=[1], text=" letter"),
+                                          mock.Mock(parts=[])]
+        pieces = []
+        self.assertEqual(main.send_prompt(chat, "prompt", on_chunk=pieces.append),
+                         "# Cover letter")
+        self.assertEqual(pieces, ["# Cover", " letter"])
+        chat.send_message.assert_called_once_with("prompt", stream=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,12 +8,24 @@ all the data is returned to be displayed in Job Details.
 
 Test 2: when the user saves their profile, their information
 gets inserted into the database properly.
+
+Test 3: the filter controls are turned into search.filter_jobs filters, and the
+token budget box into a number of tokens.
+
+Test 4: the job list is read a page at a time and recent pages are cached.
+
+Test 5: generation events update the Generations list and the preview, and the
+selected job is looked up from the job list.
 """
 import os
 import sqlite3
 import tempfile
 import time
 import unittest
+from unittest import mock
+import connections
+import database
+import generation
 import gui
 
 # Test 1
@@ -65,7 +77,7 @@ class TestUserProfileInsertion(unittest.TestCase):
         with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp:
             self.db_path = tmp.name
         # override jobs.db to temp db
-        gui.DB_NAME = self.db_path
+        database.DB_NAME = self.db_path
 
         # drop the user_profiles table if it exists
         conn = sqlite3.connect(self.db_path)
@@ -86,6 +98,7 @@ class TestUserProfileInsertion(unittest.TestCase):
 
     def tearDown(self):  # pylint:disable=duplicate-code
         """Delete the temporary database file after each test."""
+        connections.close_all()
         for _ in range(3):
             try:
                 os.remove(self.db_path)
@@ -140,5 +153,115 @@ class TestUserProfileInsertion(unittest.TestCase):
         self.assertEqual(record, expected)
 
 
+# Test 3
+class TestReadFilters(unittest.TestCase):
+    """Unit tests for reading the job filter controls."""
+    def test_read_filters(self):
+        """Blank controls are unset filters and bad numbers or dates are rejected."""
+        values = {"-MIN_SALARY-": " 90,000 ", "-REMOTE-": True, "-JOB_TYPE-": gui.ANY_JOB_TYPE,
+                  "-LOCATION-": " Boston ", "-POSTED_SINCE-": "2025-02-01"}
+        self.assertEqual(gui.read_filters(values), {
+            "min_salary": 90000.0, "is_remote": "yes", "job_type": None,
+            "location": "Boston", "posted_since": "2025-02-01"})
+        values.update({"-MIN_SALARY-": "", "-REMOTE-": False, "-JOB_TYPE-": "contract"})
+        self.assertEqual(gui.read_filters(values)["min_salary"], None)
+        self.assertEqual(gui.read_filters(values)["is_remote"], None)
+        self.assertEqual(gui.read_filters(values)["job_type"], "contract")
+        for key, bad in (("-MIN_SALARY-", "lots"), ("-POSTED_SINCE-", "last week")):
+            with self.assertRaises(ValueError):
+                gui.read_filters(dict(values, **{key: bad}))
+
+    def test_read_token_budget(self):
+        """The token budget is a positive whole number."""
+        self.assertEqual(gui.read_token_budget({"-TOKEN_BUDGET-": " 2,000 "}), 2000)
+        for bad in ("", "lots", "0", "1500.5"):
+            with self.assertRaises(ValueError):
+                gui.read_token_budget({"-TOKEN_BUDGET-": bad})
+
+
+# Test 4
+class TestJobPager(unittest.TestCase):
+    """Unit tests for paging through the job list."""
+
+    def setUp(self):
+        """Create a temporary database with 25 jobs of three job types."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        database.DB_NAME = os.path.join(self.tmp.name, "jobs.db")
+        database.create_table()
+        database.bulk_insert([(f"Job{i}", "Company", "", "Loc", ["fulltime", "contract", ""][i % 3],
+                               "", None, None, "no", None, f"id-{i}", "hash")
+                              for i in range(25)])
+
+    def tearDown(self):
+        """Close the connections and delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def test_pages(self):
+        """Next and Prev walk keyset pages; neighbouring pages come from the cache."""
+        calls = []
+
+        def fetch(after_id, limit):
+            calls.append(after_id)
+            return gui.get_jobs_page(after_id, limit)
+
+        pager = gui.JobPager(fetch, page_size=10, cache_size=2)
+        self.assertEqual([row[0] for row in pager.current()], list(range(1, 11)))
+        self.assertEqual(pager.next()[0], (11, "Job10"))
+        self.assertEqual([row[0] for row in pager.next()], list(range(21, 26)))
+        self.assertIsNone(pager.next())
+        self.assertEqual(pager.number, 2)
+        # pages 1 and 2 are cached; page 0 was evicted and is fetched again
+        self.assertEqual(pager.previous()[0][0], 11)
+        self.assertEqual(calls, [0, 10, 20])
+        self.assertEqual(pager.previous()[0][0], 1)
+        self.assertIsNone(pager.previous())
+        self.assertEqual(calls, [0, 10, 20, 0])
+        # prefetch loads the next page ahead of Next
+        del calls[:]
+        pager = gui.JobPager(fetch, page_size=10)
+        pager.current()
+        pager.prefetch()
+        self.assertEqual(pager.next()[0][0], 11)
+        self.assertEqual(calls, [0, 10])
+        self.assertIsNone(gui.JobPager(fetch, page_size=30).next())
+
+    def test_job_types(self):
+        """The job type filter lists each non-empty job type once, in order."""
+        self.assertEqual(gui.get_job_types(), ["contract", "fulltime"])
+
+
+# Test 5
+class TestShowGenerationEvent(unittest.TestCase):
+    """Unit tests for showing generation progress in a stand-in window."""
+
+    def test_show_generation_event(self):
+        """Streamed text goes to the preview; the list shows the first piece and the end."""
+        window = {"-PREVIEW-": mock.Mock(), "-TASKS-": mock.Mock()}
+        tasks, previews = {1: ["Resume for Engineer", generation.QUEUED]}, {1: []}
+        for value in [(1, generation.STREAMING, "# Ada"), (1, generation.STREAMING, " Lovelace"),
+                      (1, generation.DONE, ("resume.md", "resume.pdf"))]:
+            gui.show_generation_event(window, value, tasks, previews, 1, {1: 0.5})
+            if value[2] == "# Ada":
+                self.assertEqual(tasks[1][1], "writing (first text after 0.5 s)")
+        self.assertEqual(previews[1], ["# Ada", " Lovelace"])
+        self.assertEqual(window["-PREVIEW-"].update.call_count, 2)
+        self.assertEqual(window["-TASKS-"].update.call_count, 2)
+        self.assertEqual(tasks[1][1], "saved as resume.md and resume.pdf")
+        gui.show_generation_event(window, (1, generation.FAILED, "quota"), tasks, previews, 2, {})
+        self.assertEqual(tasks[1][1], "failed: quota")
+
+    def test_selected_job(self):
+        """The selected list row is looked up; no or a bad selection gives a message."""
+        with mock.patch("gui.get_job_details", side_effect=lambda job_id: (job_id, "Engineer")
+                        if job_id == 7 else None):
+            self.assertEqual(gui.selected_job({"-JOB_LIST-": ["7: Engineer"]}),
+                             ((7, "Engineer"), None))
+            for selected, error in (([], "Please select a job from the list."),
+                                    (["x: Engineer"], "Invalid job selection."),
+                                    (["8: Gone"], "Job details not found.")):
+                self.assertEqual(gui.selected_job({"-JOB_LIST-": selected}), (None, error))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,91 @@
+"""
+tests/test_ingest.py
+
+This module contains unit tests for the parallel ingest module.
+It writes job shards in both feed formats to a temporary directory,
+ingests them with several worker processes and checks what lands in the database.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+import connections
+import database
+import ingest
+
+
+class TestParallelIngest(unittest.TestCase):
+    """Unit tests for ingest_paths and its helpers."""
+
+    def setUp(self):
+        """Create a temporary directory holding the database and three shards."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.db_path = os.path.join(self.tmp.name, "jobs.db")
+        database.DB_NAME = self.db_path
+        for shard in range(2):
+            jobs = [
+                {"id": f"a-{shard}-{i}", "title": f"Job{i}", "company": "Company",
+                 "salaryRange": "50,000-70,000",
+                 "jobProviders": [{"url": f"http://example.com/{i}"}]}
+                for i in range(30)
+            ]
+            self._write(f"shard{shard}.json", jobs)
+        jobs2 = [
+            {"id": f"b-{i}", "title": f"Job{i}", "company": "Company" if i % 2 else "",
+             "min_amount": "40000", "max_amount": "60000", "is_remote": True}
+            for i in range(30)
+        ]
+        self._write("shard2.json", jobs2)
+
+    def tearDown(self):
+        """Delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def _write(self, name, jobs):
+        with open(os.path.join(self.tmp.name, name), "w", encoding="utf-8") as f:
+            json.dump(jobs, f)
+
+    def test_expand_sources(self):
+        """A directory expands to its .json files and a glob to its matches."""
+        self.assertEqual([os.path.basename(p) for p in ingest.expand_sources(self.tmp.name)],
+                         ["shard0.json", "shard1.json", "shard2.json"])
+        pattern = os.path.join(self.tmp.name, "shard[01].json")
+        self.assertEqual(len(ingest.expand_sources(pattern)), 2)
+
+    def test_ingest_paths(self):
+        """Shards of both formats are ingested once, and skipped when unchanged."""
+        paths = ingest.expand_sources(self.tmp.name)
+        stats = ingest.ingest_paths(paths, workers=2, batch_size=7)
+        self.assertEqual((stats["processed"], stats["skipped"], stats["errors"]), (3, 0, 0))
+        self.assertEqual(stats["rows"], 75)
+
+        with sqlite3.connect(self.db_path) as conn:
+            rows = dict(conn.execute("SELECT source_id, max_amount || is_remote FROM jobs"))
+        self.assertEqual(len(rows), 75)
+        self.assertEqual(rows["a-0-3"], "70000.0no")
+        self.assertEqual(rows["b-3"], "60000.0yes")
+
+        stats = ingest.ingest_paths(paths, workers=2)
+        self.assertEqual((stats["processed"], stats["skipped"], stats["rows"]), (0, 3, 0))
+
+    def test_bad_shard_is_reported(self):
+        """A malformed shard counts as an error without stopping the others."""
+        with open(os.path.join(self.tmp.name, "broken.json"), "w", encoding="utf-8") as f:
+            f.write('[{"id": "x", "company": "C"}, {"id": ')
+        stats = ingest.ingest_paths(ingest.expand_sources(self.tmp.name), workers=2)
+        self.assertEqual((stats["processed"], stats["errors"]), (3, 1))
+
+    def test_element_that_is_not_an_object(self):
+        """A shard with a list or string where a job should be is reported, not fatal."""
+        self._write("lists.json", [{"id": "x", "company": "C"}, ["not", "a", "job"]])
+        self._write("strings.json", ["not a job"])
+        stats = ingest.ingest_paths(ingest.expand_sources(self.tmp.name), workers=2)
+        self.assertEqual((stats["processed"], stats["errors"]), (3, 2))
+        with self.assertRaises(ValueError):
+            database.stream_job_data(os.path.join(self.tmp.name, "strings.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
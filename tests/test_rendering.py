@@ -0,0 +1,72 @@
+"""
+tests/test_rendering.py
+
+This module contains unit tests for rendering Markdown documents to PDF.
+It checks that Markdown is parsed into headings, list items and bold and
+italic spans without its markup, that characters the PDF fonts lack are
+replaced from the table, and that long lines are wrapped within the page.
+"""
+import re
+import unittest
+import zlib
+import rendering
+
+
+# helper function: the text drawn on the pages of a PDF file made by FPDF
+def page_text(data):
+    """Return the strings of the Tj operators in the page streams of data."""
+    strings = []
+    for stream in re.findall(rb"stream\r?\n(.*?)endstream", data, re.DOTALL):
+        try:
+            text = zlib.decompress(stream).decode("latin-1")
+        except zlib.error:
+            continue
+        strings.extend(re.findall(r"\((.*?)\) Tj", text))
+    return strings
+
+
+class TestRendering(unittest.TestCase):
+    """Unit tests for rendering.py."""
+
+    def test_parse(self):
+        """Lines become blocks of styled spans, with the Markdown markup dropped."""
+        blocks = rendering.parse("# Ada Lovelace #\r\n\n## Skills\n- **Python:** *expert*\n"
+                                 "  * nested_name\n2. [Site](https://example.com)\n---\n"
+                                 "Plain \\*text\\* and `code`")
+        self.assertEqual([(block.kind, block.level, block.marker) for block in blocks],
+                         [("heading", 1, ""), ("blank", 0, ""), ("heading", 2, ""),
+                          ("item", 0, rendering.BULLET), ("item", 1, rendering.BULLET),
+                          ("item", 0, "2."), ("rule", 0, ""), ("text", 0, "")])
+        self.assertEqual(blocks[0].spans, [("Ada Lovelace", "B")])
+        self.assertEqual(blocks[3].spans, [("Python:", "B"), (" ", ""), ("expert", "I")])
+        self.assertEqual(blocks[4].spans, [("nested_name", "")])
+        self.assertEqual(blocks[5].spans, [("Site", "")])
+        self.assertEqual(blocks[7].spans, [("Plain *text* and code", "")])
+        self.assertEqual(rendering.parse_inline("***both*** __bold__"),
+                         [("both", "BI"), (" ", ""), ("bold", "B")])
+
+    def test_normalize(self):
+        """cp1252 characters keep their glyphs; others come from the table or their letters."""
+        self.assertEqual(rendering.normalize("\u201cA\u201d \u2013 \u2022 café"),
+                         "\x93A\x94 \x96 \x95 café")
+        self.assertEqual(rendering.normalize("a\u2192b\u200b \u2713 \u0141\u00f3d\u017a"),
+                         "a->b v L\u00f3dz")
+        self.assertEqual(rendering.normalize("\u5317\u4eac"), "??")
+
+    def test_render(self):
+        """The PDF shows the text without markup, wrapped to fit the page."""
+        long_line = " ".join(["pipeline"] * 60)
+        data = rendering.render(f"# Resume\n- **Built** {long_line}\n"
+                                "\u201cQuoted\u201d \u2192 done")
+        self.assertTrue(data.startswith(b"%PDF"))
+        strings = page_text(data)
+        self.assertEqual(strings[:3], ["Resume", rendering.BULLET, "Built"])
+        self.assertFalse(any("*" in string or "#" in string for string in strings))
+        wrapped = [string.strip() for string in strings if "pipeline" in string]
+        self.assertGreater(len(wrapped), 2)
+        self.assertEqual(" ".join(wrapped).split(), ["pipeline"] * 60)
+        self.assertEqual(strings[-1], "\x93Quoted\x94 -> done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+tests/test_response_cache.py
+
+This module contains unit tests for the model response cache.
+It checks that answers are found again under the key of their prompt and model
+setup, that old and least recently used answers are evicted, that hits and
+misses are counted without lookups writing (and still reach the database when
+the process exits), and that create_resume only asks the model on a miss or
+when told to refresh.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import connections
+import database
+import main
+import response_cache
+
+
+class TestResponseCache(unittest.TestCase):
+    """Unit tests for response_cache against a temporary database."""
+
+    def setUp(self):
+        """Point the cache at a temporary database."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        database.DB_NAME = os.path.join(self.tmp.name, "jobs.db")
+        database.create_table()
+
+    def tearDown(self):
+        """Close the connections and delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def test_get_and_put(self):
+        """An answer is found under its key; other prompts or configs miss."""
+        key = response_cache.prompt_key("prompt", "model", "be brief", {"temperature": 1})
+        self.assertNotEqual(key, response_cache.prompt_key("prompt", "model", "be brief",
+                                                           {"temperature": 0.5}))
+        self.assertEqual(key, response_cache.prompt_key("prompt", "model", "be brief",
+                                                        {"temperature": 1}))
+        self.assertIsNone(response_cache.get(key))
+        response_cache.put(key, "# Resume", "model")
+        self.assertEqual(response_cache.get(key), "# Resume")
+        response_cache.put(key, "# Better resume", "model")
+        self.assertEqual(response_cache.get(key), "# Better resume")
+        self.assertEqual(response_cache.stats(), {"entries": 1, "bytes": 15, "hits": 2,
+                                                  "misses": 1, "evictions": 0})
+        response_cache.clear()
+        self.assertEqual(response_cache.stats()["entries"], 0)
+
+    def test_eviction(self):
+        """Answers past MAX_AGE_DAYS go, then the least recently used beyond MAX_BYTES."""
+        with mock.patch("response_cache.MAX_BYTES", 25), \
+                mock.patch("response_cache.MAX_AGE_DAYS", 1):
+            response_cache.put("old", "x" * 10, now=0)
+            self.assertIsNone(response_cache.get("old", now=2 * 86400))
+            response_cache.put("a", "a" * 10, now=86400)
+            response_cache.put("b", "b" * 10, now=86401)
+            response_cache.get("a", now=86402)  # b is now the least recently used
+            response_cache.put("c", "c" * 10, now=86403)
+            self.assertIsNone(response_cache.get("b", now=86404))
+            self.assertEqual(response_cache.get("a", now=86404), "a" * 10)
+            self.assertEqual(response_cache.get("c", now=86404), "c" * 10)
+            self.assertEqual(response_cache.stats()["evictions"], 2)
+            self.assertEqual(response_cache.stats()["bytes"], 20)
+            response_cache.put("c", "c" * 5, now=86405)
+            self.assertEqual(response_cache.stats()["bytes"], 15)
+
+    def test_lookups_are_written_in_batches(self):
+        """get only reads; its hits are written TOUCH_BATCH_SIZE lookups at a time."""
+        response_cache.put("a", "answer", now=100)
+
+        def stored():
+            with sqlite3.connect(database.DB_NAME) as conn:
+                return conn.execute("SELECT last_used, hits FROM llm_responses").fetchone()
+
+        with mock.patch("response_cache.TOUCH_BATCH_SIZE", 3):
+            self.assertEqual(response_cache.get("a", now=200), "answer")
+            self.assertIsNone(response_cache.get("b", now=300))
+            self.assertFalse(connections.writer(database.DB_NAME).in_transaction)
+            self.assertEqual(stored(), (100, 0))
+            response_cache.get("a", now=250)
+            self.assertEqual(stored(), (250, 2))
+        self.assertEqual(response_cache.stats()["misses"], 1)
+
+    def test_lookups_are_kept_at_exit(self):
+        """Hits a process made are in the database once it exits, read on a new connection."""
+        response_cache.put("a", "answer", now=100)
+        connections.close_all()
+        script = (
+            "import sys, database, response_cache\n"
+            "database.DB_NAME = sys.argv[1]\n"
+            "for now in (200, 300, 250):\n"
+            "    response_cache.get('a', now=now)\n"
+            "response_cache.get('b', now=300)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", script, database.DB_NAME], cwd=root, check=True,
+                       capture_output=True)
+        with sqlite3.connect(database.DB_NAME) as conn:
+            self.assertEqual(conn.execute("SELECT last_used, hits FROM llm_responses").fetchone(),
+                             (300, 3))
+            self.assertEqual(dict(conn.execute("SELECT name, value FROM llm_cache_stats "
+                                               "WHERE name IN ('hits', 'misses')")),
+                             {"hits": 3, "misses": 1})
+        response_cache.get("a", now=400)
+        response_cache.flush()
+        connections.close_all()
+        with sqlite3.connect(database.DB_NAME) as conn:
+            self.assertEqual(conn.execute("SELECT last_used, hits FROM llm_responses").fetchone(),
+                             (400, 4))
+
+    def test_create_resume_uses_cache(self):
+        """A repeated request is answered from the cache; refresh asks the model again."""
+        chat = mock.MagicMock()
+        chat.send_message.return_value.text = "# Resume"
+        before_request = mock.Mock()
+        for _ in range(2):
+            self.assertEqual(main.create_resume(chat, "job", "me", cache=True,
+                                                before_request=before_request), "# Resume")
+        self.assertEqual(chat.send_message.call_count, 1)
+        self.assertEqual(before_request.call_count, 1)
+        main.create_resume(chat, "other job", "me", cache=True)
+        self.assertEqual(chat.send_message.call_count, 2)
+
+        chat.send_message.return_value.text = "# New resume"
+        self.assertEqual(main.create_resume(chat, "job", "me", cache=True, refresh=True),
+                         "# New resume")
+        self.assertEqual(main.create_resume(chat, "job", "me", cache=True), "# New resume")
+        # without cache the model is always asked
+        main.create_resume(chat, "job", "me")
+        self.assertEqual(chat.send_message.call_count, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,278 @@
+"""
+tests/test_search.py
+
+This module contains unit tests for the full-text job search.
+It checks that user text becomes a safe FTS5 query, that results are ranked
+with title matches first, and that the index follows upserts during ingest.
+It also checks the structured filters, their keyset pagination and that they
+are answered from indexes.
+"""
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+import connections
+import database
+import search
+
+
+class TestBuildMatchQuery(unittest.TestCase):
+    """Unit tests for turning typed text into an FTS5 query."""
+
+    def test_build_match_query(self):
+        """Words are quoted, operators dropped and the last word is a prefix."""
+        self.assertEqual(search.build_match_query("python remote back"),
+                         '"python" "remote" "back"*')
+        self.assertEqual(search.build_match_query('c++ AND "sql" '), '"c" "AND" "sql"')
+        self.assertEqual(search.build_match_query("python r"), '"python"')
+        self.assertEqual(search.build_match_query("python r "), '"python" "r"')
+        self.assertIsNone(search.build_match_query("  -*  "))
+
+
+class TestSearchJobs(unittest.TestCase):
+    """Unit tests for search_jobs against a temporary database."""
+
+    def setUp(self):
+        """Create a temporary database with a few jobs."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        database.DB_NAME = os.path.join(self.tmp.name, "jobs.db")
+        database.create_table()
+        self.jobs = [
+            {"id": "1", "title": "Backend Engineer", "company": "Acme",
+             "description": "Python services, remote friendly.", "location": "Remote"},
+            {"id": "2", "title": "Data Analyst", "company": "Python Labs",
+             "description": "SQL dashboards.", "location": "Boston, MA"},
+            {"id": "3", "title": "Python Developer", "company": "Initech",
+             "description": "Django and Python backend work.", "location": "Austin, TX"},
+        ]
+        self.feed = os.path.join(self.tmp.name, "feed.json")
+        self._write_feed()
+        database.stream_job_data(self.feed)
+
+    def tearDown(self):
+        """Delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def _write_feed(self):
+        with open(self.feed, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f)
+
+    def test_ranked_results_with_snippets(self):
+        """Title matches rank first and snippets highlight the matched words."""
+        results = search.search_jobs("python")
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0][1], "Python Developer")
+        self.assertIn("[Python]", results[0][3])
+        self.assertEqual([r[1] for r in search.search_jobs("python backend")],
+                         ["Backend Engineer", "Python Developer"])
+        self.assertEqual(len(search.search_jobs("python", limit=1, offset=1)), 1)
+        self.assertEqual(search.search_jobs("   "), [])
+
+    def test_search_as_you_type(self):
+        """Every keystroke of a query keeps finding the job it is typed for."""
+        self.jobs[0]["description"] = "Running services for the engineering team."
+        self._write_feed()
+        database.stream_job_data(self.feed)
+        query = "engineering services running"
+        for end in range(2, len(query) + 1):
+            self.assertEqual([r[0] for r in search.search_jobs(query[:end])], [1],
+                             f"typed {query[:end]!r}")
+
+    def test_stemmed_index_is_rebuilt(self):
+        """A search index an older version built with stemmed words is built again."""
+        with connections.writer(database.DB_NAME) as conn:
+            database.drop_search_index(conn.cursor())
+            conn.execute("CREATE VIRTUAL TABLE jobs_fts USING fts5(title, company, description, "
+                         "location, content = 'jobs_text', content_rowid = 'id', "
+                         "tokenize = 'porter unicode61', prefix = '2 3')")
+            conn.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('rebuild')")
+            conn.execute("PRAGMA user_version = 1")
+        self.assertEqual(search.search_jobs("enginee"), [])
+        database.create_table()
+        self.assertEqual([r[0] for r in search.search_jobs("enginee")], [1])
+
+    def test_changes_from_any_connection(self):
+        """Jobs changed without the description_text() function are re-indexed later."""
+        with sqlite3.connect(database.DB_NAME) as conn:
+            conn.execute("UPDATE jobs SET title = 'Rust Developer' WHERE id = 3")
+            conn.execute("DELETE FROM jobs WHERE id = 2")
+        database.create_table()
+        with connections.writer(database.DB_NAME) as conn:
+            conn.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('integrity-check')")
+        self.assertEqual([r[1] for r in search.search_jobs("python")],
+                         ["Backend Engineer", "Rust Developer"])
+        self.assertEqual([r[1] for r in search.search_jobs("rust")], ["Rust Developer"])
+
+    def test_rank_window(self):
+        """Matches are ranked RANK_WINDOW at a time, newest first, and paging goes on."""
+        window, rank_limit = search.RANK_WINDOW, search.RANK_LIMIT
+        search.RANK_WINDOW = 2
+        try:
+            # with bm25, and with the fallback ranking for common words
+            for search.RANK_LIMIT in (rank_limit, 1):
+                self.assertEqual([r[1] for r in search.search_jobs("python")],
+                                 ["Python Developer", "Data Analyst", "Backend Engineer"])
+                self.assertEqual([r[1] for r in search.search_jobs("python", 2, 1)],
+                                 ["Data Analyst", "Backend Engineer"])
+                self.assertEqual([r[1] for r in search.search_jobs("python", 2, 2)],
+                                 ["Backend Engineer"])
+                self.assertEqual(search.search_jobs("python", offset=3), [])
+        finally:
+            search.RANK_WINDOW, search.RANK_LIMIT = window, rank_limit
+
+    def test_common_word_fallback_ranking(self):
+        """Terms in more than RANK_LIMIT jobs are ranked by title, company, then location."""
+        rank_limit = search.RANK_LIMIT
+        search.RANK_LIMIT = 1
+        try:
+            results = search.search_jobs("python")
+        finally:
+            search.RANK_LIMIT = rank_limit
+        self.assertEqual([r[1] for r in results],
+                         ["Python Developer", "Data Analyst", "Backend Engineer"])
+        self.assertIn("[Python]", results[2][3])
+
+    def test_fallback_matches_whole_words(self):
+        """The fallback ranking finds whole words, and the word being typed as a prefix."""
+        self.jobs[0]["title"] = "Pythonista Engineer"
+        self._write_feed()
+        database.stream_job_data(self.feed)
+        rank_limit = search.RANK_LIMIT
+        search.RANK_LIMIT = 1
+        try:
+            self.assertEqual([r[1] for r in search.search_jobs("python ")],
+                             ["Python Developer", "Data Analyst", "Pythonista Engineer"])
+            # the word being typed matches as a prefix
+            self.assertEqual([r[1] for r in search.search_jobs("python")],
+                             ["Python Developer", "Pythonista Engineer", "Data Analyst"])
+        finally:
+            search.RANK_LIMIT = rank_limit
+
+    def test_index_follows_upserts(self):
+        """Changing a job's text during re-ingest updates what search finds."""
+        self.jobs[1]["description"] = "Kubernetes clusters."
+        self._write_feed()
+        database.stream_job_data(self.feed)
+        self.assertEqual([r[1] for r in search.search_jobs("kubernetes")], ["Data Analyst"])
+        self.assertEqual([r[1] for r in search.search_jobs("dashboards")], [])
+
+
+class TestFilterJobs(unittest.TestCase):
+    """Unit tests for filter_jobs against a temporary database."""
+
+    def setUp(self):
+        """Create a temporary database with jobs spread over the filtered fields."""
+        self.tmp = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        database.DB_NAME = os.path.join(self.tmp.name, "jobs.db")
+        database.create_table()
+        jobs = [
+            {"id": str(i), "title": f"Job {i}", "company": "Acme", "description": "",
+             "location": ["New York, NY", "Boston, MA", "Remote"][i % 3],
+             "job_type": ["fulltime", "contract"][i % 2],
+             "date_posted": f"2025-01-{i + 1:02d}", "min_amount": 50000 + i * 10000,
+             "max_amount": 60000 + i * 10000, "is_remote": i % 4 == 0}
+            for i in range(12)
+        ]
+        jobs.append({"id": "recent", "title": "Recent", "company": "Acme",
+                     "date_posted": "3 days ago", "job_type": "fulltime"})
+        feed = os.path.join(self.tmp.name, "feed.json")
+        with open(feed, "w", encoding="utf-8") as f:
+            json.dump(jobs, f)
+        database.stream_job_data(feed, "job-data2")
+
+    def tearDown(self):
+        """Delete the temporary directory."""
+        connections.close_all()
+        self.tmp.cleanup()
+
+    def test_combined_filters(self):
+        """Every filter that is set must match; unset ones are ignored."""
+        cases = [
+            ({"min_salary": 130000, "is_remote": "yes"}, ["Job 8"]),
+            ({"job_type": "contract", "max_salary": 100000}, ["Job 1", "Job 3"]),
+            ({"location": "new y", "min_salary": None}, ["Job 0", "Job 3", "Job 6", "Job 9"]),
+            ({"posted_since": "2025-01-11", "location": ""}, ["Job 10", "Job 11", "Recent"]),
+        ]
+        for filters, titles in cases:
+            self.assertEqual([row[1] for row in search.filter_jobs(filters)], titles)
+        with self.assertRaises(ValueError):
+            search.filter_jobs({"title": "Job 1"})
+        with self.assertRaises(ValueError):
+            search.filter_jobs(columns=("id", "description"))
+
+    def test_relative_posted_date(self):
+        """A relative date_posted is stored as an ISO posted_date."""
+        expected = (datetime.date.today() - datetime.timedelta(days=3)).isoformat()
+        rows = search.filter_jobs({"posted_since": expected}, columns=("posted_date",))
+        self.assertEqual(rows[-1][1:], (expected,))
+
+    def test_keyset_pages_and_columns(self):
+        """Pages continue after the last id and return only the requested columns."""
+        filters = {"job_type": "fulltime"}
+        pages, after_id = [], 0
+        while True:
+            page = search.filter_jobs(filters, ("title", "min_amount"), after_id, limit=2)
+            if not page:
+                break
+            pages.append(page)
+            after_id = page[-1][0]
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(pages[0], [(1, "Job 0", 50000.0), (3, "Job 2", 70000.0)])
+
+    def test_filters_use_indexes(self):
+        """No combination of filters falls back to a full table scan."""
+        conn = sqlite3.connect(database.DB_NAME)
+        cases = [{name: value} for name, value in [
+            ("min_salary", 100000), ("max_salary", 100000), ("is_remote", "yes"),
+            ("job_type", "contract"), ("location", "Bos"), ("posted_since", "2025-01-05")]]
+        cases.append({"is_remote": "yes", "min_salary": 100000})
+        sort_limit, probe_rows = search.FILTER_SORT_LIMIT, search.FILTER_PROBE_ROWS
+        try:
+            # 1 makes every range filter too broad to drive the query with its index
+            for search.FILTER_SORT_LIMIT in (sort_limit, 1):
+                for filters in cases:
+                    sql, params = search.build_filter_query(conn.cursor(), filters)
+                    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+                    self.assertTrue(plan[0].startswith("SEARCH jobs USING"), (filters, plan))
+                    if search.FILTER_SORT_LIMIT > 1:
+                        self.assertIn("USING INDEX", plan[0], (filters, plan))
+            # broad alone but matching nothing together: walking the table would read
+            # all of it, so an index still drives the query
+            search.FILTER_PROBE_ROWS = 2
+            filters = {"min_salary": 100000, "max_salary": 100000}
+            sql, params = search.build_filter_query(conn.cursor(), filters)
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            self.assertIn("USING INDEX", plan[0], plan)
+            self.assertEqual(search.filter_jobs(filters), [])
+        finally:
+            search.FILTER_SORT_LIMIT, search.FILTER_PROBE_ROWS = sort_limit, probe_rows
+            conn.close()
+
+    def test_sparse_matches_use_an_index(self):
+        """A match among the sampled rows keeps the walk only if it fills a page in time."""
+        conn = sqlite3.connect(database.DB_NAME)
+        limits = search.FILTER_SORT_LIMIT, search.FILTER_PROBE_ROWS, search.FILTER_WALK_ROWS
+        try:
+            search.FILTER_SORT_LIMIT, search.FILTER_PROBE_ROWS, search.FILTER_WALK_ROWS = 1, 2, 4
+            # the only match is the first row: the walk would read every row after it
+            sparse = {"min_salary": 50000, "max_salary": 60000}
+            # every row matches: the walk fills a page of 2 at once
+            dense = {"min_salary": 50000, "max_salary": 200000}
+            for filters, limit, used in [(sparse, 50, "USING INDEX"),
+                                         (dense, 2, "USING INTEGER PRIMARY KEY")]:
+                sql, params = search.build_filter_query(conn.cursor(), filters, limit=limit)
+                plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+                self.assertIn(used, plan[0], (filters, plan))
+            self.assertEqual([row[1] for row in search.filter_jobs(sparse)], ["Job 0"])
+            self.assertEqual([row[1] for row in search.filter_jobs(dense, limit=2)],
+                             ["Job 0", "Job 1"])
+        finally:
+            search.FILTER_SORT_LIMIT, search.FILTER_PROBE_ROWS, search.FILTER_WALK_ROWS = limits
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+tests/test_sessions.py
+
+This module contains unit tests for the chat session pool.
+A stand-in model is used. It checks that the model is made once however many
+threads ask for sessions, that sessions are reused with their history cleared,
+that sessions in use at the same time are never shared, and that sessions for
+a prompt prefix hold it in a context cache or their first turn, or else not at
+all. A context cache is released once its sessions are made again or dropped and
+none of them is in use.
+"""
+import threading
+import unittest
+from unittest import mock
+import sessions
+
+
+class TestSessionPool(unittest.TestCase):
+    """Unit tests for sessions.SessionPool."""
+
+    def test_reuse(self):
+        """A returned session is handed out again with an empty history."""
+        make_model = mock.Mock()
+        make_model.return_value.start_chat.side_effect = lambda history: mock.Mock()
+        pool = sessions.SessionPool(make_model)
+        with pool.session() as chat:
+            chat.history = ["earlier prompt", "earlier answer"]
+        with pool.session() as again:
+            self.assertIs(again, chat)
+            self.assertEqual(again.history, [])
+            # a second session at the same time is a new one
+            with pool.session() as other:
+                self.assertIsNot(other, chat)
+        make_model.assert_called_once_with()
+        self.assertEqual(make_model.return_value.start_chat.call_count, 2)
+
+    def test_threads(self):
+        """Threads share one model and never hold the same session at once."""
+        make_model = mock.Mock()
+        make_model.return_value.start_chat.side_effect = lambda history: mock.Mock()
+        pool = sessions.SessionPool(make_model, size=2)
+        barrier = threading.Barrier(4)
+        held = []
+
+        def work():
+            with pool.session() as chat:
+                held.append(chat)
+                barrier.wait(5)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        make_model.assert_called_once_with()
+        self.assertEqual(len(set(map(id, held))), 4)
+        # only two of the four are kept
+        with pool.session() as first, pool.session() as second, pool.session() as third:
+            self.assertIn(first, held)
+            self.assertIn(second, held)
+            self.assertNotIn(third, held)
+
+    def test_prefix(self):
+        """Without a context cache, a long prefix is seeded into the session's history."""
+        make_model = mock.Mock()
+        make_model.return_value.start_chat.side_effect = lambda history: mock.Mock(
+            history=history)
+        pool = sessions.SessionPool(make_model)
+        prefix = "profile " * 50
+        with pool.session(prefix) as chat:
+            self.assertEqual((chat.prefix, chat.reuse), (prefix, sessions.SEEDED))
+            seed = list(chat.history)
+            self.assertEqual(seed[0]["parts"], [prefix])
+            chat.history = seed + ["job prompt", "answer"]
+        with pool.session(prefix) as again:
+            self.assertIs(again, chat)
+            self.assertEqual(again.history, seed)
+        # a short prefix, or none, gets a plain session
+        with pool.session("short") as plain:
+            self.assertEqual((plain.prefix, plain.reuse, plain.history),
+                             ("", sessions.FULL_PROMPT, []))
+
+    def test_prefix_context_cache(self):
+        """A prefix model is made once per prefix; a prefix that cannot be held is remembered."""
+        make_prefix_model = mock.Mock()
+        make_prefix_model.return_value.start_chat.side_effect = lambda history: mock.Mock()
+        pool = sessions.SessionPool(mock.Mock(), make_prefix_model=make_prefix_model)
+        prefix = "profile " * 50
+        for _ in range(3):
+            with pool.session(prefix) as chat:
+                self.assertEqual((chat.prefix, chat.reuse), (prefix, sessions.CONTEXT_CACHE))
+        make_prefix_model.assert_called_once_with(prefix)
+        # made again when the context cache is about to expire
+        with mock.patch("sessions.PREFIX_MAX_AGE", 0):
+            with pool.session(prefix):
+                pass
+        self.assertEqual(make_prefix_model.call_count, 2)
+
+        make_prefix_model = mock.Mock(return_value=None)
+        pool = sessions.SessionPool(mock.Mock(), make_prefix_model=make_prefix_model, seed=False)
+        for _ in range(2):
+            with pool.session(prefix) as chat:
+                self.assertEqual((chat.prefix, chat.reuse), ("", sessions.FULL_PROMPT))
+        make_prefix_model.assert_called_once_with(prefix)
+
+    def test_release_prefix_model(self):
+        """A context cache made again or dropped is released once no session uses it."""
+        models, release = [mock.Mock() for _ in range(3)], mock.Mock()
+        pool = sessions.SessionPool(mock.Mock(), make_prefix_model=mock.Mock(side_effect=models),
+                                    release_prefix_model=release)
+        first, second = "first " * 50, "second " * 50
+        with pool.session(first):
+            with mock.patch("sessions.PREFIX_MAX_AGE", 0):
+                with pool.session(first):
+                    pass
+            # replaced, but a session still uses it
+            release.assert_not_called()
+        release.assert_called_once_with(models[0])
+        with mock.patch("sessions.PREFIX_POOLS", 1):
+            with pool.session(second):
+                pass
+        self.assertEqual(release.call_args_list, [mock.call(models[0]), mock.call(models[1])])
+
+    def test_release_after_failed_start(self):
+        """A session that could not be started does not keep its context cache in use."""
+        model, release = mock.Mock(), mock.Mock()
+        model.start_chat.side_effect = RuntimeError("unavailable")
+        pool = sessions.SessionPool(mock.Mock(), make_prefix_model=mock.Mock(return_value=model),
+                                    release_prefix_model=release)
+        with self.assertRaises(RuntimeError):
+            with pool.session("first " * 50):
+                pass
+        with mock.patch("sessions.PREFIX_POOLS", 1):
+            with self.assertRaises(RuntimeError):
+                with pool.session("second " * 50):
+                    pass
+        release.assert_called_once_with(model)
+
+
+if __name__ == "__main__":
+    unittest.main()